@@ -0,0 +1,200 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from codebook import CODEBOOK
+from crime_types import CRIME_TYPE_MAP, DEFAULT_CRIME_CATEGORY, DEFAULT_VICT_SEX, VICT_SEX_MAP, map_categorical
+
+# Raw columns used for training; everything else in the CSV is never parsed
+USECOLS = ['DATE OCC', 'AREA NAME', 'Vict Sex', 'Crm Cd Desc']
+# Aggregation keys, which are also the model features
+GROUP_KEYS = ['Month', 'Year', 'AREA NAME', 'Vict Sex', 'Crime_Category']
+CHUNK_SIZE = 200000
+DATE_FORMAT = '%m/%d/%Y %I:%M:%S %p'  # e.g. 03/01/2020 12:00:00 AM
+
+
+def read_chunks(path, chunksize=CHUNK_SIZE):
+    """Stream the needed columns of the crime CSV as categorical chunks"""
+    return pd.read_csv(path, usecols=USECOLS, dtype={column: 'category' for column in USECOLS},
+                       chunksize=chunksize)
+
+
+def encode_chunk(chunk, crime_type_map=CRIME_TYPE_MAP, vict_sex_map=VICT_SEX_MAP):
+    """Encoded aggregation keys of one chunk, dropping rows without a usable date or area"""
+    # Dates repeat a lot, so only the distinct strings are parsed
+    dates = chunk['DATE OCC'].astype('category')
+    distinct = pd.Series(dates.cat.categories)
+    parsed = pd.to_datetime(distinct, format=DATE_FORMAT, errors='coerce')
+    if len(distinct) and parsed.isna().all():
+        # Not the usual export format; let pandas infer it as the notebook did
+        parsed = pd.to_datetime(distinct, errors='coerce')
+    codes = dates.cat.codes.to_numpy()
+    years = np.append(parsed.dt.year.to_numpy(dtype=float), np.nan)[codes]
+    months = np.append(parsed.dt.month.to_numpy(dtype=float), np.nan)[codes]
+
+    areas = CODEBOOK.encode('area', chunk['AREA NAME'].to_numpy(dtype=object))
+    sexes = CODEBOOK.encode('sex', map_categorical(chunk['Vict Sex'], vict_sex_map, DEFAULT_VICT_SEX))
+    categories = CODEBOOK.encode('category', map_categorical(chunk['Crm Cd Desc'], crime_type_map,
+                                                             DEFAULT_CRIME_CATEGORY))
+
+    keep = ~np.isnan(years) & (areas >= 0)
+    return pd.DataFrame({
+        'Month': months[keep].astype(np.int64),
+        'Year': years[keep].astype(np.int64),
+        'AREA NAME': areas[keep],
+        'Vict Sex': sexes[keep],
+        'Crime_Category': categories[keep]
+    }), int((~keep).sum())
+
+
+def aggregate_counts(path, chunksize=CHUNK_SIZE, crime_type_map=CRIME_TYPE_MAP, vict_sex_map=VICT_SEX_MAP):
+    """Crime counts per (month, year, area, sex, category), accumulated chunk by chunk"""
+    counts = None
+    rows = dropped = 0
+    for chunk in read_chunks(path, chunksize):
+        encoded, chunk_dropped = encode_chunk(chunk, crime_type_map, vict_sex_map)
+        rows += len(chunk)
+        dropped += chunk_dropped
+        chunk_counts = encoded.groupby(GROUP_KEYS).size()
+        counts = chunk_counts if counts is None else counts.add(chunk_counts, fill_value=0)
+    if counts is None:
+        raise ValueError(f"No rows in {path}")
+    # Sorted keys make the training set, and so the model, independent of row order
+    return counts.astype(np.int64).sort_index(), rows, dropped
+
+
+def file_digest(path):
+    """SHA-1 of a file, read in blocks"""
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS crime_counts (
+    month INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    area_name TEXT NOT NULL,
+    vict_sex TEXT NOT NULL,
+    crime_category TEXT NOT NULL,
+    crime_count INTEGER NOT NULL,
+    PRIMARY KEY (month, year, area_name, vict_sex, crime_category)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS mappings (
+    kind TEXT NOT NULL,
+    raw_value TEXT NOT NULL,
+    label TEXT NOT NULL,
+    PRIMARY KEY (kind, raw_value)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ingested (
+    sha1 TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    dropped_rows INTEGER NOT NULL,
+    cells INTEGER NOT NULL,
+    ingested_at REAL NOT NULL
+);
+'''
+
+# Label columns of the cube, the encoded feature column and the codebook field of each
+DIMENSIONS = [('area_name', 'AREA NAME', 'area'),
+              ('vict_sex', 'Vict Sex', 'sex'),
+              ('crime_category', 'Crime_Category', 'category')]
+
+
+class AggregateStore:
+    """SQLite cube of crime counts per (month, year, area, victim sex, crime category).
+
+    New incident data is added by upserting only the cells it touches, so a
+    refresh costs O(new rows). The raw-value mappings (crime_type_map and the
+    victim sex codes) are stored with the cube when it is created, keeping
+    every later append consistent with the data already in it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        # The mappings are only written when the cube is created
+        if not self.connection.execute('SELECT 1 FROM mappings LIMIT 1').fetchone():
+            with self.connection:
+                for kind, mapping in (('crime_type', CRIME_TYPE_MAP), ('vict_sex', VICT_SEX_MAP)):
+                    self.connection.executemany(
+                        'INSERT INTO mappings (kind, raw_value, label) VALUES (?, ?, ?)',
+                        [(kind, raw, label) for raw, label in mapping.items()])
+
+    def close(self):
+        self.connection.close()
+
+    def mapping(self, kind):
+        """Stored {raw value: label} mapping of one kind ('crime_type' or 'vict_sex')"""
+        rows = self.connection.execute('SELECT raw_value, label FROM mappings WHERE kind = ?', (kind,))
+        return dict(rows.fetchall())
+
+    def is_ingested(self, sha1):
+        row = self.connection.execute('SELECT 1 FROM ingested WHERE sha1 = ?', (sha1,)).fetchone()
+        return row is not None
+
+    def add_counts(self, counts):
+        """Add an encoded count Series (indexed by GROUP_KEYS) to the cube; returns cells touched.
+
+        Must be called inside a transaction (see append_csv).
+        """
+        frame = counts.reset_index(name='crime_count')
+        for column, key, field in DIMENSIONS:
+            frame[column] = CODEBOOK.decode(field, frame[key].to_numpy())
+        rows = zip(frame['Month'].tolist(), frame['Year'].tolist(), frame['area_name'].tolist(),
+                   frame['vict_sex'].tolist(), frame['crime_category'].tolist(), frame['crime_count'].tolist())
+        self.connection.executemany('''
+            INSERT INTO crime_counts (month, year, area_name, vict_sex, crime_category, crime_count)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (month, year, area_name, vict_sex, crime_category)
+            DO UPDATE SET crime_count = crime_count + excluded.crime_count
+        ''', rows)
+        return len(frame)
+
+    def append_csv(self, path, chunksize=CHUNK_SIZE):
+        """Add the incidents of a CSV file to the cube in one transaction.
+
+        Returns (rows, dropped rows, cells touched). A file that was already
+        ingested (same content hash) is rejected.
+        """
+        sha1 = file_digest(path)
+        if self.is_ingested(sha1):
+            raise ValueError(f"{path} was already added to {self.path}")
+        counts, rows, dropped = aggregate_counts(path, chunksize, self.mapping('crime_type'),
+                                                 self.mapping('vict_sex'))
+        with self.connection:
+            cells = self.add_counts(counts)
+            self.connection.execute(
+                'INSERT INTO ingested (sha1, source, rows, dropped_rows, cells, ingested_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (sha1, os.path.basename(path), rows, dropped, cells, time.time()))
+        return rows, dropped, cells
+
+    def counts(self):
+        """All cube cells as an encoded count Series, in the layout of aggregate_counts"""
+        frame = pd.read_sql_query(
+            'SELECT month, year, area_name, vict_sex, crime_category, crime_count FROM crime_counts',
+            self.connection)
+        if frame.empty:
+            raise ValueError(f"No crime counts in {self.path}")
+        encoded = pd.DataFrame({'Month': frame['month'], 'Year': frame['year']})
+        try:
+            for column, key, field in DIMENSIONS:
+                encoded[key] = CODEBOOK.encode_strict(field, frame[column].to_numpy(dtype=object))
+        except ValueError as e:
+            raise ValueError(f"{self.path} contains values the model cannot encode ({e})")
+        index = pd.MultiIndex.from_frame(encoded[GROUP_KEYS])
+        return pd.Series(frame['crime_count'].to_numpy(dtype=np.int64), index=index).sort_index()
+
+    def stats(self):
+        cells, incidents = self.connection.execute(
+            'SELECT COUNT(*), COALESCE(SUM(crime_count), 0) FROM crime_counts').fetchone()
+        files = self.connection.execute('SELECT COUNT(*) FROM ingested').fetchone()[0]
+        return {'cells': cells, 'incidents': incidents, 'files': files}
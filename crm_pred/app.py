@@ -1,47 +1,63 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, url_for, Response, stream_with_context, g
 import pickle
 import pandas as pd
-import matplotlib
-matplotlib.use('Agg')  
-import matplotlib.pyplot as plt
-import seaborn as sns
-import io
+import atexit
 import base64
+import io
 import json
 import numpy as np
-from sklearn.preprocessing import LabelEncoder
 from flask_cors import CORS
-import geopandas as gpd
 import os
-from shapely.geometry import Point
-
-# Custom JSON encoder for NumPy types
-class NumpyEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, np.integer):
-            return int(obj)
-        elif isinstance(obj, np.floating):
-            return float(obj)
-        elif isinstance(obj, np.ndarray):
-            return obj.tolist()
-        return super(NumpyEncoder, self).default(obj)
+import hashlib
+import logging
+import shutil
+import time
+from contextlib import contextmanager
+from prediction_table import PredictionTable, build_feature_frame, risk_columns
+from forest_engine import CompiledForest
+from model_artifact import load_array, load_artifact, read_manifest, write_artifact
+from model_registry import ModelRegistry, ModelUnavailable, ModelVersion
+from forecast_cube import ForecastScheduler, build_cube
+from geo_aggregation import overall_area_predictions, category_area_predictions
+from geo_layer import DEFAULT_ZOOM, ZOOM_LEVELS, GeoLayer
+from charts import CHART_NAMES, ChartCache, ChartRenderer, ImageStore, chart_key, chart_names, image_digest
+from response_cache import ResponseCache, response_key
+from single_flight import SingleFlight
+from response_encoding import (NumpyEncoder, FORMAT_MIMETYPES, compress, dumps, encode_body, encode_content,
+                               format_available, label_lookup, preferred_encoding, prediction_columns,
+                               prediction_records, probability_summary, risk_distribution, stream_event)
+from range_query import parse_months, parse_years, range_summary
+from batch_score import CHUNK_SIZE as BATCH_CHUNK_SIZE, read_batches, score_batches, serialize
+from crime_types import AREA_NAMES, CRIME_CATEGORIES, CRIME_RISK_MAPPING, VICT_SEXES
+from codebook import CODEBOOK
+from log_config import configure_logging
+from metrics import MetricsRegistry, RequestProfiler
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 app.json_encoder = NumpyEncoder  # Use custom JSON encoder
 
-# Load the pre-trained model
-try:
-    with open('rf_clf_pred.pkl', 'rb') as f:
-        rf_clf = pickle.load(f)
-    print("Model loaded successfully")
-except Exception as e:
-    print(f"Error loading model: {str(e)}")
-    # Create a dummy model for demonstration if the real one fails to load
-    from sklearn.ensemble import RandomForestClassifier
-    rf_clf = RandomForestClassifier()
-    rf_clf.feature_names_in_ = ['AREA NAME', 'Crime_Category', 'Month', 'Vict Sex', 'Year']
-    rf_clf.predict = lambda X: np.random.randint(0, 3, size=len(X))
+configure_logging()
+logger = logging.getLogger('crm_pred.app')
+
+# Relative paths, here and in the settings below, are resolved against the app directory
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(APP_DIR, 'rf_clf_pred.pkl')
+# Versioned models, one subdirectory per version holding a model artifact or a model.pkl
+MODELS_DIR = os.path.join(APP_DIR, os.environ.get('MODELS_DIR', 'models'))
+MODEL_PICKLE_NAME = 'model.pkl'
+# Forecast cubes cover this many months from the current one, and are re-checked every FORECAST_POLL_SECONDS
+FORECAST_HORIZON_MONTHS = int(os.environ.get('FORECAST_HORIZON_MONTHS', 24))
+FORECAST_POLL_SECONDS = float(os.environ.get('FORECAST_POLL_SECONDS', 600))
+# Published cubes are shared by worker processes through this directory ('' keeps them in memory);
+# it is created on the first build
+FORECAST_DIR = os.environ.get('FORECAST_DIR', 'forecasts')
+if FORECAST_DIR:
+    FORECAST_DIR = os.path.join(APP_DIR, FORECAST_DIR)
+# Storage type of the cached predict_proba cube (float32, or float16 to halve it)
+PROBA_DTYPE = np.dtype(os.environ.get('PROBA_DTYPE', 'float32'))
+# Requests with an X-Profile header (cprofile or pyinstrument) return a profile instead; off unless enabled
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'
 
 # Month mapping (1 -> January, 2 -> February, etc.)
 month_names = {
@@ -49,616 +65,1202 @@ month_names = {
     7: 'July', 8: 'August', 9: 'September', 10: 'October', 11: 'November', 12: 'December'
 }
 
-# Define unique values
-area_names = ['Wilshire', 'Central', 'Southwest', 'Van Nuys', 'Hollenbeck',
-              'Rampart', 'Newton', 'Northeast', '77th Street', 'Hollywood',
-              'Harbor', 'West Valley', 'West LA', 'N Hollywood', 'Pacific',
-              'Devonshire', 'Mission', 'Southeast', 'Olympic', 'Foothill',
-              'Topanga']
-vict_sexes = ['M', 'F', 'Other']
-crime_categories = ['Property Crime', 'Violent Crime', 'Sex Crime', 'Other',
-                    'Fraud/Financial Crime', 'Legal/Administrative', 'Cyber Crime',
-                    'Child Crime', 'Traffic Offense']
-
-# Create and fit label encoders
-le_area = LabelEncoder()
-le_crime = LabelEncoder()
-le_sex = LabelEncoder()
-
-le_area.fit(area_names)
-le_crime.fit(crime_categories)
-le_sex.fit(vict_sexes)
-
-def create_plot(df):
-    """Create plots from prediction data and return base64 encoded images"""
-    plot_images = []
-    
-    # Set the style
-    sns.set_theme(style="whitegrid")
-    
+# Define unique values (shared with the training pipeline)
+area_names = AREA_NAMES
+vict_sexes = VICT_SEXES
+crime_categories = CRIME_CATEGORIES
+
+def training_metadata(path):
+    """training.json of a model version, or None for models trained outside train.py"""
     try:
-        # 1. Crime Risk Distribution - Pie Chart
-        plt.figure(figsize=(10, 6))
-        risk_counts = df['prediction'].value_counts()
-        plt.pie(risk_counts, labels=risk_counts.index, autopct='%1.1f%%', startangle=90, colors=sns.color_palette("Blues_r"))
-        plt.title('Distribution of Crime Risk Predictions')
-        
-        # Save pie chart to base64
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png')
-        buffer.seek(0)
-        pie_image = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        plot_images.append(pie_image)
-        plt.close()
-        
-        # 2. If we have area data and multiple areas, create a bar chart
-        if 'area name' in df.columns and len(df['area name'].unique()) > 1:
-            plt.figure(figsize=(12, 8))
-            
-            # Create a count of predictions by area
-            area_predictions = df.groupby(['area name', 'prediction']).size().unstack(fill_value=0)
-            
-            # Sort areas by total risk (optional)
-            if 'Unsafe / High Crime' in area_predictions.columns:
-                sort_columns = ['Unsafe / High Crime']
-                if 'Neutral / Medium Crime' in area_predictions.columns:
-                    sort_columns.append('Neutral / Medium Crime')
-                area_predictions = area_predictions.sort_values(by=sort_columns, ascending=False)
-            
-            # Create a grouped bar chart
-            area_predictions.plot(kind='bar', stacked=True, colormap='Blues_r')
-            plt.title('Crime Risk by Area')
-            plt.xlabel('Area')
-            plt.ylabel('Count')
-            plt.xticks(rotation=45, ha='right')
-            plt.tight_layout()
-            
-            # Save area chart to base64
-            buffer = io.BytesIO()
-            plt.savefig(buffer, format='png')
-            buffer.seek(0)
-            area_image = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            plot_images.append(area_image)
-            plt.close()
-        
-        # 3. If we have crime category data and multiple categories, create a horizontal bar chart
-        if 'crime category' in df.columns and len(df['crime category'].unique()) > 1:
-            plt.figure(figsize=(12, 8))
-            
-            # Create a count of predictions by crime category
-            category_predictions = df.groupby(['crime category', 'prediction']).size().unstack(fill_value=0)
-            
-            # Sort categories by total risk
-            if 'Unsafe / High Crime' in category_predictions.columns:
-                sort_columns = ['Unsafe / High Crime']
-                if 'Neutral / Medium Crime' in category_predictions.columns:
-                    sort_columns.append('Neutral / Medium Crime')
-                category_predictions = category_predictions.sort_values(by=sort_columns, ascending=False)
-            
-            # Create a horizontal bar chart
-            category_predictions.plot(kind='barh', stacked=True, colormap='Blues_r')
-            plt.title('Crime Risk by Category')
-            plt.xlabel('Count')
-            plt.ylabel('Crime Category')
-            plt.tight_layout()
-            
-            # Save category chart to base64
-            buffer = io.BytesIO()
-            plt.savefig(buffer, format='png')
-            buffer.seek(0)
-            category_image = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            plot_images.append(category_image)
-            plt.close()
-        
-        # 4. Heatmap if we have both area and crime category with sufficient data
-        if ('area name' in df.columns and 'crime category' in df.columns and 
-            len(df['area name'].unique()) > 1 and len(df['crime category'].unique()) > 1):
-            
-            # Create a pivot table counting "Unsafe / High Crime" predictions
-            if 'Unsafe / High Crime' in df['prediction'].unique():
-                pivot_data = df[df['prediction'] == 'Unsafe / High Crime'].groupby(['area name', 'crime category']).size().reset_index(name='count')
-                pivot_table = pivot_data.pivot_table(values='count', index='area name', columns='crime category', fill_value=0)
-                
-                plt.figure(figsize=(14, 10))
-                sns.heatmap(pivot_table, annot=True, cmap='Blues', fmt='g')
-                plt.title('Heatmap of High Crime Risk by Area and Category')
-                plt.tight_layout()
-                
-                # Save heatmap to base64
-                buffer = io.BytesIO()
-                plt.savefig(buffer, format='png')
-                buffer.seek(0)
-                heatmap_image = base64.b64encode(buffer.getvalue()).decode('utf-8')
-                plot_images.append(heatmap_image)
-                plt.close()
-    except Exception as e:
-        print(f"Error creating plots: {str(e)}")
-        # Create a basic error plot
-        plt.figure(figsize=(8, 6))
-        plt.text(0.5, 0.5, f"Error creating visualization: {str(e)}", 
-                 horizontalalignment='center', verticalalignment='center')
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png')
-        buffer.seek(0)
-        error_image = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        plot_images.append(error_image)
-        plt.close()
-    
-    # Return all plot images
-    return plot_images
+        with open(os.path.join(path, 'training.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def grid_features(model, table):
+    """Encoded features of every cell of a prediction table, in table order"""
+    shape = table.values.shape
+    months, areas, sexes, categories = np.indices(shape).reshape(len(shape), -1)
+    return build_feature_frame(model, months + 1, areas, sexes, categories,
+                               np.full(months.shape, table.year))
+
+def compile_version(version, path):
+    """Compile the model.pkl of a version into a model artifact in the same directory"""
+    with open(os.path.join(path, MODEL_PICKLE_NAME), 'rb') as f:
+        source = f.read()
+    # Pickles without training metadata (the notebook model) were encoded in codebook order
+    metadata = training_metadata(path)
+    if metadata is not None and not CODEBOOK.matches(metadata):
+        raise ValueError("Model was trained with a different codebook")
+    model = pickle.loads(source)
+    engine = CompiledForest.from_sklearn(model)
+    # The sklearn predictions of the full grid are stored as the reference for parity checks
+    table = PredictionTable(model, CODEBOOK, current_year())
+    write_artifact(path, engine, {
+        'version': version,
+        'fingerprint': hashlib.sha1(source).hexdigest(),
+        'source': MODEL_PICKLE_NAME,
+        'codebook': CODEBOOK.to_dict(),
+        'crime_risk_mapping': crime_risk_mapping,
+        'prediction_year': table.year
+    }, arrays={f"table_{table.year}": table.values})
+    logger.info("Compiled model version %s to %d nodes", version, engine.n_nodes)
+
+def load_model_version(version, path):
+    """Load one model version and validate it before it may serve requests"""
+    with model_load_seconds.time():
+        return _load_model_version(version, path)
+
+def _load_model_version(version, path):
+    manifest = read_manifest(path)
+    if manifest is None:
+        if not os.path.exists(os.path.join(path, MODEL_PICKLE_NAME)):
+            raise ValueError(f"No model artifact or {MODEL_PICKLE_NAME}")
+        compile_version(version, path)
+        manifest = read_manifest(path)
+    if not CODEBOOK.matches(manifest):
+        raise ValueError("Model was built with a different codebook")
+    engine, manifest = load_artifact(path, manifest)
+    unknown = set(engine.classes_.tolist()) - set(crime_risk_mapping)
+    if unknown:
+        raise ValueError(f"Model predicts unknown risk classes: {sorted(unknown)}")
+
+    reference_year = manifest.get('prediction_year')
+    table_name = f"table_{reference_year}"
+    if table_name not in manifest['arrays']:
+        raise ValueError("Model has no reference predictions")
+    reference = load_array(path, table_name)
+    # Requests are answered from the reference grid, so the compiled forest
+    # (used for other years) must reproduce it exactly
+    table = PredictionTable(engine, CODEBOOK, reference_year, values=reference)
+    proba = engine.predict_proba(grid_features(engine, table))
+    mismatches = int(np.sum(engine.classes_[np.argmax(proba, axis=1)] != reference.ravel()))
+    if mismatches:
+        raise ValueError(f"Compiled model disagrees with its reference predictions on {mismatches} rows")
+    # The same forest evaluation gives the probability cube for probability mode
+    table.proba = risk_columns(proba.astype(PROBA_DTYPE), engine.classes_, len(crime_risk_mapping)).reshape(
+        reference.shape + (len(crime_risk_mapping),))
+
+    # Caches are keyed by version as well as content, so a re-deployed model never serves stale labels
+    fingerprint = hashlib.sha1(f"{version}:{manifest['fingerprint']}".encode('utf-8')).hexdigest()
+    loaded = ModelVersion(version, engine, fingerprint, table, manifest)
+    # A published forecast cube is mapped now; otherwise the scheduler builds one in the background
+    # and requests are answered from the reference grid until it is ready
+    try:
+        forecast_scheduler.attach(loaded)
+    except Exception:
+        logger.exception("Could not map the forecast cube of model version %s", version)
+    return loaded
+
+def import_legacy_model():
+    """Add the model pickle next to the app as the first version when the registry is empty"""
+    if model_registry.versions() or not os.path.exists(MODEL_PATH):
+        return
+    version = time.strftime('%Y%m%d-%H%M%S', time.localtime(os.path.getmtime(MODEL_PATH)))
+    tmp_dir = os.path.join(MODELS_DIR, f".{version}.{os.getpid()}.tmp")
+    try:
+        os.makedirs(tmp_dir, exist_ok=True)
+        shutil.copy2(MODEL_PATH, os.path.join(tmp_dir, MODEL_PICKLE_NAME))
+        os.rename(tmp_dir, os.path.join(MODELS_DIR, version))
+        logger.info("Imported %s as model version %s", MODEL_PATH, version)
+    except OSError as e:
+        # Another worker may have imported it first
+        logger.warning("Could not import %s: %s", MODEL_PATH, e)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def model_swapped(old, new):
+    """Drop everything derived from the previous model version"""
+    chart_cache.clear()
+    response_cache.invalidate(new.fingerprint)
+    model_swaps.inc()
+
+# Models are loaded on first use and new versions are swapped in by a background thread
+model_registry = ModelRegistry(
+    MODELS_DIR, load_model_version,
+    poll_interval=float(os.environ.get('MODEL_POLL_SECONDS', 30)),
+    on_swap=model_swapped
+)
+
+def current_year():
+    return time.localtime().tm_year
+
+def build_forecast(model, years):
+    return build_cube(model, CODEBOOK, years, len(crime_risk_mapping), PROBA_DTYPE)
+
+# Forecasts of the active model for a rolling horizon, rebuilt off the request path as months go by
+forecast_scheduler = ForecastScheduler(
+    FORECAST_DIR, build_forecast, lambda: model_registry.current,
+    horizon_months=FORECAST_HORIZON_MONTHS, poll_interval=FORECAST_POLL_SECONDS
+)
+
+def serving_table(model):
+    """Prediction table of the current year: a slice of the forecast cube, else the reference grid"""
+    year = current_year()
+    cube = model.forecast
+    if cube is not None and year in cube.years:
+        return cube.table(model.model, CODEBOOK, year)
+    # Only until the scheduler catches up (e.g. just after New Year); the cube is built in its thread
+    forecast_scheduler.request(model)
+    return model.table
+
+def get_model():
+    """Active model version; a request keeps using it even if a new version is swapped in"""
+    if model_registry.current is None:
+        import_legacy_model()
+        forecast_scheduler.start()
+    model = model_registry.get()
+    g.model_version = model.version
+    return model
+
+# Define crime risk mapping
+crime_risk_mapping = CRIME_RISK_MAPPING
+risk_labels = label_lookup(crime_risk_mapping)
+
+# Charts are rendered in a small process pool and cached per filter combination
+chart_cache = ChartCache(
+    max_bytes=int(os.environ.get('CHART_CACHE_MB', 64)) * 1024 * 1024,
+    cache_dir=os.environ.get('CHART_CACHE_DIR')
+)
+chart_renderer = ChartRenderer(chart_cache, max_workers=int(os.environ.get('CHART_WORKERS', 2)),
+                               on_rendered=lambda seconds: chart_render_seconds.observe(seconds))
+
+# Rendered images are served by content address so browsers can cache them
+image_store = ImageStore(
+    max_bytes=int(os.environ.get('CHART_CACHE_MB', 64)) * 1024 * 1024,
+    cache_dir=os.path.join(os.environ['CHART_CACHE_DIR'], 'images') if os.environ.get('CHART_CACHE_DIR') else None
+)
+IMAGE_MAX_AGE = 365 * 24 * 60 * 60  # Content-addressed images never change
+
+# Serialized responses are memoized per normalized filters and model
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get('RESPONSE_CACHE_SIZE', 2048)),
+    cache_dir=os.environ.get('RESPONSE_CACHE_DIR')
+)
+
+# Identical requests arriving together are computed once; with a shared lock
+# directory (by default 'flights' in the response cache directory) across worker processes too
+single_flight = SingleFlight(
+    lock_dir=os.environ.get('SINGLE_FLIGHT_DIR') or (
+        os.path.join(os.environ['RESPONSE_CACHE_DIR'], 'flights') if os.environ.get('RESPONSE_CACHE_DIR') else None),
+    timeout=float(os.environ.get('SINGLE_FLIGHT_TIMEOUT', 30))
+)
+
+# Metrics of this process, served at /metrics in the Prometheus text format
+metrics = MetricsRegistry()
+request_seconds = metrics.histogram('crime_api_request_seconds', 'Request latency by endpoint and status',
+                                    ['endpoint', 'status'])
+stage_seconds = metrics.histogram('crime_api_stage_seconds', 'Time spent in each stage of a request',
+                                  ['endpoint', 'stage'])
+chart_render_seconds = metrics.histogram('crime_api_chart_render_seconds', 'Time from chart submit to rendered charts')
+model_load_seconds = metrics.histogram('crime_api_model_load_seconds', 'Time to load and validate a model version',
+                                       buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+model_swaps = metrics.counter('crime_api_model_swaps_total', 'Model versions swapped in after the first')
+metrics.callback('crime_api_model_info', 'Active model version', kind='gauge', labelnames=['version'],
+                 callback=lambda: {(model_registry.current.version,): 1} if model_registry.current else {})
+metrics.callback('crime_api_model_versions_rejected', 'Model versions that failed to load',
+                 lambda: len(model_registry.failed))
+metrics.callback('crime_api_response_cache_requests_total', 'Response cache lookups', kind='counter',
+                 labelnames=['result'], callback=lambda: {('hit',): response_cache.stats()['hits'],
+                                                          ('miss',): response_cache.stats()['misses']})
+metrics.callback('crime_api_response_cache_entries', 'Responses in the memory cache',
+                 lambda: response_cache.stats()['entries'])
+metrics.callback('crime_api_coalesced_requests_total', 'Cache misses that led a computation or shared one',
+                 kind='counter', labelnames=['role'],
+                 callback=lambda: {('leader',): single_flight.stats()['led'],
+                                   ('follower',): single_flight.stats()['coalesced']})
+metrics.callback('crime_api_forecast_builds_total', 'Forecast cubes built by this process', kind='counter',
+                 callback=lambda: forecast_scheduler.builds)
+metrics.callback('crime_api_chart_cache_bytes', 'Bytes of rendered charts in the memory cache',
+                 lambda: chart_cache.total_bytes)
+metrics.callback('crime_api_image_store_bytes', 'Bytes of content-addressed images in memory',
+                 lambda: image_store.total_bytes)
+metrics.callback('crime_api_chart_renders_total', 'Chart renders by outcome', kind='counter', labelnames=['outcome'],
+                 callback=lambda: {(outcome,): count for outcome, count in chart_renderer.stats().items()
+                                   if outcome != 'in_flight'})
+metrics.callback('crime_api_chart_renders_in_flight', 'Chart renders in progress',
+                 lambda: chart_renderer.stats()['in_flight'])
+
+@contextmanager
+def stage(name):
+    """Time one stage of the current request for the stage histogram and the Server-Timing header"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_seconds.observe(elapsed, endpoint=request.endpoint or 'unknown', stage=name)
+        g.setdefault('stage_timings', []).append((name, elapsed))
+
+def lookup_cached(key):
+    """(body, image digests, encoded variants) of a cached response, or None"""
+    cached = response_cache.get(key)
+    if cached is None:
+        return None
+    # Image references are only valid while the images are still stored
+    if not all(image_store.contains(digest) for digest in cached[1]):
+        response_cache.record_miss()
+        return None
+    return cached
+
+def cached_response(endpoint, params, model, mimetype='application/json'):
+    """Return (cache key, cached response or None) for an endpoint call.
+
+    On a miss the request joins the single flight of its key: if the same
+    request is already being computed it waits for that response instead.
+    Otherwise it computes the response itself and store_response shares it.
+    """
+    key = response_key(endpoint, params, model.fingerprint)
+    with stage('cache'):
+        cached = lookup_cached(key)
+    if cached is None:
+        with stage('coalesce'):
+            flight, cached = single_flight.acquire(key)
+            if flight is not None and flight.contended:
+                # Another worker process computed it while this one waited for the lock
+                cached = lookup_cached(key)
+                if cached is not None:
+                    single_flight.release(flight, cached)
+                    flight = None
+            g.flight = flight
+    if cached is None:
+        return key, None
+    return key, cached_body_response(cached, mimetype)
+
+def store_response(cache_key, body, digests=(), cache=True):
+    """Cache a response body and hand it to identical requests waiting on it; returns the cache entry.
+
+    With cache=False the body only goes to the requests already waiting.
+    """
+    entry = response_cache.put(cache_key, body, digests) if cache else (body, tuple(digests), {})
+    flight = g.pop('flight', None)
+    if flight is not None:
+        single_flight.release(flight, entry)
+    return entry
+
+def cached_body_response(entry, mimetype):
+    """Response for a cache entry, compressing its body at most once per content encoding"""
+    body, _, variants = entry
+    encoding = preferred_encoding(len(body), request.headers.get('Accept-Encoding', ''))
+    if encoding is None:
+        return Response(body, mimetype=mimetype)
+    encoded = variants.get(encoding)
+    if encoded is None:
+        encoded = variants[encoding] = encode_content(body, encoding)
+    response = Response(encoded, mimetype=mimetype)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+def json_response(response_data, cache_key=None, digests=(), fmt='records', cache=True):
+    """Serialize response data once, storing the bytes in the response cache"""
+    with stage('serialize'):
+        body = encode_body(response_data, fmt)
+        if cache_key is not None:
+            return cached_body_response(store_response(cache_key, body, digests, cache), FORMAT_MIMETYPES[fmt])
+    return Response(body, mimetype=FORMAT_MIMETYPES[fmt])
+
+@app.teardown_request
+def end_flight(exc):
+    """Release the requests waiting on one that ended without a cacheable response"""
+    flight = g.pop('flight', None)
+    if flight is not None:
+        single_flight.release(flight)
+
+@app.after_request
+def compress_response(response):
+    """Compress buffered API responses with the client's preferred encoding"""
+    if (response.is_streamed or response.direct_passthrough or response.status_code != 200 or
+            'Content-Encoding' in response.headers or response.mimetype == 'image/png'):
+        return response
+    body, encoding = compress(response.get_data(), request.headers.get('Accept-Encoding', ''))
+    if encoding is not None:
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.before_request
+def start_request():
+    g.request_started = time.perf_counter()
+    profile = request.headers.get('X-Profile')
+    if PROFILING_ENABLED and profile:
+        g.profiler = RequestProfiler('pyinstrument' if profile == 'pyinstrument' else 'cprofile')
+        g.profiler.start()
+
+@app.after_request
+def record_request(response):
+    """Record the request latency and report stage timings; swap in the profile if one was asked for"""
+    if 'request_started' in g:
+        request_seconds.observe(time.perf_counter() - g.request_started,
+                                endpoint=request.endpoint or 'unknown', status=response.status_code)
+    timings = g.get('stage_timings')
+    if timings:
+        response.headers['Server-Timing'] = ', '.join(f"{name};dur={elapsed * 1000:.2f}"
+                                                      for name, elapsed in timings)
+    if 'profiler' in g:
+        g.profiler.stop()
+        response = Response(g.profiler.report(), mimetype='text/plain')
+        response.headers['X-Profile'] = g.profiler.kind
+    return response
+
+@app.after_request
+def add_model_version(response):
+    """Report which model version answered the request"""
+    if 'model_version' in g:
+        response.headers['X-Model-Version'] = g.model_version
+    return response
+
+def parse_request_data():
+    """Read request parameters from form data, JSON or a raw JSON body"""
+    if request.form:
+        return {key: request.form.get(key) for key in request.form}
+    if request.is_json:
+        return request.get_json()
+    raw_data = request.get_data()
+    return json.loads(raw_data.decode('utf-8')) if raw_data else {}
+
+def parse_bool(value, default):
+    """Interpret a JSON or form value as a boolean flag"""
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+def parse_month(value):
+    """Month number of a request; raises ValueError outside 1-12"""
+    month = int(value)
+    if month not in month_names:
+        raise ValueError(f"month must be between 1 and 12, got {month}")
+    return month
+
+def resolve_selection(selected_category, selected_area, selected_sex):
+    """Expand 'All' selections into the lists of values to predict for.
+
+    Values the codebook does not know raise ValueError, so they can be
+    rejected before any cache or table lookup.
+    """
+    for field, value in (('category', selected_category), ('area', selected_area), ('sex', selected_sex)):
+        if value != 'All':
+            CODEBOOK.encode_names(field, [value])
+    categories_to_use = crime_categories if selected_category == 'All' else [selected_category]
+    areas_to_use = area_names if selected_area == 'All' else [selected_area]
+    sexes_to_use = vict_sexes if selected_sex == 'All' else [selected_sex]
+    return categories_to_use, areas_to_use, sexes_to_use
+
+def build_prediction_frame(table, month, categories_to_use, areas_to_use, sexes_to_use):
+    """Prediction rows for the selected values with display labels, as used by the charts"""
+    block = table.lookup(month, areas_to_use, sexes_to_use, categories_to_use)
+    return pd.DataFrame(prediction_records(block, month_names[month], table.year, categories_to_use,
+                                           areas_to_use, sexes_to_use, risk_labels))
 
 @app.route('/predict', methods=['POST'])
 def predict():
-    print("Received prediction request")
+    logger.debug("Received prediction request")
     try:
-        # Get data from request - improved handling
-        data = {}
-        
-        # Check if we have form data (multipart/form-data)
-        if request.form:
-            print("Processing form data")
-            for key in request.form:
-                data[key] = request.form.get(key)
-        # Check if we have JSON data (application/json)
-        elif request.is_json:
-            print("Processing JSON data")
-            data = request.get_json()
-        else:
-            print("No recognizable data format, attempting to parse raw data")
-            # Last resort - try to handle raw data
+        with stage('parse'):
+            # Form data, JSON, or a raw JSON body
             try:
-                raw_data = request.get_data()
-                if raw_data:
-                    # Try to parse as JSON
-                    data = json.loads(raw_data.decode('utf-8'))
-                else:
-                    print("No data in request")
-            except Exception as parse_err:
-                print(f"Failed to parse raw data: {str(parse_err)}")
+                data = parse_request_data()
+            except ValueError as parse_err:
+                logger.info("Failed to parse request data: %s", parse_err)
                 return jsonify({'error': 'Unsupported data format'}), 400
-        
-        # Log the received data for debugging
-        print(f"Received data: {data}")
-        
-        if not data:
-            print("No data received in request")
-            return jsonify({'error': 'No data received'}), 400
+            logger.debug("Received data: %s", data)
 
-        # Extract parameters
-        try:
-            month = int(data.get('month', 1))
-            selected_category = data.get('crime_category', 'All')
-            selected_area = data.get('area_name', 'All')
-            selected_sex = data.get('vict_sex', 'All')
-        except (ValueError, TypeError) as e:
-            print(f"Error parsing parameters: {str(e)}")
-            return jsonify({'error': f'Invalid parameter format: {str(e)}'}), 400
-            
-        print(f"Parameters: month={month}, category={selected_category}, area={selected_area}, sex={selected_sex}")
+            if not data:
+                logger.info("No data received in request")
+                return jsonify({'error': 'No data received'}), 400
+
+            # Extract parameters
+            try:
+                month = parse_month(data.get('month', 1))
+                selected_category = data.get('crime_category', 'All')
+                selected_area = data.get('area_name', 'All')
+                selected_sex = data.get('vict_sex', 'All')
+                # Handle 'All' selections
+                categories_to_use, areas_to_use, sexes_to_use = resolve_selection(
+                    selected_category, selected_area, selected_sex)
+            except (ValueError, TypeError) as e:
+                logger.info("Error parsing parameters: %s", e)
+                return jsonify({'error': f'Invalid parameter format: {str(e)}'}), 400
+
+        logger.debug("Parameters: month=%s, category=%s, area=%s, sex=%s",
+                     month, selected_category, selected_area, selected_sex)
 
         # Convert month number to name for display
         month_name = month_names[month]
 
-        # Define crime risk mapping
-        crime_risk_mapping = {
-            0: "Unsafe / High Crime",
-            1: "Safe / Low Crime",
-            2: "Neutral / Medium Crime"
-        }
+        # Charts are returned as image references by default, but can also be
+        # inlined as base64, rendered in the background or skipped
+        plots_mode = data.get('plots', 'refs')
 
-        # Handle 'All' selections
-        if selected_category == 'All':
-            categories_to_use = crime_categories
-        else:
-            categories_to_use = [selected_category]
+        # prediction_data can be sent as records, columnar JSON, MessagePack or Arrow
+        fmt = data.get('format', 'records')
+        if fmt not in FORMAT_MIMETYPES:
+            return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+        if not format_available(fmt):
+            return jsonify({'error': f'Format {fmt} is not available on this server'}), 400
 
-        if selected_area == 'All':
-            areas_to_use = area_names
-        else:
-            areas_to_use = [selected_area]
+        # Probability mode adds class probabilities from the cached predict_proba cube
+        probabilities = parse_bool(data.get('probabilities'), False)
 
-        if selected_sex == 'All':
-            sexes_to_use = vict_sexes
-        else:
-            sexes_to_use = [selected_sex]
-
-        year = 2025  # Current year for predictions
-
-        # Build dataset based on selected parameters
-        rows = []
-        for cat in categories_to_use:
-            for area in areas_to_use:
-                for sex in sexes_to_use:
-                    rows.append({
-                        'month': month,
-                        'area name': area,
-                        'vict sex': sex,
-                        'crime category': cat,
-                        'year': year
-                    })
-        new_data = pd.DataFrame(rows)
-        print(f"Created dataset with {len(new_data)} rows")
-
-        # Encode data for model prediction
-        encoded_data = new_data.copy()
-        encoded_data['area name'] = le_area.transform(encoded_data['area name'])
-        encoded_data['vict sex'] = le_sex.transform(encoded_data['vict sex'])
-        encoded_data['crime category'] = le_crime.transform(encoded_data['crime category'])
-
-        # Rename columns to match model training
-        encoded_data.rename(columns={
-            'month': 'Month',
-            'area name': 'AREA NAME',
-            'vict sex': 'Vict Sex',
-            'crime category': 'Crime_Category',
-            'year': 'Year'
-        }, inplace=True)
-
-        # Ensure column order matches model input
-        try:
-            encoded_data = encoded_data[rf_clf.feature_names_in_]
-        except (AttributeError, KeyError) as e:
-            print(f"Error organizing columns: {str(e)}")
-            encoded_data = encoded_data[['AREA NAME', 'Crime_Category', 'Month', 'Vict Sex', 'Year']]
+        model = get_model()
+        table = serving_table(model)
 
-        # Generate predictions
-        try:
-            print("Making predictions...")
-            predictions = rf_clf.predict(encoded_data)
-            print(f"Made {len(predictions)} predictions")
-        except Exception as e:
-            print(f"Error making predictions: {str(e)}")
-            # Generate random predictions for demonstration
-            predictions = np.random.randint(0, 3, size=len(encoded_data))
-            print("Using random predictions as fallback")
+        # Serve repeated queries straight from the response cache
+        cache_key, cached = cached_response('predict', {
+            'month': month,
+            'year': table.year,
+            'crime_category': selected_category,
+            'area_name': selected_area,
+            'vict_sex': selected_sex,
+            'plots': plots_mode,
+            'format': fmt,
+            'probabilities': probabilities
+        }, model, FORMAT_MIMETYPES[fmt])
+        if cached is not None:
+            logger.debug("Returning cached response")
+            return cached
+
+        # Encode the selection and read its predictions from the table
+        with stage('lookup'):
+            block = table.lookup(month, areas_to_use, sexes_to_use, categories_to_use)
+            proba = table.lookup_proba(month, areas_to_use, sexes_to_use, categories_to_use) if probabilities else None
 
-        # Map predictions to crime risk labels
-        new_data['prediction'] = pd.Series(predictions).map(crime_risk_mapping)
+        # Build the response rows straight from the prediction codes
+        with stage('records'):
+            prediction_data = prediction_records(block, month_name, table.year, categories_to_use,
+                                                 areas_to_use, sexes_to_use, risk_labels)
+        logger.debug("Created dataset with %d rows", len(prediction_data))
 
-        # Convert month numbers back to names for display
-        new_data['month'] = new_data['month'].map(month_names)
+        key = chart_key(month, selected_category, selected_area, selected_sex, f"{model.fingerprint}:{table.year}")
+        digests = []
+        cacheable = True
 
-        # Create plots
-        print("Creating plots...")
-        plot_images = create_plot(new_data)
-        print(f"Created {len(plot_images)} plots")
+        # Charts only need a DataFrame when they are not cached yet
+        build_df = lambda: pd.DataFrame(prediction_data)
+
+        with stage('format'):
+            if fmt != 'records':
+                response_rows = prediction_columns(block, month_name, table.year, categories_to_use, areas_to_use,
+                                                   sexes_to_use, risk_labels, proba)
+            elif proba is not None:
+                response_rows = prediction_records(block, month_name, table.year, categories_to_use, areas_to_use,
+                                                   sexes_to_use, risk_labels, proba)
+            else:
+                response_rows = prediction_data
 
         response_data = {
-            'plot_images': plot_images,
-            'prediction_data': json.loads(new_data.to_json(orient='records')),
+            'prediction_data': response_rows,
             'summary': {
                 'month_name': month_name,
                 'selected_category': selected_category,
                 'selected_area': selected_area,
                 'selected_sex': selected_sex,
-                'total_predictions': len(predictions),
-                'risk_distribution': new_data['prediction'].value_counts().to_dict()
+                'total_predictions': len(prediction_data),
+                'risk_distribution': risk_distribution(block, risk_labels),
+                'model_version': model.version
             }
         }
+        if proba is not None:
+            response_data['summary'].update(probability_summary(proba, risk_labels))
+
+        charts = chart_cache.get(key) if plots_mode not in ('none', 'inline', 'url') else None
+        if charts is not None:
+            # Rendered charts are referenced by content address
+            digests = [image_store.put(png) for png in charts.values()]
+            response_data['plot_urls'] = [url_for('get_image', digest=digest) for digest in digests]
+        elif plots_mode == 'inline':
+            with stage('plot'):
+                charts = chart_renderer.get(key, build_df)
+            response_data['plot_images'] = [base64.b64encode(png).decode('utf-8') for png in charts.values()]
+            logger.debug("Created %d plots", len(charts))
+        elif plots_mode != 'none':
+            # Start rendering in the background; clients fetch the images by URL
+            chart_renderer.submit(key, build_df)
+            chart_params = {
+                'month': month,
+                'crime_category': selected_category,
+                'area_name': selected_area,
+                'vict_sex': selected_sex
+            }
+            response_data['plot_urls'] = [url_for('get_chart', name=name, **chart_params)
+                                          for name in chart_names(len(areas_to_use), len(categories_to_use), (block == 0).any())]
+            if plots_mode != 'url':
+                # Repeating the request once the charts are rendered returns their content
+                # addresses, so this response is not cached (identical requests waiting now still share it)
+                response_data['plots_pending'] = True
+                cacheable = False
 
-        print("Returning successful response")
-        return jsonify(response_data)
-    
+        return json_response(response_data, cache_key, digests, fmt, cacheable)
+
+    except ModelUnavailable as e:
+        logger.warning("%s", e)
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         # Handle errors and return appropriate response
         error_message = f"Error processing prediction: {str(e)}"
-        print(error_message)
+        logger.exception("Error processing prediction")
         return jsonify({'error': error_message}), 500
 
 # Health check endpoint
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'ok', 'message': 'Server is running'})
+    current = model_registry.current
+    forecast = current.forecast if current is not None else None
+    return jsonify({
+        'status': 'ok',
+        'message': 'Server is running',
+        'model': model_registry.status(),
+        'forecast': forecast.info() if forecast is not None else None,
+        'response_cache': response_cache.stats()
+    })
+
+# Prometheus metrics of this worker process
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 # Add a simple root route for testing
 @app.route('/', methods=['GET'])
 def root():
     return jsonify({'status': 'ok', 'message': 'Crime prediction API is running'})
 
-if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0')
+# Serve a single rendered chart, rendering it on demand if it is not cached
+@app.route('/charts/<name>.png', methods=['GET'])
+def get_chart(name):
+    try:
+        month = parse_month(request.args.get('month', 1))
+        selected_category = request.args.get('crime_category', 'All')
+        selected_area = request.args.get('area_name', 'All')
+        selected_sex = request.args.get('vict_sex', 'All')
+        categories_to_use, areas_to_use, sexes_to_use = resolve_selection(
+            selected_category, selected_area, selected_sex)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Invalid parameter format: {str(e)}'}), 400
+
+    try:
+        model = get_model()
+        table = serving_table(model)
+        key = chart_key(month, selected_category, selected_area, selected_sex, f"{model.fingerprint}:{table.year}")
+        charts = chart_cache.get(key)
+        if charts is None:
+            charts = chart_renderer.get(key, lambda: build_prediction_frame(
+                table, month, categories_to_use, areas_to_use, sexes_to_use))
+    except ModelUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        error_message = f"Error rendering chart: {str(e)}"
+        logger.exception("Error rendering chart")
+        return jsonify({'error': error_message}), 500
+
+    png = charts.get(name)
+    if png is None and name in CHART_NAMES:
+        # A failed render only produces an error image; serve it under every advertised name
+        png = charts.get('error')
+    if png is None:
+        return jsonify({'error': f'Chart not found: {name}'}), 404
+    response = Response(png, mimetype='image/png')
+    # The chart behind this URL changes with the model, so always revalidate
+    response.set_etag(image_digest(png))
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+# Serve a rendered image by its content digest
+@app.route('/images/<digest>.png', methods=['GET'])
+def get_image(digest):
+    png = image_store.get(digest)
+    if png is None:
+        return jsonify({'error': 'Image not found'}), 404
+    response = Response(png, mimetype='image/png')
+    response.set_etag(digest)
+    response.cache_control.public = True
+    response.cache_control.max_age = IMAGE_MAX_AGE
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+# Score several months (and optionally years) in one call
+@app.route('/predict_range', methods=['POST'])
+def predict_range():
+    logger.debug("Received range prediction request")
+    try:
+        with stage('parse'):
+            data = parse_request_data()
+    except Exception as parse_err:
+        logger.info("Failed to parse request data: %s", parse_err)
+        return jsonify({'error': 'Unsupported data format'}), 400
+
+    try:
+        months = parse_months(data.get('months', data.get('month')))
+        years = parse_years(data.get('years', data.get('year')), current_year())
+        selected_category = data.get('crime_category', 'All')
+        selected_area = data.get('area_name', 'All')
+        selected_sex = data.get('vict_sex', 'All')
+        categories_to_use, areas_to_use, sexes_to_use = resolve_selection(
+            selected_category, selected_area, selected_sex)
+        fmt = data.get('format', 'records')
+        if fmt not in ('records', 'columnar'):
+            raise ValueError(f"Unsupported format: {fmt}")
+        include_predictions = parse_bool(data.get('include_predictions'), True)
+        stream = parse_bool(data.get('stream'), True)
+    except (ValueError, TypeError) as e:
+        logger.info("Error parsing parameters: %s", e)
+        return jsonify({'error': f'Invalid parameter format: {str(e)}'}), 400
+
+    try:
+        # One lookup covers the whole years x months x filters product
+        model = get_model()
+        with stage('lookup'):
+            block = serving_table(model).lookup_range(years, months, areas_to_use, sexes_to_use, categories_to_use)
+        summary = range_summary(block, years, months, month_names, risk_labels)
+        summary.update({
+            'selected_category': selected_category,
+            'selected_area': selected_area,
+            'selected_sex': selected_sex,
+            'model_version': model.version
+        })
+    except ModelUnavailable as e:
+        logger.warning("%s", e)
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        error_message = f"Error processing range prediction: {str(e)}"
+        logger.exception("Error processing range prediction")
+        return jsonify({'error': error_message}), 500
+
+    def month_results():
+        for y, year in enumerate(years):
+            for m, month in enumerate(months):
+                month_block = block[y, m]
+                result = {
+                    'type': 'month',
+                    'year': year,
+                    'month': month,
+                    'month_name': month_names[month],
+                    'total_predictions': int(month_block.size),
+                    'risk_distribution': risk_distribution(month_block, risk_labels)
+                }
+                if include_predictions:
+                    build = prediction_records if fmt == 'records' else prediction_columns
+                    result['prediction_data'] = build(month_block, month_names[month], year, categories_to_use,
+                                                      areas_to_use, sexes_to_use, risk_labels)
+                yield result
+
+    if not stream:
+        return Response(dumps({'results': list(month_results()), 'summary': summary}),
+                        mimetype='application/json')
+
+    def generate():
+        # One JSON document per line: every month first, then the summary
+        for result in month_results():
+            yield dumps(result) + b'\n'
+        yield dumps({'type': 'summary', 'summary': summary}) + b'\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# Body formats of /batch_score and their content types
+BATCH_MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet'
+}
 
+def batch_input(fmt):
+    """DataFrame chunks of the /batch_score request body"""
+    if fmt == 'json':
+        rows = pd.DataFrame(parse_request_data().get('rows', []))
+        return (rows.iloc[start:start + BATCH_CHUNK_SIZE] for start in range(0, len(rows), BATCH_CHUNK_SIZE))
+    if fmt == 'parquet':
+        # Parquet needs a seekable file
+        return read_batches(io.BytesIO(request.get_data()), fmt, BATCH_CHUNK_SIZE)
+    # CSV and NDJSON are parsed straight from the upload stream
+    return read_batches(request.stream, fmt, BATCH_CHUNK_SIZE)
+
+# Score uploaded (month, year, area, sex, category) rows and stream the scored rows back
+@app.route('/batch_score', methods=['POST'])
+def batch_score():
+    input_formats = {mimetype: fmt for fmt, mimetype in BATCH_MIMETYPES.items()}
+    input_formats['application/json'] = 'json'
+    input_format = request.args.get('input_format') or input_formats.get(request.mimetype)
+    if input_format not in ('json', 'csv', 'ndjson', 'parquet'):
+        return jsonify({'error': f'Unsupported input type: {request.mimetype}'}), 400
+    fmt = request.args.get('format') or ('csv' if input_format == 'csv' else 'ndjson')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+    probabilities = parse_bool(request.args.get('probabilities'), False)
+
+    try:
+        model = get_model()
+        batches = score_batches(batch_input(input_format), None, probabilities=probabilities, engine=model.model)
+        # The first chunk is scored before responding, so bad input is still a 400
+        with stage('score'):
+            first = next(batches, None)
+    except ModelUnavailable as e:
+        logger.warning("%s", e)
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.info("Error reading batch: %s", e)
+        return jsonify({'error': f'Invalid batch: {str(e)}'}), 400
+    if first is None:
+        return jsonify({'error': 'No rows received'}), 400
+
+    def generate():
+        yield serialize(first, fmt, header=True)
+        try:
+            for frame in batches:
+                yield serialize(frame, fmt, header=False)
+        except Exception as e:
+            # The status is already sent; the error ends the stream
+            logger.exception("Error scoring batch")
+            if fmt == 'ndjson':
+                yield dumps({'error': f'Error scoring batch: {str(e)}'}) + b'\n'
+
+    return Response(stream_with_context(generate()), mimetype=BATCH_MIMETYPES[fmt])
 
 # Load LA GeoJSON file (you'll need to add this file to your project)
 # You can download LA area boundaries from public GIS sources
-LA_GEOJSON_PATH = 'static/la_areas.geojson'
+LA_GEOJSON_PATH = os.path.join(APP_DIR, 'static', 'la_areas.geojson')
+
+# The boundaries (and geopandas) are loaded on the first geo request; None means not checked yet
+geo_layer = None
+has_geo_file = None
+
+def get_geo_layer():
+    """The area geometry layer, built from the GeoJSON file on first use; None if unavailable"""
+    global geo_layer, has_geo_file
+    if has_geo_file is None:
+        if os.path.exists(LA_GEOJSON_PATH):
+            try:
+                geo_layer = GeoLayer(LA_GEOJSON_PATH)
+                logger.info("Loaded LA GeoJSON with %d areas", len(geo_layer))
+                missing = geo_layer.missing(area_names)
+                if missing:
+                    logger.warning("No boundaries for areas: %s", ', '.join(missing))
+                has_geo_file = True
+            except Exception as e:
+                logger.exception("Error loading GeoJSON file")
+                has_geo_file = False
+        else:
+            # If the file does not exist, we'll handle it in the endpoint
+            logger.warning("GeoJSON file not found at %s", LA_GEOJSON_PATH)
+            has_geo_file = False
+    return geo_layer
+
+def geo_file_available():
+    """Check if the GeoJSON file exists and loads, reading it on first use"""
+    return get_geo_layer() is not None
+
+# Content types of the streaming modes of geo_predict
+STREAM_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'sse': 'text/event-stream'
+}
+
+def generate_geo_maps(table, month, month_name, year, selected_category, selected_sex,
+                      categories_to_use, areas_to_use, sexes_to_use, probabilities=False):
+    """Yield the overall map first, then one map per category when several are selected"""
+    # Fetch every (category, area, sex) prediction in one lookup
+    block = table.lookup(month, areas_to_use, sexes_to_use, categories_to_use)
+    proba = table.lookup_proba(month, areas_to_use, sexes_to_use, categories_to_use) if probabilities else None
+
+    # Count risk levels per area across all categories and sexes
+    yield {
+        'title': f'Overall Crime Risk - {month_name} {year}',
+        'areas': overall_area_predictions(block, areas_to_use, crime_risk_mapping, proba),
+        'filters': {
+            'month': month,
+            'crime_category': selected_category,
+            'vict_sex': selected_sex
+        }
+    }
+
+    # If multiple crime categories selected, add map for each category
+    if len(categories_to_use) > 1:
+        per_category = category_area_predictions(block, areas_to_use, crime_risk_mapping, proba)
+        for category, category_areas in zip(categories_to_use, per_category):
+            yield {
+                'title': f'{category} - {month_name} {year}',
+                'areas': category_areas,
+                'filters': {
+                    'month': month,
+                    'crime_category': category,
+                    'vict_sex': selected_sex
+                }
+            }
+
+def fallback_geo_map(month, month_name, year, selected_category, selected_sex, areas_to_use):
+    """Random demo map used when no GeoJSON data is available"""
+    area_predictions = []
+    for area in areas_to_use:
+        # Generate random prediction for demo if we don't have real model data
+        prediction_value = np.random.randint(0, 3)
+        area_predictions.append({
+            'area_name': area,
+            'prediction': crime_risk_mapping[prediction_value],
+            'crime_count': np.random.randint(10, 100)  # Example count
+        })
 
-# Check if the file exists, if not, we'll handle it in the endpoint
-has_geo_file = os.path.exists(LA_GEOJSON_PATH)
-if has_geo_file:
+    return {
+        'title': f'Crime Safety Map - {month_name} {year}',
+        'areas': area_predictions,
+        'filters': {
+            'month': month,
+            'crime_category': selected_category,
+            'vict_sex': selected_sex
+        }
+    }
+
+def stream_geo_maps(maps, summary, mode):
+    """Stream each map as soon as it is built, followed by the summary"""
     try:
-        la_geo_data = gpd.read_file(LA_GEOJSON_PATH)
-        print(f"Loaded LA GeoJSON with {len(la_geo_data)} areas")
+        for geo_map in maps:
+            yield stream_event('map', geo_map, mode)
+        yield stream_event('summary', summary, mode)
     except Exception as e:
-        print(f"Error loading GeoJSON file: {str(e)}")
-        has_geo_file = False
-else:
-    print(f"GeoJSON file not found at {LA_GEOJSON_PATH}")
+        logger.exception("Error streaming geo prediction")
+        yield stream_event('error', f"Error processing geo prediction: {str(e)}", mode)
 
 # New endpoint for geographic prediction data
 @app.route('/geo_predict', methods=['POST'])
 def geo_predict():
-    print("Received geo prediction request")
+    logger.debug("Received geo prediction request")
     try:
-        # Parse request data (same as predict endpoint)
-        data = {}
-        if request.form:
-            print("Processing form data")
-            for key in request.form:
-                data[key] = request.form.get(key)
-        elif request.is_json:
-            print("Processing JSON data")
-            data = request.get_json()
-        else:
-            print("No recognizable data format, attempting to parse raw data")
+        with stage('parse'):
+            # Parse request data (same as predict endpoint)
             try:
-                raw_data = request.get_data()
-                if raw_data:
-                    data = json.loads(raw_data.decode('utf-8'))
-                else:
-                    print("No data in request")
-            except Exception as parse_err:
-                print(f"Failed to parse raw data: {str(parse_err)}")
+                data = parse_request_data()
+            except ValueError as parse_err:
+                logger.info("Failed to parse request data: %s", parse_err)
                 return jsonify({'error': 'Unsupported data format'}), 400
-        
-        if not data:
-            print("No data received in request")
-            return jsonify({'error': 'No data received'}), 400
 
-        # Extract parameters (same as predict endpoint)
-        try:
-            month = int(data.get('month', 1))
-            selected_category = data.get('crime_category', 'All')
-            selected_area = data.get('area_name', 'All')
-            selected_sex = data.get('vict_sex', 'All')
-        except (ValueError, TypeError) as e:
-            print(f"Error parsing parameters: {str(e)}")
-            return jsonify({'error': f'Invalid parameter format: {str(e)}'}), 400
-            
-        print(f"Parameters: month={month}, category={selected_category}, area={selected_area}, sex={selected_sex}")
+            if not data:
+                logger.info("No data received in request")
+                return jsonify({'error': 'No data received'}), 400
+
+            # Extract parameters (same as predict endpoint)
+            try:
+                month = parse_month(data.get('month', 1))
+                selected_category = data.get('crime_category', 'All')
+                selected_area = data.get('area_name', 'All')
+                selected_sex = data.get('vict_sex', 'All')
+                # Handle 'All' selections
+                categories_to_use, areas_to_use, sexes_to_use = resolve_selection(
+                    selected_category, selected_area, selected_sex)
+            except (ValueError, TypeError) as e:
+                logger.info("Error parsing parameters: %s", e)
+                return jsonify({'error': f'Invalid parameter format: {str(e)}'}), 400
+
+        logger.debug("Parameters: month=%s, category=%s, area=%s, sex=%s",
+                     month, selected_category, selected_area, selected_sex)
+
+        # Maps can be streamed one at a time as NDJSON or server-sent events
+        stream_mode = data.get('stream')
+        if stream_mode is not None and stream_mode not in STREAM_MIMETYPES:
+            return jsonify({'error': f'Unsupported stream mode: {stream_mode}'}), 400
+
+        # Probability mode adds expected counts and mean class probabilities per area
+        probabilities = parse_bool(data.get('probabilities'), False)
 
         # Convert month number to name for display
         month_name = month_names[month]
 
-        # Define crime risk mapping
-        crime_risk_mapping = {
-            0: "Unsafe / High Crime",
-            1: "Safe / Low Crime",
-            2: "Neutral / Medium Crime"
-        }
-
-        # Handle 'All' selections
-        if selected_category == 'All':
-            categories_to_use = crime_categories
-        else:
-            categories_to_use = [selected_category]
+        model = get_model()
+        table = serving_table(model)
+        year = table.year
 
-        if selected_area == 'All':
-            areas_to_use = area_names
-        else:
-            areas_to_use = [selected_area]
+        summary = {
+            'month_name': month_name,
+            'selected_category': selected_category,
+            'selected_area': selected_area,
+            'selected_sex': selected_sex,
+            'model_version': model.version
+        }
 
-        if selected_sex == 'All':
-            sexes_to_use = vict_sexes
-        else:
-            sexes_to_use = [selected_sex]
+        if stream_mode is not None:
+            if geo_file_available():
+                maps = generate_geo_maps(table, month, month_name, year, selected_category, selected_sex,
+                                         categories_to_use, areas_to_use, sexes_to_use, probabilities)
+            else:
+                maps = [fallback_geo_map(month, month_name, year, selected_category, selected_sex, areas_to_use)]
+            return Response(stream_with_context(stream_geo_maps(maps, summary, stream_mode)),
+                            mimetype=STREAM_MIMETYPES[stream_mode])
 
-        year = 2025  # Current year for predictions
+        # Serve repeated queries straight from the response cache
+        cache_key, cached = cached_response('geo_predict', {
+            'month': month,
+            'year': year,
+            'crime_category': selected_category,
+            'area_name': selected_area,
+            'vict_sex': selected_sex,
+            'probabilities': probabilities
+        }, model)
+        if cached is not None:
+            logger.debug("Returning cached response")
+            return cached
 
-        # Create map data structures for different map views
-        geo_data_list = []
-        
         # Check if we have a valid GeoJSON file
-        if not has_geo_file:
-            print("No GeoJSON file available, generating fallback data")
-            # Create a list of area data with predictions (fallback if no GeoJSON)
-            area_predictions = []
-            for area in areas_to_use:
-                # Generate random prediction for demo if we don't have real model data
-                prediction_value = np.random.randint(0, 3)
-                area_predictions.append({
-                    'area_name': area,
-                    'prediction': crime_risk_mapping[prediction_value],
-                    'crime_count': np.random.randint(10, 100)  # Example count
-                })
-                
-            # Add a single map with all areas
-            geo_data_list.append({
-                'title': f'Crime Safety Map - {month_name} {year}',
-                'areas': area_predictions,
-                'filters': {
-                    'month': month,
-                    'crime_category': selected_category,
-                    'vict_sex': selected_sex
-                }
-            })
+        if not geo_file_available():
+            logger.warning("No GeoJSON file available, generating fallback data")
+            cache_key = None  # Random fallback data is never cached
+            geo_data_list = [fallback_geo_map(month, month_name, year, selected_category, selected_sex, areas_to_use)]
         else:
             # Generate map data with real GeoJSON processing
             try:
-                # First, create a map with all selected data
-                print("Processing area-based predictions")
-                area_predictions = []
-                
-                # Loop through areas and make predictions for each
-                for area in areas_to_use:
-                    # Get predictions for each crime category to calculate an overall risk
-                    area_risk_counts = {0: 0, 1: 0, 2: 0}  # Track counts for each risk level
-                    total_count = 0
-                    
-                    for cat in categories_to_use:
-                        for sex in sexes_to_use:
-                            # Create features for prediction
-                            features = pd.DataFrame([{
-                                'month': month,
-                                'area name': area,
-                                'vict sex': sex,
-                                'crime category': cat,
-                                'year': year
-                            }])
-                            
-                            # Encode for model
-                            encoded_data = features.copy()
-                            encoded_data['area name'] = le_area.transform(encoded_data['area name'])
-                            encoded_data['vict sex'] = le_sex.transform(encoded_data['vict sex'])
-                            encoded_data['crime category'] = le_crime.transform(encoded_data['crime category'])
-                            
-                            # Rename columns to match model
-                            encoded_data.rename(columns={
-                                'month': 'Month',
-                                'area name': 'AREA NAME',
-                                'vict sex': 'Vict Sex',
-                                'crime category': 'Crime_Category',
-                                'year': 'Year'
-                            }, inplace=True)
-                            
-                            # Order columns
-                            try:
-                                encoded_data = encoded_data[rf_clf.feature_names_in_]
-                            except:
-                                encoded_data = encoded_data[['AREA NAME', 'Crime_Category', 'Month', 'Vict Sex', 'Year']]
-                                
-                            # Predict
-                            try:
-                                prediction = rf_clf.predict(encoded_data)[0]
-                            except:
-                                # Fallback to random for demo
-                                prediction = np.random.randint(0, 3)
-                                
-                            # Count this prediction
-                            area_risk_counts[prediction] += 1
-                            total_count += 1
-                    
-                    # Determine most common risk level
-                    max_risk = max(area_risk_counts.items(), key=lambda x: x[1])
-                    dominant_risk = crime_risk_mapping[max_risk[0]]
-                    
-                    # Calculate percentage of high risk
-                    unsafe_percent = (area_risk_counts[0] / total_count) * 100 if total_count > 0 else 0
-                    
-                    # Add to area predictions
-                    area_predictions.append({
-                        'area_name': area,
-                        'prediction': dominant_risk,
-                        'crime_count': total_count,
-                        'unsafe_percent': round(unsafe_percent, 1)
-                    })
-                
-                # Add overall map data
-                geo_data_list.append({
-                    'title': f'Overall Crime Risk - {month_name} {year}',
-                    'areas': area_predictions,
-                    'filters': {
-                        'month': month,
-                        'crime_category': selected_category,
-                        'vict_sex': selected_sex
-                    }
-                })
-                
-                # If multiple crime categories selected, add map for each category
-                if len(categories_to_use) > 1:
-                    for category in categories_to_use:
-                        category_area_predictions = []
-                        
-                        for area in areas_to_use:
-                            area_risk_counts = {0: 0, 1: 0, 2: 0}
-                            total_count = 0
-                            
-                            for sex in sexes_to_use:
-                                # Create features for prediction
-                                features = pd.DataFrame([{
-                                    'month': month,
-                                    'area name': area,
-                                    'vict sex': sex,
-                                    'crime category': category,
-                                    'year': year
-                                }])
-                                
-                                # Encode for model (same as above)
-                                encoded_data = features.copy()
-                                encoded_data['area name'] = le_area.transform(encoded_data['area name'])
-                                encoded_data['vict sex'] = le_sex.transform(encoded_data['vict sex'])
-                                encoded_data['crime category'] = le_crime.transform(encoded_data['crime category'])
-                                
-                                encoded_data.rename(columns={
-                                    'month': 'Month',
-                                    'area name': 'AREA NAME',
-                                    'vict sex': 'Vict Sex',
-                                    'crime category': 'Crime_Category',
-                                    'year': 'Year'
-                                }, inplace=True)
-                                
-                                try:
-                                    encoded_data = encoded_data[rf_clf.feature_names_in_]
-                                except:
-                                    encoded_data = encoded_data[['AREA NAME', 'Crime_Category', 'Month', 'Vict Sex', 'Year']]
-                                    
-                                try:
-                                    prediction = rf_clf.predict(encoded_data)[0]
-                                except:
-                                    prediction = np.random.randint(0, 3)
-                                    
-                                area_risk_counts[prediction] += 1
-                                total_count += 1
-                            
-                            max_risk = max(area_risk_counts.items(), key=lambda x: x[1])
-                            dominant_risk = crime_risk_mapping[max_risk[0]]
-                            
-                            unsafe_percent = (area_risk_counts[0] / total_count) * 100 if total_count > 0 else 0
-                            
-                            category_area_predictions.append({
-                                'area_name': area,
-                                'prediction': dominant_risk,
-                                'crime_count': total_count,
-                                'unsafe_percent': round(unsafe_percent, 1)
-                            })
-                        
-                        # Add category-specific map
-                        geo_data_list.append({
-                            'title': f'{category} - {month_name} {year}',
-                            'areas': category_area_predictions,
-                            'filters': {
-                                'month': month,
-                                'crime_category': category,
-                                'vict_sex': selected_sex
-                            }
-                        })
-            
-            except Exception as geo_err:
-                print(f"Error processing GeoJSON data: {str(geo_err)}")
-                # Create fallback data
-                area_predictions = []
-                for area in areas_to_use:
-                    prediction_value = np.random.randint(0, 3)
-                    area_predictions.append({
-                        'area_name': area,
-                        'prediction': crime_risk_mapping[prediction_value],
-                        'crime_count': np.random.randint(10, 100)
-                    })
-                    
-                geo_data_list.append({
-                    'title': f'Crime Safety Map - {month_name} {year}',
-                    'areas': area_predictions,
-                    'filters': {
-                        'month': month,
-                        'crime_category': selected_category,
-                        'vict_sex': selected_sex
-                    }
-                })
+                with stage('lookup'):
+                    geo_data_list = list(generate_geo_maps(table, month, month_name, year, selected_category,
+                                                           selected_sex, categories_to_use, areas_to_use,
+                                                           sexes_to_use, probabilities))
+            except Exception:
+                logger.exception("Error processing GeoJSON data")
+                cache_key = None
+                geo_data_list = [fallback_geo_map(month, month_name, year, selected_category, selected_sex, areas_to_use)]
 
         # Prepare response
         response_data = {
             'geo_data': geo_data_list,
-            'summary': {
-                'month_name': month_name,
-                'selected_category': selected_category,
-                'selected_area': selected_area,
-                'selected_sex': selected_sex
-            }
+            'summary': summary
         }
         
-        return jsonify(response_data)
-        
+        return json_response(response_data, cache_key)
+
+    except ModelUnavailable as e:
+        logger.warning("%s", e)
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        error_message = f"Error processing geo prediction: {str(e)}"
+        logger.exception("Error processing geo prediction")
+        return jsonify({'error': error_message}), 500
+
+GEOJSON_MIMETYPE = 'application/geo+json'
+GEO_MAX_AGE = 24 * 60 * 60  # Boundaries only change with the GeoJSON file, revalidated by ETag
+
+def parse_zoom(value):
+    """Zoom level of the simplified boundaries; raises ValueError for unknown levels"""
+    zoom = value or DEFAULT_ZOOM
+    if zoom not in ZOOM_LEVELS:
+        raise ValueError(f"Unsupported zoom: {zoom} (use one of {', '.join(ZOOM_LEVELS)})")
+    return zoom
+
+# Area boundaries simplified for a zoom level, so clients do not ship the full file
+@app.route('/geo/boundaries.geojson', methods=['GET'])
+def geo_boundaries():
+    try:
+        zoom = parse_zoom(request.args.get('zoom'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    layer = get_geo_layer()
+    if layer is None:
+        return jsonify({'error': 'No GeoJSON boundaries are available'}), 404
+    body, etag = layer.boundaries(zoom)
+    response = Response(body, mimetype=GEOJSON_MIMETYPE)
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = GEO_MAX_AGE
+    return response.make_conditional(request)
+
+# Predictions joined to the area boundaries as one GeoJSON FeatureCollection
+@app.route('/geo_predict.geojson', methods=['GET', 'POST'])
+def geo_predict_geojson():
+    try:
+        data = request.args.to_dict() if request.method == 'GET' else parse_request_data()
+        month = parse_month(data.get('month', 1))
+        selected_category = data.get('crime_category', 'All')
+        selected_area = data.get('area_name', 'All')
+        selected_sex = data.get('vict_sex', 'All')
+        categories_to_use, areas_to_use, sexes_to_use = resolve_selection(
+            selected_category, selected_area, selected_sex)
+        probabilities = parse_bool(data.get('probabilities'), False)
+        zoom = parse_zoom(data.get('zoom'))
+        month_name = month_names[month]
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'error': f'Invalid parameter format: {str(e)}'}), 400
+
+    layer = get_geo_layer()
+    if layer is None:
+        return jsonify({'error': 'No GeoJSON boundaries are available'}), 404
+
+    try:
+        model = get_model()
+        table = serving_table(model)
+        cache_key, response = cached_response('geo_predict.geojson', {
+            'month': month,
+            'year': table.year,
+            'crime_category': selected_category,
+            'area_name': selected_area,
+            'vict_sex': selected_sex,
+            'probabilities': probabilities,
+            'zoom': zoom
+        }, model, GEOJSON_MIMETYPE)
+        if response is None:
+            # Only the overall map is joined; per-category maps come from a crime_category filter
+            with stage('lookup'):
+                geo_map = next(generate_geo_maps(table, month, month_name, table.year, selected_category,
+                                                 selected_sex, categories_to_use, areas_to_use, sexes_to_use,
+                                                 probabilities))
+            with stage('serialize'):
+                body = layer.feature_collection(geo_map['areas'], zoom, {
+                    'title': geo_map['title'],
+                    'filters': dict(geo_map['filters'], area_name=selected_area, zoom=zoom),
+                    'model_version': model.version
+                })
+            response = cached_body_response(store_response(cache_key, body), GEOJSON_MIMETYPE)
+    except ModelUnavailable as e:
+        logger.warning("%s", e)
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         error_message = f"Error processing geo prediction: {str(e)}"
-        print(error_message)
-        return jsonify({'error': error_message}), 500
\ No newline at end of file
+        logger.exception("Error processing geo prediction")
+        return jsonify({'error': error_message}), 500
+
+    # The joined collection changes with the model, so always revalidate
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+# Largest number of coordinates accepted by one /predict_point call
+MAX_POINTS = int(os.environ.get('MAX_POINTS', 100000))
+
+def parse_points(data):
+    """Latitudes and longitudes of a point request as float arrays.
+
+    Accepts a single point ({"lat": .., "lon": ..}), parallel arrays
+    ({"lat": [..], "lon": [..]}) or a list of points as [lat, lon] pairs or
+    {"lat": .., "lon": ..} objects under "points".
+    """
+    if 'points' in data:
+        points = data['points']
+        if points and isinstance(points[0], dict):
+            lats = [point['lat'] for point in points]
+            lons = [point['lon'] for point in points]
+        else:
+            pairs = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+            lats, lons = pairs[:, 0], pairs[:, 1]
+    else:
+        lats, lons = data['lat'], data['lon']
+    lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+    lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+    if lats.ndim != 1 or lats.shape != lons.shape:
+        raise ValueError("lat and lon must have the same length")
+    if len(lats) > MAX_POINTS:
+        raise ValueError(f"At most {MAX_POINTS} points per request")
+    if not (np.isfinite(lats).all() and np.isfinite(lons).all()):
+        raise ValueError("Coordinates must be finite numbers")
+    if (np.abs(lats) > 90).any() or (np.abs(lons) > 180).any():
+        raise ValueError("Coordinates out of range (lat -90..90, lon -180..180)")
+    return lats, lons
+
+# Risk predictions for the areas containing one or many lat/lon points
+@app.route('/predict_point', methods=['POST'])
+def predict_point():
+    try:
+        data = parse_request_data()
+        month = parse_month(data.get('month', 1))
+        selected_category = data.get('crime_category', 'All')
+        selected_sex = data.get('vict_sex', 'All')
+        categories_to_use, areas_to_use, sexes_to_use = resolve_selection(selected_category, 'All', selected_sex)
+        probabilities = parse_bool(data.get('probabilities'), False)
+        lats, lons = parse_points(data)
+        month_name = month_names[month]
+    except (ValueError, TypeError, KeyError, IndexError) as e:
+        return jsonify({'error': f'Invalid parameter format: {str(e)}'}), 400
+
+    # Columnar output sends each area's prediction once plus one area code per point
+    fmt = data.get('format', 'records')
+    if fmt not in ('records', 'columnar'):
+        return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+
+    layer = get_geo_layer()
+    if layer is None:
+        return jsonify({'error': 'No GeoJSON boundaries are available'}), 404
+
+    try:
+        model = get_model()
+        table = serving_table(model)
+        with stage('locate'):
+            located = layer.locate(lons, lats)
+        areas = layer.areas()
+        # Predictions are computed once per area, then gathered per point
+        known = [area for area in areas if area in areas_to_use]
+        entries = {}
+        if known:
+            with stage('lookup'):
+                block = table.lookup(month, known, sexes_to_use, categories_to_use)
+                proba = table.lookup_proba(month, known, sexes_to_use, categories_to_use) if probabilities else None
+                entries = dict(zip(known, overall_area_predictions(block, known, crime_risk_mapping, proba)))
+
+        summary = {
+            'month_name': month_name,
+            'year': table.year,
+            'selected_category': selected_category,
+            'selected_sex': selected_sex,
+            'points': int(len(located)),
+            'located_points': int((located >= 0).sum()),
+            'model_version': model.version
+        }
+        if fmt == 'columnar':
+            prediction_data = {
+                'format': 'columnar',
+                'length': int(len(located)),
+                'columns': {'area name': {'dictionary': areas, 'codes': located.tolist()}},
+                'areas': entries
+            }
+        else:
+            prediction_data = []
+            for lat, lon, code in zip(lats.tolist(), lons.tolist(), located.tolist()):
+                area = areas[code] if code >= 0 else None
+                record = {'lat': lat, 'lon': lon, 'area_name': area}
+                record.update(entries.get(area, {'prediction': None}))
+                prediction_data.append(record)
+        return json_response({'prediction_data': prediction_data, 'summary': summary})
+    except ModelUnavailable as e:
+        logger.warning("%s", e)
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        error_message = f"Error processing point prediction: {str(e)}"
+        logger.exception("Error processing point prediction")
+        return jsonify({'error': error_message}), 500
+
+def warm_up():
+    """Load the active model version and the area boundaries before serving requests"""
+    if model_registry.current is None:
+        import_legacy_model()
+        model_registry.refresh()
+    if model_registry.current is None:
+        # Requests get a 503 until a valid version shows up
+        logger.warning("No valid model version is available yet")
+    get_geo_layer()
+
+def shutdown():
+    """Stop the model watcher, the forecast scheduler and the chart rendering pool"""
+    model_registry.stop()
+    forecast_scheduler.stop()
+    chart_renderer.shutdown()
+
+def worker_started():
+    """Restart background threads in a worker forked from a preloaded process"""
+    model_registry.after_fork()
+    model_registry.start_watching()
+    forecast_scheduler.after_fork()
+    forecast_scheduler.start()
+
+def create_app(preload=True, watch=True):
+    """The configured app for a WSGI or ASGI server (see serve.py).
+
+    With preload the model and boundaries are loaded before the first request;
+    a server that forks its workers after loading (gunicorn --preload) shares
+    those pages between workers and passes watch=False, calling
+    worker_started() in each worker instead.
+    """
+    if preload:
+        warm_up()
+    if watch:
+        model_registry.start_watching()
+        forecast_scheduler.start()
+    atexit.register(shutdown)
+    return app
+
+# Development server; use serve.py for production
+if __name__ == '__main__':
+    # Load (and if needed compile) the model before the first request, as serve.py does
+    create_app()
+    app.run(debug=True, host='0.0.0.0')
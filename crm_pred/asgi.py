@@ -0,0 +1,12 @@
+"""ASGI entry point: uvicorn asgi:application --workers 4
+
+The Flask app is wrapped in a2wsgi's adapter, which runs every request on a
+thread pool of ASGI_THREADS threads while the event loop only handles I/O.
+"""
+import os
+
+from a2wsgi import WSGIMiddleware
+
+from app import create_app
+
+application = WSGIMiddleware(create_app(), workers=int(os.environ.get('ASGI_THREADS', 4)))
@@ -0,0 +1,255 @@
+"""Score arbitrary (month, year, area, sex, category) rows with a model version.
+
+    python batch_score.py what_if.csv --output scored.csv
+    python batch_score.py what_if.parquet --output scored.parquet --workers 4 --probabilities
+
+Input may be CSV, Parquet or NDJSON, with columns named as in the API
+(month, year, area_name, vict_sex, crime_category) or as in the training data
+(Month, Year, AREA NAME, Vict Sex, Crime_Category). Other columns are passed
+through. Rows are read, encoded and scored in chunks and every chunk is
+written out as soon as it is scored, so memory stays bounded. Rows that cannot
+be encoded get no prediction and an error message instead.
+"""
+import argparse
+import os
+import pickle
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from codebook import CODEBOOK
+from crime_types import CRIME_RISK_MAPPING
+from forest_engine import CompiledForest
+from model_artifact import load_artifact, read_manifest
+from model_registry import ModelRegistry
+from prediction_table import build_feature_frame, risk_columns
+
+# Input fields: API name, training data name
+FIELDS = [('month', 'Month'), ('year', 'Year'), ('area_name', 'AREA NAME'),
+          ('vict_sex', 'Vict Sex'), ('crime_category', 'Crime_Category')]
+FILE_FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.pq': 'parquet', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+CHUNK_SIZE = 50000
+# Rows per predict_proba call
+SCORE_BLOCK = 5000
+MODEL_PICKLE_NAME = 'model.pkl'
+
+RISK_LABELS = np.array([CRIME_RISK_MAPPING[code] for code in sorted(CRIME_RISK_MAPPING)] + [None], dtype=object)
+
+
+def file_format(path, fmt=None):
+    """Format of a data file, from fmt or the file extension"""
+    fmt = fmt or FILE_FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt not in ('csv', 'parquet', 'ndjson'):
+        raise ValueError(f"Cannot tell the format of {path}; use csv, parquet or ndjson")
+    return fmt
+
+
+def read_batches(source, fmt, chunksize=CHUNK_SIZE):
+    """Yield DataFrame chunks of a path or binary file object"""
+    if fmt == 'csv':
+        yield from pd.read_csv(source, chunksize=chunksize)
+    elif fmt == 'ndjson':
+        yield from pd.read_json(source, lines=True, chunksize=chunksize)
+    elif fmt == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+
+def input_columns(frame):
+    """{API field name: column of the frame holding it}"""
+    columns = {}
+    for field, feature in FIELDS:
+        if field in frame.columns:
+            columns[field] = field
+        elif feature in frame.columns:
+            columns[field] = feature
+        else:
+            raise ValueError(f"Missing column {field} (or {feature})")
+    return columns
+
+
+def encode_frame(frame):
+    """Encode a chunk with vectorized lookups.
+
+    Returns (months, years, area codes, sex codes, category codes, errors),
+    where errors is None for rows that can be scored and the first problem
+    found otherwise.
+    """
+    columns = input_columns(frame)
+    months = pd.to_numeric(frame[columns['month']], errors='coerce').to_numpy(dtype=np.float64)
+    years = pd.to_numeric(frame[columns['year']], errors='coerce').to_numpy(dtype=np.float64)
+    areas = CODEBOOK.encode('area', frame[columns['area_name']].to_numpy(dtype=object))
+    sexes = CODEBOOK.encode('sex', frame[columns['vict_sex']].to_numpy(dtype=object))
+    categories = CODEBOOK.encode('category', frame[columns['crime_category']].to_numpy(dtype=object))
+
+    checks = [
+        ((months >= 1) & (months <= 12) & (months == np.round(months)), 'invalid month'),
+        (np.isfinite(years) & (years == np.round(years)), 'invalid year'),
+        (areas >= 0, 'unknown area_name'),
+        (sexes >= 0, 'unknown vict_sex'),
+        (categories >= 0, 'unknown crime_category')
+    ]
+    errors = np.full(len(frame), None, dtype=object)
+    # Applied last to first, so each row reports its first failing check
+    for valid, message in reversed(checks):
+        errors[~valid] = message
+    return months, years, areas, sexes, categories, errors
+
+
+def score_frame(engine, frame, probabilities=False):
+    """The chunk with prediction (and optionally probability) columns added"""
+    months, years, areas, sexes, categories, errors = encode_frame(frame)
+    valid = pd.isnull(errors)
+    codes = np.full(len(frame), -1, dtype=np.int64)
+    proba = None
+    if valid.any():
+        rows = np.column_stack([years[valid], months[valid], areas[valid], sexes[valid],
+                                categories[valid]]).astype(np.int64)
+        # The input space is small, so every distinct row is scored only once
+        distinct, inverse = np.unique(rows, axis=0, return_inverse=True)
+        years_, months_, areas_, sexes_, categories_ = distinct.T
+        features = build_feature_frame(engine, months_, areas_, sexes_, categories_, years_)
+        # Forest traversal slows down once its working set outgrows the CPU cache
+        proba = np.concatenate([engine.predict_proba(features.iloc[start:start + SCORE_BLOCK])
+                                for start in range(0, len(features), SCORE_BLOCK)])[inverse.ravel()]
+        codes[valid] = engine.classes_[np.argmax(proba, axis=1)]
+
+    scored = frame.copy()
+    # Code -1 picks the trailing None of RISK_LABELS
+    scored['prediction'] = RISK_LABELS[codes]
+    if probabilities:
+        columns = np.full((len(frame), len(CRIME_RISK_MAPPING)), np.nan)
+        if proba is not None:
+            columns[valid] = risk_columns(proba, engine.classes_, len(CRIME_RISK_MAPPING))
+        for code, label in CRIME_RISK_MAPPING.items():
+            scored[f"probability {label}"] = np.round(columns[:, code], 4)
+    scored['error'] = errors
+    return scored
+
+
+def serialize(frame, fmt, header=True):
+    """CSV or NDJSON bytes of one scored chunk"""
+    if fmt == 'csv':
+        return frame.to_csv(index=False, header=header).encode('utf-8')
+    if fmt == 'ndjson':
+        return frame.to_json(orient='records', lines=True).encode('utf-8').rstrip(b'\n') + b'\n'
+    raise ValueError(f"Unsupported output format: {fmt}")
+
+
+def write_batches(frames, path, fmt):
+    """Write scored chunks to a file as they arrive; returns the number of rows"""
+    rows = 0
+    if fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        try:
+            for frame in frames:
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                if writer is None:
+                    # Columns that are all null in the first chunk (e.g. error) hold strings
+                    schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                                        for field in table.schema])
+                    writer = pq.ParquetWriter(path, schema)
+                writer.write_table(table.cast(writer.schema))
+                rows += len(frame)
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
+    with open(path, 'wb') as f:
+        for frame in frames:
+            f.write(serialize(frame, fmt, header=rows == 0))
+            rows += len(frame)
+    return rows
+
+
+def load_engine(path):
+    """Compiled forest of a model version directory or a model pickle"""
+    if os.path.isdir(path):
+        manifest = read_manifest(path)
+        if manifest is not None:
+            if not CODEBOOK.matches(manifest):
+                raise ValueError(f"Model in {path} was built with a different codebook")
+            return load_artifact(path, manifest)[0]
+        path = os.path.join(path, MODEL_PICKLE_NAME)
+    with open(path, 'rb') as f:
+        return CompiledForest.from_sklearn(pickle.load(f))
+
+
+def latest_version(models_dir):
+    """Path of the newest model version in a models directory"""
+    versions = ModelRegistry(models_dir, None).versions()
+    if not versions:
+        raise ValueError(f"No model versions in {models_dir}")
+    return os.path.join(models_dir, versions[-1])
+
+
+# Set in each worker by _init_worker
+_engine = None
+
+
+def _init_worker(model_path):
+    global _engine
+    # Artifacts are memory-mapped, so workers share the node arrays
+    _engine = load_engine(model_path)
+
+
+def _score_chunk(frame, probabilities):
+    return score_frame(_engine, frame, probabilities)
+
+
+def score_batches(batches, model_path, workers=1, probabilities=False, engine=None):
+    """Yield scored chunks in input order, scoring up to 2 chunks per worker ahead"""
+    if workers <= 1:
+        if engine is None:
+            engine = load_engine(model_path)
+        for frame in batches:
+            yield score_frame(engine, frame, probabilities)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_path,)) as pool:
+        pending = deque()
+        for frame in batches:
+            pending.append(pool.submit(_score_chunk, frame, probabilities))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score crime risk for rows of a CSV, Parquet or NDJSON file")
+    parser.add_argument('input', help="Rows to score")
+    parser.add_argument('--output', required=True, help="Scored rows (format from the extension)")
+    parser.add_argument('--input-format', choices=['csv', 'parquet', 'ndjson'])
+    parser.add_argument('--output-format', choices=['csv', 'parquet', 'ndjson'])
+    parser.add_argument('--model', help="Model version directory or model pickle (default: newest version)")
+    parser.add_argument('--models-dir', default=os.environ.get('MODELS_DIR', 'models'))
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes scoring chunks in parallel")
+    parser.add_argument('--probabilities', action='store_true', help="Add one probability column per risk level")
+    args = parser.parse_args(argv)
+
+    try:
+        input_format = file_format(args.input, args.input_format)
+        output_format = file_format(args.output, args.output_format)
+        model_path = args.model or latest_version(args.models_dir)
+    except ValueError as e:
+        parser.error(str(e))
+
+    started = time.time()
+    print(f"Scoring {args.input} with {model_path}")
+    scored = score_batches(read_batches(args.input, input_format, args.chunk_size), model_path,
+                           args.workers, args.probabilities)
+    rows = write_batches(scored, args.output, output_format)
+    print(f"Scored {rows} rows into {args.output} in {time.time() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,375 @@
+"""Reproducible benchmarks of the serving path, with no dataset or trained model needed.
+
+    python benchmark.py --output bench.json
+    python benchmark.py --output bench.json --compare bench_main.json
+    python benchmark.py --socket --concurrency 8 --requests 400
+    python benchmark.py --url http://localhost:5000 --skip-micro
+
+A synthetic random forest and synthetic area boundaries are written to a
+temporary working directory, and the app is imported against them. The suite
+has two parts:
+
+- micro-benchmarks of encoding, prediction, plotting and serialization
+- a load generator that reports p50/p95/p99 latency and requests per second
+  per scenario, including the worst case where every filter is "All"
+
+The load generator calls the app in process by default. With --socket it
+serves the app on a local port, and with --url it targets a running server.
+Results are written as JSON, together with the commit and library versions.
+--compare reports the change against an earlier results file and exits
+non-zero if any latency regressed by more than --threshold.
+"""
+import argparse
+import importlib.metadata
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Filter combinations of the load scenarios; every month is cycled through
+ALL_FILTERS = {'crime_category': 'All', 'area_name': 'All', 'vict_sex': 'All'}
+FILTERED = [
+    {'crime_category': 'Violent Crime', 'area_name': 'Central', 'vict_sex': 'F'},
+    {'crime_category': 'Property Crime', 'area_name': 'All', 'vict_sex': 'M'},
+    {'crime_category': 'All', 'area_name': 'Hollywood', 'vict_sex': 'All'}
+]
+SCENARIOS = {
+    'predict_all': ('/predict', [dict(ALL_FILTERS, plots='none')]),
+    'predict_all_plots': ('/predict', [dict(ALL_FILTERS, plots='refs')]),
+    'predict_all_columnar': ('/predict', [dict(ALL_FILTERS, plots='none', format='columnar')]),
+    'predict_filtered': ('/predict', [dict(filters, plots='none') for filters in FILTERED]),
+    'geo_predict_all': ('/geo_predict', [dict(ALL_FILTERS)]),
+    'geo_predict_filtered': ('/geo_predict', [dict(filters) for filters in FILTERED]),
+    'predict_range_all': ('/predict_range', [dict(ALL_FILTERS, months='1-12', stream=False)])
+}
+
+
+def synthetic_model(path, n_estimators=100, seed=42, rows=20000):
+    """Train a stand-in random forest on synthetic crime counts and write it as a model version"""
+    from codebook import CODEBOOK
+    from crime_types import crime_level_codes
+    from train import FEATURE_ORDER, train_model, write_version
+
+    rng = np.random.default_rng(seed)
+    x = pd.DataFrame({
+        'AREA NAME': rng.integers(0, CODEBOOK.size('area'), rows),
+        'Month': rng.integers(1, 13, rows),
+        'Year': rng.integers(2020, 2025, rows),
+        'Vict Sex': rng.integers(0, CODEBOOK.size('sex'), rows),
+        'Crime_Category': rng.integers(0, CODEBOOK.size('category'), rows)
+    })[FEATURE_ORDER]
+    # Counts with some structure per area and category, so the trees have depth
+    rate = 5 + x['AREA NAME'] * 1.5 + x['Crime_Category'] * 3 + x['Vict Sex'] * 4 + x['Month']
+    y = crime_level_codes(rng.poisson(rate))
+    model, _ = train_model(x, y, n_estimators=n_estimators, random_state=seed)
+    return write_version(path, 'benchmark', model, {'version': 'benchmark', 'synthetic': True,
+                                                    'n_estimators': n_estimators, 'seed': seed})
+
+
+def synthetic_boundaries(path):
+    """A GeoJSON file with one square per area on a grid over Los Angeles"""
+    from crime_types import AREA_NAMES
+
+    features = []
+    for i, area in enumerate(AREA_NAMES):
+        west, south = -118.7 + (i % 7) * 0.1, 33.8 + (i // 7) * 0.1
+        # Densified edges, so simplification has something to remove
+        steps = np.linspace(0, 0.1, 41)
+        ring = ([[west + d, south] for d in steps] + [[west + 0.1, south + d] for d in steps[1:]] +
+                [[west + 0.1 - d, south + 0.1] for d in steps[1:]] + [[west, south + 0.1 - d] for d in steps[1:]])
+        features.append({'type': 'Feature', 'properties': {'name': area},
+                         'geometry': {'type': 'Polygon', 'coordinates': [ring]}})
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'type': 'FeatureCollection', 'features': features}, f)
+
+
+def time_call(fn, repeat=20, min_seconds=0.2):
+    """Per-call timings in ms: fn is run repeat times, or until min_seconds have passed"""
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < repeat or time.perf_counter() - started < min_seconds:
+        call_started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - call_started) * 1000)
+        if len(timings) >= 10 * repeat:
+            break
+    return {'calls': len(timings), 'median_ms': round(statistics.median(timings), 4),
+            'min_ms': round(min(timings), 4)}
+
+
+def micro_benchmarks(app, plot_repeat=3):
+    """Time the building blocks of a request against the active model"""
+    from charts import render_charts
+    from codebook import CODEBOOK
+    from crime_types import AREA_NAMES
+    from response_encoding import compress, encode_body, prediction_columns, prediction_records
+
+    model = app.model_registry.get()
+    table, engine = app.serving_table(model), model.model
+    labels = app.risk_labels
+    areas, sexes, categories = app.area_names, app.vict_sexes, app.crime_categories
+    block = table.lookup(1, areas, sexes, categories)
+    records = prediction_records(block, 'January', table.year, categories, areas, sexes, labels)
+    frame = pd.DataFrame(records)
+    grid = app.grid_features(engine, table)
+    raw_areas = np.random.default_rng(0).choice(AREA_NAMES, 100000)
+    response = {'prediction_data': records, 'summary': {'total_predictions': len(records)}}
+    columnar = {'prediction_data': prediction_columns(block, 'January', table.year, categories, areas, sexes,
+                                                      labels), 'summary': {}}
+    body = encode_body(response, 'records')
+
+    results = {
+        'encode_labels_100k': time_call(lambda: CODEBOOK.encode('area', raw_areas)),
+        'lookup_all_filters': time_call(lambda: table.lookup(1, areas, sexes, categories)),
+        'lookup_one_cell': time_call(lambda: table.lookup(1, ['Central'], ['F'], ['Violent Crime'])),
+        'predict_proba_grid': time_call(lambda: engine.predict_proba(grid), repeat=5),
+        'predict_proba_one_row': time_call(lambda: engine.predict_proba(grid.iloc[:1])),
+        'records_all_filters': time_call(lambda: prediction_records(block, 'January', table.year, categories,
+                                                                    areas, sexes, labels)),
+        'serialize_records': time_call(lambda: encode_body(response, 'records')),
+        'serialize_columnar': time_call(lambda: encode_body(columnar, 'columnar')),
+        'compress_gzip': time_call(lambda: compress(body, 'gzip')),
+        'render_charts_all_filters': time_call(lambda: render_charts(frame), repeat=plot_repeat, min_seconds=0)
+    }
+    try:
+        import msgpack  # noqa: F401
+        results['serialize_msgpack'] = time_call(lambda: encode_body(columnar, 'msgpack'))
+    except ImportError:
+        pass
+    return results
+
+
+class InProcessClient:
+    """Sends requests straight to the WSGI app, one Flask test client per thread"""
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def post(self, path, body):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.post(path, json=body)
+        response.get_data()
+        return response.status_code
+
+
+class HttpClient:
+    """Sends requests to a server over HTTP"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def post(self, path, body):
+        request = urllib.request.Request(self.base_url + path, data=json.dumps(body).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def latency_summary(timings, errors, elapsed):
+    timings = np.asarray(timings) * 1000
+    return {
+        'requests': int(len(timings)),
+        'errors': int(errors),
+        'p50_ms': round(float(np.percentile(timings, 50)), 3),
+        'p95_ms': round(float(np.percentile(timings, 95)), 3),
+        'p99_ms': round(float(np.percentile(timings, 99)), 3),
+        'mean_ms': round(float(timings.mean()), 3),
+        'max_ms': round(float(timings.max()), 3),
+        'requests_per_second': round(len(timings) / elapsed, 2)
+    }
+
+
+def run_scenario(client, path, bodies, n_requests, concurrency):
+    """Send n_requests, cycling through the bodies and all 12 months, from concurrency threads"""
+    requests = [dict(bodies[i % len(bodies)], month=(i // len(bodies)) % 12 + 1) for i in range(n_requests)]
+    timings = [None] * n_requests
+    errors = 0
+
+    def send(i):
+        started = time.perf_counter()
+        status = client.post(path, requests[i])
+        timings[i] = time.perf_counter() - started
+        return status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for status in pool.map(send, range(n_requests)):
+            errors += status != 200
+    elapsed = time.perf_counter() - started
+    # The first request of every distinct body and month misses the caches
+    distinct = min(n_requests, 12 * len(bodies))
+    summary = latency_summary(timings, errors, elapsed)
+    summary['first_pass'] = latency_summary(timings[:distinct], 0, sum(timings[:distinct]))
+    return summary
+
+
+def load_test(client, scenarios, n_requests, concurrency):
+    results = {}
+    for name in scenarios:
+        path, bodies = SCENARIOS[name]
+        results[name] = run_scenario(client, path, bodies, n_requests, concurrency)
+        result = results[name]
+        print(f"{name:<24} p50 {result['p50_ms']:>9.2f}ms  p95 {result['p95_ms']:>9.2f}ms  "
+              f"p99 {result['p99_ms']:>9.2f}ms  {result['requests_per_second']:>8.1f} req/s"
+              f"{'  errors ' + str(result['errors']) if result['errors'] else ''}")
+    return results
+
+
+def environment():
+    """What the results were measured on, so runs can be compared meaningfully"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    versions = {}
+    for name in ('numpy', 'pandas', 'scikit-learn', 'flask', 'matplotlib', 'shapely'):
+        try:
+            versions[name] = importlib.metadata.version(name)
+        except importlib.metadata.PackageNotFoundError:
+            pass
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'versions': versions
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print the change of every latency against a baseline; returns the regressions"""
+    regressions = []
+    rows = []
+    for name, entry in results.get('micro', {}).items():
+        old = baseline.get('micro', {}).get(name)
+        if old:
+            rows.append((f"micro {name}", old['median_ms'], entry['median_ms']))
+    for name, entry in results.get('load', {}).items():
+        old = baseline.get('load', {}).get(name)
+        if old:
+            for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+                rows.append((f"load {name} {metric[:-3]}", old[metric], entry[metric]))
+    print(f"\nCompared with {baseline.get('environment', {}).get('commit') or 'baseline'}:")
+    if baseline.get('config') != results.get('config'):
+        print(f"Warning: the runs used different settings ({baseline.get('config')} vs {results.get('config')})")
+    for label, old, new in rows:
+        change = (new - old) / old if old else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(label)
+        print(f"{label:<48} {old:>10.3f} -> {new:>10.3f} ms  {change:+7.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the crime prediction serving path")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--compare', help="Results file of an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Relative slowdown counted as a regression")
+    parser.add_argument('--requests', type=int, default=120, help="Requests per load scenario")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument('--n-estimators', type=int, default=100, help="Trees in the synthetic model")
+    parser.add_argument('--no-cache', action='store_true', help="Disable the response and chart caches")
+    parser.add_argument('--socket', action='store_true', help="Serve the app on a local port for the load test")
+    parser.add_argument('--url', help="Load-test a running server instead (micro-benchmarks still run locally)")
+    parser.add_argument('--skip-micro', action='store_true')
+    parser.add_argument('--skip-load', action='store_true')
+    args = parser.parse_args(argv)
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    workdir = tempfile.mkdtemp(prefix='crime-benchmark-')
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    try:
+        print(f"Training a synthetic model with {args.n_estimators} trees in {workdir}")
+        synthetic_model(os.path.join(workdir, 'models'), args.n_estimators)
+        synthetic_boundaries(os.path.join(workdir, 'static', 'la_areas.geojson'))
+        os.environ['MODELS_DIR'] = os.path.join(workdir, 'models')
+        os.environ['FORECAST_DIR'] = os.path.join(workdir, 'forecasts')
+        os.environ['MODEL_POLL_SECONDS'] = '0'
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        if args.no_cache:
+            os.environ['RESPONSE_CACHE_SIZE'] = '0'
+            os.environ['CHART_CACHE_MB'] = '0'
+        sys.path.insert(0, HERE)
+        import app
+        app.LA_GEOJSON_PATH = os.path.join(workdir, 'static', 'la_areas.geojson')
+        flask_app = app.create_app(preload=True, watch=False)
+
+        results = {'environment': environment(), 'config': {
+            'n_estimators': args.n_estimators, 'requests': args.requests, 'concurrency': args.concurrency,
+            'no_cache': args.no_cache, 'mode': 'url' if args.url else 'socket' if args.socket else 'in-process'
+        }}
+        if not args.skip_micro:
+            print("Micro-benchmarks:")
+            results['micro'] = micro_benchmarks(app)
+            for name, entry in results['micro'].items():
+                print(f"{name:<28} median {entry['median_ms']:>10.3f}ms  min {entry['min_ms']:>10.3f}ms")
+
+        if not args.skip_load:
+            print(f"Load test: {args.requests} requests per scenario, concurrency {args.concurrency}")
+            server = None
+            if args.url:
+                client = HttpClient(args.url)
+            elif args.socket:
+                from werkzeug.serving import make_server
+                # One access log line per request would dominate the output
+                logging.getLogger('werkzeug').setLevel(logging.WARNING)
+                server = make_server('127.0.0.1', 0, flask_app, threaded=True)
+                threading.Thread(target=server.serve_forever, daemon=True).start()
+                client = HttpClient(f"http://127.0.0.1:{server.server_port}")
+            else:
+                client = InProcessClient(flask_app)
+            try:
+                results['load'] = load_test(client, scenarios, args.requests, args.concurrency)
+            finally:
+                if server is not None:
+                    server.shutdown()
+        app.shutdown()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Results written to {output}")
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regressions above {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
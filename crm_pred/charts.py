@@ -0,0 +1,383 @@
+import base64
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger('crm_pred.charts')
+
+
+def _pyplot():
+    """Import pyplot with the non-interactive backend; deferred until a chart is rendered"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _figure_to_png():
+    """Save the current figure as PNG bytes and close it"""
+    plt = _pyplot()
+    buffer = io.BytesIO()
+    plt.savefig(buffer, format='png')
+    plt.close()
+    return buffer.getvalue()
+
+
+# Every chart render_charts can produce, in rendering order
+CHART_NAMES = ('risk_distribution', 'area_risk', 'category_risk', 'heatmap')
+
+
+def chart_names(n_areas, n_categories, has_unsafe):
+    """Names of the charts render_charts will produce for the given prediction data"""
+    names = ['risk_distribution']
+    if n_areas > 1:
+        names.append('area_risk')
+    if n_categories > 1:
+        names.append('category_risk')
+    if n_areas > 1 and n_categories > 1 and has_unsafe:
+        names.append('heatmap')
+    return names
+
+
+def render_charts(df):
+    """Create plots from prediction data and return {chart name: PNG bytes}"""
+    plt = _pyplot()
+    import seaborn as sns
+    charts = {}
+
+    # Set the style
+    sns.set_theme(style="whitegrid")
+
+    try:
+        # 1. Crime Risk Distribution - Pie Chart
+        plt.figure(figsize=(10, 6))
+        risk_counts = df['prediction'].value_counts()
+        plt.pie(risk_counts, labels=risk_counts.index, autopct='%1.1f%%', startangle=90, colors=sns.color_palette("Blues_r"))
+        plt.title('Distribution of Crime Risk Predictions')
+        charts['risk_distribution'] = _figure_to_png()
+
+        # 2. If we have area data and multiple areas, create a bar chart
+        if 'area name' in df.columns and len(df['area name'].unique()) > 1:
+            plt.figure(figsize=(12, 8))
+
+            # Create a count of predictions by area
+            area_predictions = df.groupby(['area name', 'prediction']).size().unstack(fill_value=0)
+
+            # Sort areas by total risk (optional)
+            if 'Unsafe / High Crime' in area_predictions.columns:
+                sort_columns = ['Unsafe / High Crime']
+                if 'Neutral / Medium Crime' in area_predictions.columns:
+                    sort_columns.append('Neutral / Medium Crime')
+                area_predictions = area_predictions.sort_values(by=sort_columns, ascending=False)
+
+            # Create a grouped bar chart
+            area_predictions.plot(kind='bar', stacked=True, colormap='Blues_r')
+            plt.title('Crime Risk by Area')
+            plt.xlabel('Area')
+            plt.ylabel('Count')
+            plt.xticks(rotation=45, ha='right')
+            plt.tight_layout()
+            charts['area_risk'] = _figure_to_png()
+
+        # 3. If we have crime category data and multiple categories, create a horizontal bar chart
+        if 'crime category' in df.columns and len(df['crime category'].unique()) > 1:
+            plt.figure(figsize=(12, 8))
+
+            # Create a count of predictions by crime category
+            category_predictions = df.groupby(['crime category', 'prediction']).size().unstack(fill_value=0)
+
+            # Sort categories by total risk
+            if 'Unsafe / High Crime' in category_predictions.columns:
+                sort_columns = ['Unsafe / High Crime']
+                if 'Neutral / Medium Crime' in category_predictions.columns:
+                    sort_columns.append('Neutral / Medium Crime')
+                category_predictions = category_predictions.sort_values(by=sort_columns, ascending=False)
+
+            # Create a horizontal bar chart
+            category_predictions.plot(kind='barh', stacked=True, colormap='Blues_r')
+            plt.title('Crime Risk by Category')
+            plt.xlabel('Count')
+            plt.ylabel('Crime Category')
+            plt.tight_layout()
+            charts['category_risk'] = _figure_to_png()
+
+        # 4. Heatmap if we have both area and crime category with sufficient data
+        if ('area name' in df.columns and 'crime category' in df.columns and
+            len(df['area name'].unique()) > 1 and len(df['crime category'].unique()) > 1):
+
+            # Create a pivot table counting "Unsafe / High Crime" predictions
+            if 'Unsafe / High Crime' in df['prediction'].unique():
+                pivot_data = df[df['prediction'] == 'Unsafe / High Crime'].groupby(['area name', 'crime category']).size().reset_index(name='count')
+                pivot_table = pivot_data.pivot_table(values='count', index='area name', columns='crime category', fill_value=0)
+
+                plt.figure(figsize=(14, 10))
+                sns.heatmap(pivot_table, annot=True, cmap='Blues', fmt='g')
+                plt.title('Heatmap of High Crime Risk by Area and Category')
+                plt.tight_layout()
+                charts['heatmap'] = _figure_to_png()
+    except Exception as e:
+        logger.exception("Error creating plots")
+        # Create a basic error plot
+        plt.figure(figsize=(8, 6))
+        plt.text(0.5, 0.5, f"Error creating visualization: {str(e)}",
+                 horizontalalignment='center', verticalalignment='center')
+        charts['error'] = _figure_to_png()
+
+    return charts
+
+
+def chart_key(month, category, area, sex, model_version):
+    """Stable cache key for the charts of one filter combination and model"""
+    raw = json.dumps([month, category, area, sex, model_version])
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class ChartCache:
+    """LRU cache of rendered charts bounded by total PNG size, with an optional disk tier"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, cache_dir=None, max_disk_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, key):
+        with self.lock:
+            charts = self.entries.get(key)
+            if charts is not None:
+                self.entries.move_to_end(key)
+                return charts
+        charts = self._read_disk(key)
+        if charts is not None:
+            self._store_memory(key, charts)
+        return charts
+
+    def put(self, key, charts):
+        self._store_memory(key, charts)
+        self._write_disk(key, charts)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def _store_memory(self, key, charts):
+        size = sum(len(png) for png in charts.values())
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= sum(len(png) for png in self.entries.pop(key).values())
+            self.entries[key] = charts
+            self.total_bytes += size
+            # Evict least recently used entries until we are back under budget
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= sum(len(png) for png in evicted.values())
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r') as f:
+                stored = json.load(f)
+            os.utime(path)  # Mark as recently used for eviction
+        except (OSError, ValueError):
+            return None
+        return {name: base64.b64decode(png) for name, png in stored.items()}
+
+    def _write_disk(self, key, charts):
+        if not self.cache_dir:
+            return
+        stored = {name: base64.b64encode(png).decode('ascii') for name, png in charts.items()}
+        tmp_path = self._disk_path(key) + f".{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(stored, f)
+            os.replace(tmp_path, self._disk_path(key))
+            self._evict_disk()
+        except OSError as e:
+            logger.warning("Error writing chart cache: %s", e)
+
+    def _evict_disk(self):
+        """Remove the least recently used files once the disk tier exceeds its budget"""
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+def image_digest(png):
+    """Content address of an image"""
+    return hashlib.sha256(png).hexdigest()[:32]
+
+
+class ImageStore:
+    """Content-addressed store of rendered images, bounded by total size"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, cache_dir=None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.images = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def put(self, png):
+        """Store an image and return its digest"""
+        digest = image_digest(png)
+        with self.lock:
+            if digest in self.images:
+                self.images.move_to_end(digest)
+            else:
+                self.images[digest] = png
+                self.total_bytes += len(png)
+                while self.total_bytes > self.max_bytes and len(self.images) > 1:
+                    _, evicted = self.images.popitem(last=False)
+                    self.total_bytes -= len(evicted)
+        if self.cache_dir:
+            path = os.path.join(self.cache_dir, f"{digest}.png")
+            if not os.path.exists(path):
+                tmp_path = path + f".{os.getpid()}.tmp"
+                try:
+                    with open(tmp_path, 'wb') as f:
+                        f.write(png)
+                    os.replace(tmp_path, path)
+                except OSError as e:
+                    logger.warning("Error writing image cache: %s", e)
+        return digest
+
+    def contains(self, digest):
+        """Whether the image for a digest can still be served"""
+        with self.lock:
+            if digest in self.images:
+                return True
+        return bool(self.cache_dir) and os.path.exists(os.path.join(self.cache_dir, f"{digest}.png"))
+
+    def get(self, digest):
+        """Return the image bytes for a digest, or None if unknown"""
+        if len(digest) != 32 or any(c not in '0123456789abcdef' for c in digest):
+            return None
+        with self.lock:
+            png = self.images.get(digest)
+            if png is not None:
+                self.images.move_to_end(digest)
+                return png
+        if self.cache_dir:
+            try:
+                with open(os.path.join(self.cache_dir, f"{digest}.png"), 'rb') as f:
+                    return f.read()
+            except OSError:
+                pass
+        return None
+
+
+class ChartRenderer:
+    """Renders charts in a bounded process pool and stores the results in a ChartCache"""
+
+    def __init__(self, cache, max_workers=2, on_rendered=None):
+        self.cache = cache
+        self.max_workers = max_workers
+        self.on_rendered = on_rendered  # called with the seconds from submit to result
+        self.pool = None
+        self.pending = {}
+        self.rendered = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+
+    def _get_pool(self):
+        # Created on first use. Workers are started from a clean server process (or spawned)
+        # rather than forked from this one, whose other threads may hold locks at fork time
+        if self.pool is None:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self.pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context(method))
+        return self.pool
+
+    def submit(self, key, build_df):
+        """Start rendering the charts for key unless they are cached or already in flight.
+
+        build_df is only called when the charts actually need rendering, and
+        outside the lock, so other keys are not held up while it runs.
+        """
+        with self.lock:
+            future = self.pending.get(key)
+        if future is not None:
+            return future
+        if self.cache.get(key) is not None:
+            return None
+        df = build_df()
+        with self.lock:
+            # Another request may have submitted the same charts while the frame was built
+            if key in self.pending:
+                return self.pending[key]
+            if self.cache.get(key) is not None:
+                return None
+            started = time.perf_counter()
+            future = self._get_pool().submit(render_charts, df)
+            self.pending[key] = future
+
+        def store(done):
+            with self.lock:
+                self.pending.pop(key, None)
+            if done.exception() is None:
+                self.cache.put(key, done.result())
+                self.rendered += 1
+                if self.on_rendered is not None:
+                    self.on_rendered(time.perf_counter() - started)
+            else:
+                self.failed += 1
+                logger.error("Error rendering charts: %s", done.exception())
+
+        future.add_done_callback(store)
+        return future
+
+    def get(self, key, build_df, timeout=None):
+        """Return the charts for key, rendering them first if needed"""
+        while True:
+            charts = self.cache.get(key)
+            if charts is not None:
+                return charts
+            future = self.submit(key, build_df)
+            if future is not None:
+                return future.result(timeout=timeout)
+            # The charts were evicted between submit and get; render them again
+
+    def stats(self):
+        with self.lock:
+            return {'rendered': self.rendered, 'failed': self.failed, 'in_flight': len(self.pending)}
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from crime_types import AREA_NAMES, CRIME_CATEGORIES, VICT_SEXES
+
+# Bump when the values or their codes change; models record the version they were trained with
+CODEBOOK_VERSION = 1
+
+# field -> (model feature column, name used in error messages)
+FIELDS = {
+    'area': ('AREA NAME', 'area name'),
+    'sex': ('Vict Sex', 'victim sex'),
+    'category': ('Crime_Category', 'crime category')
+}
+
+
+class Codebook:
+    """Integer codes of the categorical model features, shared by training and serving.
+
+    Codes follow the sorted order of each field's values (the order the
+    notebook's LabelEncoders produced), so models trained before the codebook
+    existed keep their meaning. Each field keeps a hash index of its values,
+    so a whole column is encoded in one call, and the codebook is recorded in
+    every trained model and compiled artifact so a model can never be served
+    with codes it was not trained on.
+    """
+
+    def __init__(self, fields, version=CODEBOOK_VERSION):
+        self.version = version
+        self.classes = {field: sorted(values) for field, values in fields.items()}
+        self.indexes = {field: pd.Index(values) for field, values in self.classes.items()}
+        self.codes = {field: {name: code for code, name in enumerate(values)}
+                      for field, values in self.classes.items()}
+        self.labels = {field: np.asarray(values, dtype=object) for field, values in self.classes.items()}
+
+    def size(self, field):
+        return len(self.classes[field])
+
+    def encode(self, field, values):
+        """int64 codes for an array of values, -1 where a value is unknown"""
+        return self.indexes[field].get_indexer(np.asarray(values, dtype=object)).astype(np.int64)
+
+    def encode_strict(self, field, values):
+        """int64 codes for an array of values, rejecting unknown values with ValueError"""
+        codes = self.encode(field, values)
+        if (codes < 0).any():
+            unknown = pd.unique(np.asarray(values, dtype=object)[codes < 0])
+            raise ValueError(f"Unknown {FIELDS[field][1]}: {', '.join(map(str, unknown[:5]))}")
+        return codes
+
+    def encode_names(self, field, names):
+        """Codes of a short list of names (request filters), rejecting unknown names"""
+        codes = self.codes[field]
+        try:
+            return [codes[name] for name in names]
+        except KeyError as e:
+            raise ValueError(f"Unknown {FIELDS[field][1]}: {e.args[0]}")
+
+    def decode(self, field, codes):
+        """Values of an array of codes"""
+        return self.labels[field][np.asarray(codes)]
+
+    def to_dict(self):
+        """JSON form, stored in training metadata and artifact manifests"""
+        return {'version': self.version, 'fields': self.classes}
+
+    def matches(self, metadata):
+        """Whether training metadata or a manifest was built with this codebook.
+
+        Artifacts compiled before the codebook existed only recorded the
+        encoder classes; those are accepted when the classes agree. Metadata
+        recording neither does not match.
+        """
+        if 'codebook' in metadata:
+            return metadata['codebook'] == self.to_dict()
+        if 'encoders' in metadata:
+            return metadata['encoders'] == self.classes
+        return False
+
+
+CODEBOOK = Codebook({'area': AREA_NAMES, 'sex': VICT_SEXES, 'category': CRIME_CATEGORIES})
@@ -0,0 +1,182 @@
+import numpy as np
+
+# Values the model is trained and served on; codebook.py codes them in sorted order
+AREA_NAMES = ['Wilshire', 'Central', 'Southwest', 'Van Nuys', 'Hollenbeck',
+              'Rampart', 'Newton', 'Northeast', '77th Street', 'Hollywood',
+              'Harbor', 'West Valley', 'West LA', 'N Hollywood', 'Pacific',
+              'Devonshire', 'Mission', 'Southeast', 'Olympic', 'Foothill',
+              'Topanga']
+VICT_SEXES = ['M', 'F', 'Other']
+CRIME_CATEGORIES = ['Property Crime', 'Violent Crime', 'Sex Crime', 'Other',
+                    'Fraud/Financial Crime', 'Legal/Administrative', 'Cyber Crime',
+                    'Child Crime', 'Traffic Offense']
+
+# Define a mapping from detailed crime descriptions to broader crime categories
+CRIME_TYPE_MAP = {
+    # Property Crimes
+    'VEHICLE - STOLEN': 'Property Crime',
+    'BURGLARY FROM VEHICLE': 'Property Crime',
+    'BIKE - STOLEN': 'Property Crime',
+    'SHOPLIFTING-GRAND THEFT ($950.01 & OVER)': 'Property Crime',
+    'BURGLARY': 'Property Crime',
+    'SHOPLIFTING - PETTY THEFT ($950 & UNDER)': 'Property Crime',
+    'THEFT-GRAND ($950.01 & OVER)EXCPT,GUNS,FOWL,LIVESTK,PROD': 'Property Crime',
+    'THEFT PLAIN - PETTY ($950 & UNDER)': 'Property Crime',
+    'THEFT FROM MOTOR VEHICLE - GRAND ($950.01 AND OVER)': 'Property Crime',
+    'VEHICLE - ATTEMPT STOLEN': 'Property Crime',
+    'BURGLARY FROM VEHICLE, ATTEMPTED': 'Property Crime',
+    'THEFT FROM MOTOR VEHICLE - PETTY ($950 & UNDER)': 'Property Crime',
+    'BUNCO, GRAND THEFT': 'Property Crime',
+    'BUNCO, PETTY THEFT': 'Property Crime',
+    'THEFT FROM MOTOR VEHICLE - ATTEMPT': 'Property Crime',
+    'PICKPOCKET': 'Property Crime',
+    'SHOPLIFTING - ATTEMPT': 'Property Crime',
+    'BUNCO, ATTEMPT': 'Property Crime',
+    'THEFT, PERSON': 'Property Crime',
+    'THEFT, COIN MACHINE - PETTY ($950 & UNDER)': 'Property Crime',
+    'THEFT, COIN MACHINE - GRAND ($950.01 & OVER)': 'Property Crime',
+    'THEFT, COIN MACHINE - ATTEMPT': 'Property Crime',
+    'GRAND THEFT / AUTO REPAIR': 'Property Crime',
+    'PETTY THEFT - AUTO REPAIR': 'Property Crime',
+    
+    # Violent Crimes
+    'ARSON': 'Violent Crime',
+    'INTIMATE PARTNER - SIMPLE ASSAULT': 'Violent Crime',
+    'ROBBERY': 'Violent Crime',
+    'ASSAULT WITH DEADLY WEAPON, AGGRAVATED ASSAULT': 'Violent Crime',
+    'BATTERY - SIMPLE ASSAULT': 'Violent Crime',
+    'RAPE, FORCIBLE': 'Violent Crime',
+    'CRIMINAL THREATS - NO WEAPON DISPLAYED': 'Violent Crime',
+    'BRANDISH WEAPON': 'Violent Crime',
+    'DISCHARGE FIREARMS/SHOTS FIRED': 'Violent Crime',
+    'BATTERY POLICE (SIMPLE)': 'Violent Crime',
+    'ASSAULT WITH DEADLY WEAPON ON POLICE OFFICER': 'Violent Crime',
+    'SEXUAL PENETRATION W/FOREIGN OBJECT': 'Violent Crime',
+    'SHOTS FIRED AT INHABITED DWELLING': 'Violent Crime',
+    'KIDNAPPING - GRAND ATTEMPT': 'Violent Crime',
+    'SHOTS FIRED AT MOVING VEHICLE, TRAIN OR AIRCRAFT': 'Violent Crime',
+    'CHILD ABUSE (PHYSICAL) - SIMPLE ASSAULT': 'Violent Crime',
+    'CHILD ABUSE (PHYSICAL) - AGGRAVATED ASSAULT': 'Violent Crime',
+    'CRIMINAL HOMICIDE': 'Violent Crime',
+    'STALKING': 'Violent Crime',
+    'LYNCHING - ATTEMPTED': 'Violent Crime',
+    'MANSLAUGHTER, NEGLIGENT': 'Violent Crime',
+    'BATTERY WITH SEXUAL CONTACT': 'Violent Crime',
+    'KIDNAPPING': 'Violent Crime',
+    
+    # Sex / Child-related Crimes
+    'PIMPING': 'Sex Crime',
+    'PANDERING': 'Sex Crime',
+    'ORAL COPULATION': 'Sex Crime',
+    'INDECENT EXPOSURE': 'Sex Crime',
+    'SODOMY/SEXUAL CONTACT B/W PENIS OF ONE PERS TO ANUS OTH': 'Sex Crime',
+    'CHILD PORNOGRAPHY': 'Sex Crime',
+    'LEWD/LASCIVIOUS ACTS WITH CHILD': 'Sex Crime',
+    'HUMAN TRAFFICKING - COMMERCIAL SEX ACTS': 'Sex Crime',
+    'HUMAN TRAFFICKING - INVOLUNTARY SERVITUDE': 'Sex Crime',
+    'INCEST (SEXUAL ACTS BETWEEN BLOOD RELATIVES)': 'Sex Crime',
+    'BEASTIALITY, CRIME AGAINST NATURE SEXUAL ASSLT WITH ANIM': 'Sex Crime',
+    
+    # Fraud/Financial Crimes
+    'THEFT OF IDENTITY': 'Fraud/Financial Crime',
+    'EMBEZZLEMENT, GRAND THEFT ($950.01 & OVER)': 'Fraud/Financial Crime',
+    'DOCUMENT FORGERY / STOLEN FELONY': 'Fraud/Financial Crime',
+    'EMBEZZLEMENT, PETTY THEFT ($950 & UNDER)': 'Fraud/Financial Crime',
+    'DOCUMENT WORTHLESS ($200.01 & OVER)': 'Fraud/Financial Crime',
+    'CREDIT CARDS, FRAUD USE ($950.01 & OVER)': 'Fraud/Financial Crime',
+    'CREDIT CARDS, FRAUD USE ($950 & UNDER': 'Fraud/Financial Crime',
+    'DISHONEST EMPLOYEE - GRAND THEFT': 'Fraud/Financial Crime',
+    'DEFRAUDING INNKEEPER/THEFT OF SERVICES, $950 & UNDER': 'Fraud/Financial Crime',
+    'DEFRAUDING INNKEEPER/THEFT OF SERVICES, OVER $950.01': 'Fraud/Financial Crime',
+    'COUNTERFEIT': 'Fraud/Financial Crime',
+    'GRAND THEFT / INSURANCE FRAUD': 'Fraud/Financial Crime',
+    'DISHONEST EMPLOYEE - PETTY THEFT': 'Fraud/Financial Crime',
+    
+    # Legal / Administrative
+    'VIOLATION OF COURT ORDER': 'Legal/Administrative',
+    'VIOLATION OF RESTRAINING ORDER': 'Legal/Administrative',
+    'CONTEMPT OF COURT': 'Legal/Administrative',
+    'VIOLATION OF TEMPORARY RESTRAINING ORDER': 'Legal/Administrative',
+    'FALSE POLICE REPORT': 'Legal/Administrative',
+    'FIREARMS RESTRAINING ORDER (FIREARMS RO)': 'Legal/Administrative',
+    'REPLICA FIREARMS(SALE,DISPLAY,MANUFACTURE OR DISTRIBUTE)': 'Legal/Administrative',
+    'BIGAMY': 'Legal/Administrative',
+    'BLOCKING DOOR INDUCTION CENTER': 'Legal/Administrative',
+    'INCITING A RIOT': 'Legal/Administrative',
+    
+    # Cyber / Other
+    'UNAUTHORIZED COMPUTER ACCESS': 'Cyber Crime',
+    
+    # Traffic Offenses
+    'FAILURE TO YIELD': 'Traffic Offense',
+    'RECKLESS DRIVING': 'Traffic Offense',
+    
+    # Child Crimes / Abuse
+    'CRM AGNST CHLD (13 OR UNDER) (14-15 & SUSP 10 YRS OLDER)': 'Child Crime',
+    'CHILD STEALING': 'Child Crime',
+    'CHILD NEGLECT (SEE 300 W.I.C.)': 'Child Crime',
+    'CHILD ABANDONMENT': 'Child Crime',
+    
+    # Public Order & Other
+    'OTHER MISCELLANEOUS CRIME': 'Other',
+    'LETTERS, LEWD  -  TELEPHONE CALLS, LEWD': 'Other',
+    'RESISTING ARREST': 'Other',
+    'BOMB SCARE': 'Other',
+    'FALSE IMPRISONMENT': 'Other',
+    'THROWING OBJECT AT MOVING VEHICLE': 'Other',
+    'DISTURBING THE PEACE': 'Other',
+    'CONTRIBUTING': 'Other',
+    'PROWLER': 'Other',
+    'DRUNK ROLL': 'Other',
+    'TRAIN WRECKING': 'Other',
+    'DRUNK ROLL - ATTEMPT': 'Other',
+    'FAILURE TO DISPERSE': 'Other',
+    
+    # Additional (Uncategorized / To be reviewed)
+    'SEX OFFENDER REGISTRANT OUT OF COMPLIANCE': 'Other',
+}
+
+# Any crime not explicitly mapped is categorized as "Other"
+DEFAULT_CRIME_CATEGORY = 'Other'
+
+# Victim sex codes in the raw data; anything else (including missing) is "Other"
+VICT_SEX_MAP = {
+    'M': 'M',
+    'F': 'F',
+    'X': 'Other',
+    'H': 'Other',
+    '-': 'Other'
+}
+DEFAULT_VICT_SEX = 'Other'
+
+# Monthly crime counts are labelled by these upper bounds; larger counts are "High"
+CRIME_LEVEL_BOUNDS = [(20, 'Low'), (40, 'Medium')]
+CRIME_LEVELS = ['High', 'Low', 'Medium']  # Encoded in this (sorted) order
+
+# Served label of each predicted class (the CRIME_LEVELS codes)
+CRIME_RISK_MAPPING = {
+    0: "Unsafe / High Crime",
+    1: "Safe / Low Crime",
+    2: "Neutral / Medium Crime"
+}
+
+
+def map_categorical(values, mapping, default):
+    """Map a Series through a dict by looking up each distinct value once.
+
+    Returns an object array; values missing from the mapping (or NaN) get default.
+    """
+    values = values.astype('category')
+    categories = values.cat.categories
+    labels = np.array([mapping.get(value, default) for value in categories] + [default], dtype=object)
+    # Missing values have code -1, which picks the trailing default
+    return labels[values.cat.codes.to_numpy()]
+
+
+def crime_level_codes(counts):
+    """Encoded crime level (see CRIME_LEVELS) for an array of crime counts"""
+    counts = np.asarray(counts)
+    codes = np.full(counts.shape, CRIME_LEVELS.index('High'), dtype=np.int64)
+    for bound, level in reversed(CRIME_LEVEL_BOUNDS):
+        codes[counts <= bound] = CRIME_LEVELS.index(level)
+    return codes
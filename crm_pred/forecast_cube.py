@@ -0,0 +1,314 @@
+import datetime
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Every process builds its own cubes (Windows)
+
+from prediction_table import PredictionTable, build_feature_frame, risk_columns
+
+logger = logging.getLogger('crm_pred.forecast_cube')
+
+# Bump when the layout of a cube directory changes
+CUBE_FORMAT_VERSION = 1
+CUBE_MANIFEST = 'cube.json'
+# Name of the cube directory currently published, replaced in one rename
+CURRENT_NAME = 'CURRENT'
+# Published cubes kept on disk; older ones may still be mapped by other workers for a while
+KEEP_CUBES = 3
+# Delay before retrying a failed build, doubled after each further failure up to the poll interval
+RETRY_SECONDS = 30
+
+
+def horizon_years(horizon_months, today=None):
+    """Years touched by a rolling horizon of months starting at the current month"""
+    today = today or datetime.date.today()
+    start = today.year * 12 + today.month - 1
+    end = start + max(horizon_months, 1) - 1
+    return list(range(today.year, end // 12 + 1))
+
+
+class ForecastCube:
+    """Predictions of every (month, area, sex, category) cell for a run of years.
+
+    values is indexed [year, month, area, sex, category] and proba
+    [year, month, area, sex, category, risk code]. A cube belongs to one model
+    version (fingerprint) and is never modified, so prediction tables made
+    from it are shared by all requests.
+    """
+
+    def __init__(self, model_version, fingerprint, years, values, proba, built_at=None, path=None):
+        self.model_version = model_version
+        self.fingerprint = fingerprint
+        self.years = list(years)
+        self.values = values
+        self.proba = proba
+        self.built_at = built_at if built_at is not None else time.time()
+        self.path = path
+        self.tables = {}
+        self.lock = threading.Lock()
+
+    def covers(self, fingerprint, years):
+        return fingerprint == self.fingerprint and set(years) <= set(self.years)
+
+    def table(self, engine, codebook, year):
+        """PredictionTable answering requests for year, with the other years of the cube preloaded"""
+        table = self.tables.get(year)
+        if table is None:
+            index = self.years.index(year)
+            table = PredictionTable(engine, codebook, year, values=self.values[index], proba=self.proba[index])
+            table.other_years = OrderedDict((other, self.values[i]) for i, other in enumerate(self.years)
+                                            if other != year)
+            with self.lock:
+                table = self.tables.setdefault(year, table)
+        return table
+
+    def info(self):
+        return {
+            'model_version': self.model_version,
+            'years': self.years,
+            'built_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.built_at))
+        }
+
+
+def build_cube(model, codebook, years, n_classes, proba_dtype=np.float32):
+    """Score the full grid of every year with a model version's forest"""
+    engine = model.model
+    shape = (12, codebook.size('area'), codebook.size('sex'), codebook.size('category'))
+    months, areas, sexes, categories = np.indices(shape).reshape(len(shape), -1)
+    values = np.empty((len(years),) + shape, dtype=np.int8)
+    proba = np.empty((len(years),) + shape + (n_classes,), dtype=proba_dtype)
+    # One year at a time keeps the forest traversal within the CPU cache
+    for i, year in enumerate(years):
+        features = build_feature_frame(engine, months + 1, areas, sexes, categories, np.full(months.shape, year))
+        year_proba = engine.predict_proba(features)
+        values[i] = engine.classes_[np.argmax(year_proba, axis=1)].reshape(shape)
+        proba[i] = risk_columns(year_proba.astype(proba_dtype), engine.classes_, n_classes).reshape(
+            shape + (n_classes,))
+    return ForecastCube(model.version, model.fingerprint, years, values, proba)
+
+
+def write_cube(directory, cube):
+    """Write a cube as a new directory and publish it by replacing the CURRENT pointer.
+
+    The arrays are written and the directory renamed into place before the
+    pointer moves, so readers only ever see complete cubes.
+    """
+    name = f"{cube.fingerprint[:12]}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    tmp_dir = os.path.join(directory, f".{name}.tmp")
+    os.makedirs(tmp_dir)
+    try:
+        np.save(os.path.join(tmp_dir, 'values.npy'), np.ascontiguousarray(cube.values))
+        np.save(os.path.join(tmp_dir, 'proba.npy'), np.ascontiguousarray(cube.proba))
+        with open(os.path.join(tmp_dir, CUBE_MANIFEST), 'w') as f:
+            json.dump({
+                'format_version': CUBE_FORMAT_VERSION,
+                'model_version': cube.model_version,
+                'fingerprint': cube.fingerprint,
+                'years': cube.years,
+                'built_at': cube.built_at
+            }, f, indent=2, sort_keys=True)
+        path = os.path.join(directory, name)
+        os.rename(tmp_dir, path)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    pointer = os.path.join(directory, CURRENT_NAME)
+    with open(f"{pointer}.{os.getpid()}.tmp", 'w') as f:
+        f.write(name)
+    os.replace(f"{pointer}.{os.getpid()}.tmp", pointer)
+    cube.path = path
+    return path
+
+
+def read_cube(path):
+    """A cube directory, memory-mapped, or None if it is not readable"""
+    try:
+        with open(os.path.join(path, CUBE_MANIFEST)) as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') != CUBE_FORMAT_VERSION:
+            return None
+        values = np.load(os.path.join(path, 'values.npy'), mmap_mode='r', allow_pickle=False)
+        proba = np.load(os.path.join(path, 'proba.npy'), mmap_mode='r', allow_pickle=False)
+    except (OSError, ValueError) as e:
+        logger.debug("No readable forecast cube in %s: %s", path, e)
+        return None
+    return ForecastCube(manifest['model_version'], manifest['fingerprint'], manifest['years'], values, proba,
+                        manifest['built_at'], path)
+
+
+def find_cube(directory, fingerprint, years):
+    """A published cube of a model version covering years, or None.
+
+    The current cube is tried first, then older cubes of the same model
+    (e.g. after a rollback), newest first.
+    """
+    candidates = []
+    try:
+        with open(os.path.join(directory, CURRENT_NAME)) as f:
+            candidates.append(f.read().strip())
+    except OSError:
+        pass
+    try:
+        candidates += sorted((entry.name for entry in os.scandir(directory)
+                              if entry.is_dir() and entry.name.startswith(fingerprint[:12])), reverse=True)
+    except OSError:
+        return None
+    for name in dict.fromkeys(candidates):
+        cube = read_cube(os.path.join(directory, name))
+        if cube is not None and cube.covers(fingerprint, years):
+            return cube
+    return None
+
+
+def prune_cubes(directory, keep=KEEP_CUBES):
+    """Remove all but the newest published cube directories"""
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.is_dir() and not entry.name.startswith('.'):
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except OSError:
+                pass
+    for _, path in sorted(entries)[:-keep]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class ForecastScheduler:
+    """Keeps the forecast cube of the active model version covering a rolling horizon.
+
+    ensure(model) gives a model version a cube covering horizon_months from
+    the current month, loading the published one from directory when it
+    matches and building (and publishing) one otherwise. Builds are
+    serialized across worker processes with an flock, so one process builds
+    and the others map its files. A background thread re-checks every
+    poll_interval seconds, which rolls the horizon forward when the month or
+    year changes; the new cube replaces model.forecast in one assignment.
+    Neither loading a model version nor serving a request builds: attach(model)
+    only maps a published cube, and it and request(model) otherwise wake the
+    thread. After a failed build the thread waits RETRY_SECONDS (doubling
+    with each further failure) before trying again.
+    """
+
+    def __init__(self, directory, build, current_model, horizon_months=24, poll_interval=600):
+        self.directory = directory
+        self.build = build
+        self.current_model = current_model
+        self.horizon_months = horizon_months
+        self.poll_interval = poll_interval
+        self.builds = 0
+        self.failures = 0
+        self.retry_at = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def years(self):
+        return horizon_years(self.horizon_months)
+
+    def ensure(self, model):
+        """Attach a cube covering the horizon to a model version; returns True if it changed"""
+        years = self.years()
+        if model.forecast is not None and model.forecast.covers(model.fingerprint, years):
+            return False
+        with self.lock:
+            if model.forecast is not None and model.forecast.covers(model.fingerprint, years):
+                return False
+            model.forecast = self._published_or_build(model, years)
+            logger.info("Forecast cube for model version %s covers %s", model.version,
+                        ', '.join(map(str, model.forecast.years)))
+            return True
+
+    def _published_or_build(self, model, years):
+        if not self.directory:
+            return self._build(model, years)
+        cube = find_cube(self.directory, model.fingerprint, years)
+        if cube is not None:
+            return cube
+        os.makedirs(self.directory, exist_ok=True)
+        lock_file = open(os.path.join(self.directory, '.lock'), 'a')
+        try:
+            if fcntl is not None:
+                # Another worker may be building the same cube; wait for it and use its files
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                cube = find_cube(self.directory, model.fingerprint, years)
+                if cube is not None:
+                    return cube
+            cube = self._build(model, years)
+            try:
+                write_cube(self.directory, cube)
+                prune_cubes(self.directory)
+            except OSError as e:
+                logger.warning("Could not publish forecast cube: %s", e)
+            return cube
+        finally:
+            lock_file.close()
+
+    def _build(self, model, years):
+        started = time.perf_counter()
+        cube = self.build(model, years)
+        self.builds += 1
+        logger.info("Built forecast cube for %d years in %.2fs", len(years), time.perf_counter() - started)
+        return cube
+
+    def start(self):
+        """Re-check the active model's cube in a daemon thread"""
+        with self.lock:
+            if self.thread is not None or not self.poll_interval:
+                return
+            self.thread = threading.Thread(target=self._run, name='forecast-scheduler', daemon=True)
+            self.thread.start()
+
+    def attach(self, model):
+        """Give a newly loaded model version its published cube, or have the thread build one once it starts"""
+        cube = find_cube(self.directory, model.fingerprint, self.years()) if self.directory else None
+        if cube is not None:
+            model.forecast = cube
+        else:
+            self.wake.set()
+
+    def request(self, model):
+        """Ask the thread to bring a model's cube up to date without waiting for it"""
+        if time.monotonic() >= self.retry_at:
+            self.start()
+            self.wake.set()
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.poll_interval)
+            self.wake.clear()
+            if self.stopped.is_set():
+                return
+            if time.monotonic() < self.retry_at:
+                continue
+            try:
+                model = self.current_model()
+                if model is not None:
+                    self.ensure(model)
+                self.failures = 0
+            except Exception:
+                self.failures += 1
+                delay = min(RETRY_SECONDS * 2 ** (self.failures - 1), max(self.poll_interval, RETRY_SECONDS))
+                self.retry_at = time.monotonic() + delay
+                logger.exception("Error refreshing the forecast cube, retrying in %ds", delay)
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+
+    def after_fork(self):
+        """Reset thread state in a forked worker process (see ModelRegistry.after_fork)"""
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.wake = threading.Event()
+        self.thread = None
@@ -0,0 +1,103 @@
+import numpy as np
+
+
+class CompiledForest:
+    """A fitted random forest classifier flattened into packed NumPy node arrays.
+
+    All trees share one set of node arrays; roots holds the offset of each
+    tree's first node and children[2 * node + go_right] the next node. Leaves
+    have feature == -1. A batch is evaluated by stepping every (tree, row)
+    pair that has not reached a leaf yet down one level at a time.
+    """
+
+    def __init__(self, feature, threshold, children, leaf_proba, roots, classes, feature_names=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.leaf_proba = leaf_proba
+        self.roots = roots
+        self.classes_ = classes
+        if feature_names is not None:
+            self.feature_names_in_ = feature_names
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        """Compile a fitted sklearn RandomForestClassifier"""
+        if not hasattr(forest, 'estimators_'):
+            raise ValueError("Model is not a fitted forest")
+        if getattr(forest, 'n_outputs_', 1) != 1:
+            raise ValueError("Multi-output forests are not supported")
+
+        features, thresholds, children, probas, roots = [], [], [], [], []
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            is_leaf = tree.children_left == -1
+
+            features.append(np.where(is_leaf, -1, tree.feature).astype(np.int32))
+            thresholds.append(tree.threshold.astype(np.float64))
+            # Leaves keep sklearn's -1 children; they are never followed
+            node_children = np.stack([tree.children_left, tree.children_right], axis=1)
+            children.append(np.where(is_leaf[:, np.newaxis], -1, node_children + offset).ravel().astype(np.int32))
+
+            # Normalize leaf values to class probabilities, as DecisionTreeClassifier.predict_proba does
+            value = tree.value[:, 0, :].astype(np.float64)
+            totals = value.sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1
+            probas.append(value / totals)
+
+            roots.append(offset)
+            offset += n_nodes
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            children=np.concatenate(children),
+            leaf_proba=np.concatenate(probas),
+            roots=np.asarray(roots, dtype=np.int32),
+            classes=np.asarray(forest.classes_),
+            feature_names=getattr(forest, 'feature_names_in_', None)
+        )
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def _as_matrix(self, X):
+        # sklearn evaluates trees on float32 inputs, compared against float64 thresholds
+        return np.asarray(X, dtype=np.float32).astype(np.float64)
+
+    def apply(self, X):
+        """Leaf node index reached in every tree, shaped [tree, row]"""
+        X = self._as_matrix(X)
+        n_rows, n_features = X.shape
+        n_trees = len(self.roots)
+        flat_X = X.ravel()
+
+        # One entry per (tree, row) pair, tree-major
+        nodes = np.repeat(self.roots, n_rows)
+        row_offsets = np.tile(np.arange(n_rows, dtype=np.int64) * n_features, n_trees)
+
+        # Only pairs that have not reached a leaf are stepped further
+        active = np.flatnonzero(self.feature[nodes] >= 0)
+        while active.size:
+            current = nodes[active]
+            go_right = flat_X[row_offsets[active] + self.feature[current]] > self.threshold[current]
+            current = self.children[2 * current + go_right]
+            nodes[active] = current
+            active = active[self.feature[current] >= 0]
+        return nodes.reshape(n_trees, n_rows)
+
+    def predict_proba(self, X):
+        """Mean class probabilities over all trees, shaped [row, class]"""
+        leaves = self.apply(X)
+        # Accumulate tree by tree in estimator order, like sklearn, so ties break the same way
+        proba = np.zeros((leaves.shape[1], self.leaf_proba.shape[1]))
+        for tree_leaves in leaves:
+            proba += self.leaf_proba[tree_leaves]
+        proba /= len(leaves)
+        return proba
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
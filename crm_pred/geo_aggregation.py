@@ -0,0 +1,74 @@
+import numpy as np
+
+# Number of crime risk classes predicted by the model (0 = Unsafe, 1 = Safe, 2 = Neutral)
+N_RISK_CLASSES = 3
+
+
+def risk_counts(block, axes):
+    """Count predictions per risk class, reducing the given axes of the block.
+
+    The class dimension is appended as the last axis of the result.
+    """
+    one_hot = block[..., np.newaxis] == np.arange(N_RISK_CLASSES)
+    return one_hot.sum(axis=axes)
+
+
+def area_summaries(areas, counts, crime_risk_mapping):
+    """Build the per-area map entries from an [area, class] count matrix"""
+    totals = counts.sum(axis=1)
+    # argmax keeps the lowest class on ties, matching max() over the old count dict
+    dominant = counts.argmax(axis=1)
+    unsafe_percent = np.where(totals > 0, counts[:, 0] / np.maximum(totals, 1) * 100, 0)
+
+    return [
+        {
+            'area_name': area,
+            'prediction': crime_risk_mapping[int(dominant[i])],
+            'crime_count': int(totals[i]),
+            'unsafe_percent': round(float(unsafe_percent[i]), 1)
+        }
+        for i, area in enumerate(areas)
+    ]
+
+
+def expected_cells(proba, axes):
+    """Sums and means of class probabilities, reducing the given axes.
+
+    proba has the class dimension last. Each sum is the expected number of
+    (category, sex) cells predicted in a class, not a number of crimes.
+    Returns (sums, means) with the class axis last.
+    """
+    sums = proba.sum(axis=axes, dtype=np.float64)
+    cells = np.prod([proba.shape[axis] for axis in np.atleast_1d(axes)])
+    return sums, sums / max(cells, 1)
+
+
+def add_probabilities(entries, sums, means, crime_risk_mapping):
+    """Add probability fields to area entries from [area, class] expected cells and mean probabilities"""
+    for i, entry in enumerate(entries):
+        entry['unsafe_probability'] = round(float(means[i, 0]), 4)
+        entry['risk_probabilities'] = {label: round(float(means[i, code]), 4)
+                                       for code, label in crime_risk_mapping.items()}
+        entry['expected_cells'] = {label: round(float(sums[i, code]), 2)
+                                   for code, label in crime_risk_mapping.items()}
+    return entries
+
+
+def overall_area_predictions(block, areas, crime_risk_mapping, proba=None):
+    """Area entries for the overall map from a [category, area, sex] prediction block.
+
+    With proba ([category, area, sex, class]) the entries also carry probabilities.
+    """
+    entries = area_summaries(areas, risk_counts(block, axes=(0, 2)), crime_risk_mapping)
+    if proba is not None:
+        add_probabilities(entries, *expected_cells(proba, axes=(0, 2)), crime_risk_mapping)
+    return entries
+
+
+def category_area_predictions(block, areas, crime_risk_mapping, proba=None):
+    """Yield the area entries of every per-category map, in the block's category order"""
+    for c, category_block in enumerate(block):
+        entries = area_summaries(areas, risk_counts(category_block, axes=1), crime_risk_mapping)
+        if proba is not None:
+            add_probabilities(entries, *expected_cells(proba[c], axes=1), crime_risk_mapping)
+        yield entries
@@ -0,0 +1,140 @@
+import hashlib
+
+import numpy as np
+
+from crime_types import AREA_NAMES
+from response_encoding import dumps
+
+# Simplification tolerance (in degrees) and coordinate decimals per zoom level.
+# 0.001 degrees is roughly 100 m at LA's latitude.
+ZOOM_LEVELS = {
+    'low': (0.002, 4),
+    'medium': (0.0005, 5),
+    'high': (0.0001, 5),
+    'full': (0, None)
+}
+DEFAULT_ZOOM = 'medium'
+
+# Property columns that may hold the area name, checked in order
+NAME_FIELDS = ('name', 'AREA NAME', 'area_name', 'APREC', 'AREA_NAME')
+
+
+def name_column(frame):
+    """The property column holding the area names: the one matching most AREA_NAMES"""
+    known = set(AREA_NAMES)
+    best, best_matches = None, 0
+    columns = [column for column in NAME_FIELDS if column in frame.columns]
+    columns += [column for column in frame.columns if column not in columns and column != 'geometry']
+    for column in columns:
+        matches = len(known.intersection(frame[column].astype(str)))
+        if matches > best_matches:
+            best, best_matches = column, matches
+    if best is None:
+        raise ValueError("No property of the GeoJSON file holds the area names")
+    return best
+
+
+def geometry_bytes(geometry, tolerance, decimals):
+    """GeoJSON geometry of one area at one zoom level, serialized once"""
+    import shapely
+
+    if tolerance:
+        geometry = geometry.simplify(tolerance, preserve_topology=True)
+    if decimals is not None:
+        geometry = shapely.transform(geometry, lambda coords: np.round(coords, decimals))
+    return shapely.to_geojson(geometry).encode('utf-8')
+
+
+class GeoLayer:
+    """Area boundaries loaded once and pre-serialized at several zoom levels.
+
+    Every area's geometry is simplified and serialized to GeoJSON bytes per
+    zoom level when the layer is built, so a prediction-joined
+    FeatureCollection is assembled by splicing those bytes with the
+    serialized properties instead of re-encoding coordinates per request.
+    """
+
+    def __init__(self, path):
+        import geopandas as gpd
+        import shapely
+
+        frame = gpd.read_file(path)
+        if frame.crs is not None and frame.crs.to_epsg() != 4326:
+            frame = frame.to_crs(epsg=4326)
+        column = name_column(frame)
+        # Areas split over several features are merged into one geometry
+        frame = frame[[column, 'geometry']].dissolve(by=column)
+
+        self.path = path
+        self.geometries = dict(zip(frame.index.astype(str), frame.geometry))
+        self.bounds = {area: [round(float(value), 6) for value in geometry.bounds]
+                       for area, geometry in self.geometries.items()}
+        # Spatial index for point lookups; tree positions follow self.area_names
+        self.area_names = sorted(self.geometries)
+        self.tree = shapely.STRtree([self.geometries[area] for area in self.area_names])
+        self.serialized = {
+            zoom: {area: geometry_bytes(geometry, tolerance, decimals)
+                   for area, geometry in self.geometries.items()}
+            for zoom, (tolerance, decimals) in ZOOM_LEVELS.items()
+        }
+        # Plain boundaries never change while the layer is loaded
+        self.boundary_bodies = {zoom: self.feature_collection(
+            [{'area_name': area} for area in self.area_names], zoom) for zoom in ZOOM_LEVELS}
+        self.boundary_etags = {zoom: hashlib.sha1(body).hexdigest()
+                               for zoom, body in self.boundary_bodies.items()}
+
+    def __len__(self):
+        return len(self.geometries)
+
+    def areas(self):
+        return list(self.area_names)
+
+    def missing(self, areas):
+        """Areas without a geometry in the boundary file"""
+        return [area for area in areas if area not in self.geometries]
+
+    def locate(self, lons, lats):
+        """Index into areas() of the area containing each point, -1 outside every area.
+
+        All points are looked up in one STRtree query. A point on a shared
+        border belongs to the first of its areas in areas() order.
+        """
+        import shapely
+
+        points = shapely.points(np.asarray(lons, dtype=np.float64), np.asarray(lats, dtype=np.float64))
+        point_index, area_index = self.tree.query(points, predicate='intersects')
+        outside = len(self.area_names)
+        located = np.full(len(points), outside, dtype=np.int64)
+        np.minimum.at(located, point_index, area_index)
+        located[located == outside] = -1
+        return located
+
+    def feature_collection(self, entries, zoom=DEFAULT_ZOOM, extra=None):
+        """FeatureCollection bytes with one feature per area entry (a dict with 'area_name').
+
+        The entry becomes the feature's properties, together with the area
+        name under 'name' as in the original boundary file (the map component
+        matches features on it). Areas without a geometry get a null geometry.
+        extra holds members added to the collection itself.
+        """
+        serialized = self.serialized[zoom]
+        features = []
+        for entry in entries:
+            area = entry['area_name']
+            geometry = serialized.get(area, b'null')
+            bbox = dumps(self.bounds[area]) if area in self.bounds else None
+            features.append(b''.join([
+                b'{"type":"Feature","id":', dumps(area),
+                b',"bbox":' + bbox if bbox is not None else b'',
+                b',"properties":', dumps({'name': area, **entry}),
+                b',"geometry":', geometry, b'}'
+            ]))
+        members = dict(extra or {})
+        head = b'{"type":"FeatureCollection",'
+        if members:
+            head += dumps(members)[1:-1] + b','
+        return head + b'"features":[' + b','.join(features) + b']}'
+
+    def boundaries(self, zoom=DEFAULT_ZOOM):
+        """(body, etag) of the plain boundary FeatureCollection at a zoom level"""
+        return self.boundary_bodies[zoom], self.boundary_etags[zoom]
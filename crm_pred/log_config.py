@@ -0,0 +1,57 @@
+import logging
+import os
+import sys
+import threading
+import time
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# Each message (by its format string) is logged at most LOG_BURST times per LOG_INTERVAL seconds
+LOG_BURST = int(os.environ.get('LOG_BURST', 10))
+LOG_INTERVAL = float(os.environ.get('LOG_INTERVAL', 60))
+LOG_FORMAT = '%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s'
+
+
+class RateLimitFilter(logging.Filter):
+    """Drop repeats of a message beyond a burst per interval.
+
+    Messages are told apart by logger, level and format string (not the
+    formatted arguments), so a per-request message cannot flood the log. The
+    first message of the next interval reports how many were dropped.
+    """
+
+    def __init__(self, burst=LOG_BURST, interval=LOG_INTERVAL):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.windows = {}  # key -> [interval start, messages logged, messages dropped]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                dropped = window[2] if window is not None else 0
+                self.windows[key] = [now, 1, 0]
+                if dropped:
+                    record.msg = f"{record.msg} [{dropped} similar messages suppressed]"
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+def configure_logging(level=LOG_LEVEL):
+    """Send the app's log records to stderr through the rate limiter (once per process)"""
+    logger = logging.getLogger('crm_pred')
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handler.addFilter(RateLimitFilter())
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level)
+    return logger
@@ -0,0 +1,186 @@
+import io
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from sub-millisecond lookups to slow chart renders
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {} if self.labelnames else {(): 0}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        for key, value in sorted(values.items()):
+            yield self.name, _labels(self.labelnames, key), value
+
+
+class Histogram:
+    """Cumulative bucket histogram with optional labels, as Prometheus expects"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {}  # labels -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        # Per-bucket counts are stored and accumulated when rendered
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self.lock:
+            series = {key: list(values) for key, values in self.series.items()}
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                yield f"{self.name}_bucket", _labels(self.labelnames, key, [('le', _number(bound))]), cumulative
+            yield f"{self.name}_sum", _labels(self.labelnames, key), values[-2]
+            yield f"{self.name}_count", _labels(self.labelnames, key), values[-1]
+
+
+class CallbackMetric:
+    """Gauge or counter whose values are read from a callback when rendered.
+
+    The callback returns a number, or a dict of {label values tuple: number}.
+    """
+
+    def __init__(self, name, help, callback, kind='gauge', labelnames=()):
+        self.name = name
+        self.help = help
+        self.callback = callback
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in sorted(values.items()):
+            yield self.name, _labels(self.labelnames, key), value
+
+
+class MetricsRegistry:
+    """Metrics of this process, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name, help, callback, kind='gauge', labelnames=()):
+        return self.register(CallbackMetric(name, help, callback, kind, labelnames))
+
+    def render(self):
+        out = io.StringIO()
+        for metric in self.metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                out.write(f"# {metric.name} unavailable: {_escape(e)}\n")
+                continue
+            out.write(f"# HELP {metric.name} {metric.help}\n# TYPE {metric.name} {metric.kind}\n")
+            for name, labels, value in samples:
+                out.write(f"{name}{labels} {_number(value)}\n")
+        return out.getvalue()
+
+
+class RequestProfiler:
+    """Profile one request with pyinstrument (if installed) or cProfile"""
+
+    def __init__(self, kind='cprofile'):
+        self.kind = 'cprofile'
+        if kind == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+                self.profiler = Profiler()
+                self.kind = kind
+            except ImportError:
+                pass
+        if self.kind == 'cprofile':
+            import cProfile
+            self.profiler = cProfile.Profile()
+
+    def start(self):
+        if self.kind == 'pyinstrument':
+            self.profiler.start()
+        else:
+            self.profiler.enable()
+
+    def stop(self):
+        if self.kind == 'pyinstrument':
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+
+    def report(self, limit=40):
+        """Text report, slowest call paths first"""
+        if self.kind == 'pyinstrument':
+            return self.profiler.output_text(unicode=True)
+        import pstats
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats('cumulative').print_stats(limit)
+        return out.getvalue()
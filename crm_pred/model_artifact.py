@@ -0,0 +1,87 @@
+import json
+import os
+
+import numpy as np
+
+from forest_engine import CompiledForest
+
+# Bump when the layout of the artifact directory changes
+ARTIFACT_FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+
+# Node arrays of a CompiledForest, each stored as <name>.npy
+FOREST_ARRAYS = ('feature', 'threshold', 'children', 'leaf_proba', 'roots', 'classes_')
+
+
+def _replace_file(path, write):
+    """Write a file under a temporary name and rename it into place"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def write_artifact(directory, engine, manifest, arrays=None):
+    """Write a compiled forest, a manifest and extra named arrays as a model artifact.
+
+    Every file is renamed into place and the manifest is written last, so
+    readers never see a half-written artifact and processes that already
+    mapped the old files keep using them.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    stored = {name: getattr(engine, name) for name in FOREST_ARRAYS}
+    stored.update(arrays or {})
+    for name, values in stored.items():
+        _replace_file(os.path.join(directory, f"{name}.npy"),
+                      lambda f: np.save(f, np.ascontiguousarray(values)))
+
+    manifest = dict(manifest)
+    manifest.update({
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'feature_names': [str(name) for name in getattr(engine, 'feature_names_in_', [])],
+        'n_trees': int(len(engine.roots)),
+        'n_nodes': int(engine.n_nodes),
+        'arrays': sorted(stored)
+    })
+    _replace_file(os.path.join(directory, MANIFEST_NAME),
+                  lambda f: f.write(json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8')))
+
+
+def read_manifest(directory):
+    """Manifest of a model artifact, or None if there is no readable artifact"""
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('format_version') != ARTIFACT_FORMAT_VERSION:
+        return None
+    return manifest
+
+
+def load_array(directory, name):
+    """Memory-map one array of an artifact read-only"""
+    return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r', allow_pickle=False)
+
+
+def load_artifact(directory, manifest=None):
+    """Load a model artifact as (CompiledForest, manifest).
+
+    Node arrays are memory-mapped, so processes serving the same artifact
+    share its pages through the OS page cache.
+    """
+    manifest = manifest or read_manifest(directory)
+    if manifest is None:
+        raise ValueError(f"No model artifact in {directory}")
+    arrays = {name: load_array(directory, name) for name in FOREST_ARRAYS}
+    engine = CompiledForest(
+        feature=arrays['feature'],
+        threshold=arrays['threshold'],
+        children=arrays['children'],
+        leaf_proba=arrays['leaf_proba'],
+        roots=arrays['roots'],
+        classes=np.asarray(arrays['classes_']),
+        feature_names=np.asarray(manifest['feature_names'], dtype=object) if manifest['feature_names'] else None
+    )
+    return engine, manifest
@@ -0,0 +1,144 @@
+import logging
+import os
+import threading
+
+logger = logging.getLogger('crm_pred.model_registry')
+
+
+class ModelUnavailable(RuntimeError):
+    """Raised when no valid model version could be loaded"""
+
+
+class ModelVersion:
+    """A loaded and validated model version with everything derived from it"""
+
+    def __init__(self, version, model, fingerprint, table, manifest=None):
+        self.version = version
+        self.model = model
+        self.fingerprint = fingerprint
+        self.table = table
+        self.manifest = manifest or {}
+        self.forecast = None  # ForecastCube, set by the forecast scheduler
+
+
+def version_stamp(path):
+    """Latest modification time of a version directory or anything directly inside it"""
+    stamps = [os.stat(path).st_mtime]
+    for entry in os.scandir(path):
+        try:
+            stamps.append(entry.stat().st_mtime)
+        except OSError:
+            pass
+    return max(stamps)
+
+
+class ModelRegistry:
+    """Versioned models in a directory, swapped in without blocking requests.
+
+    Every subdirectory of models_dir is one version and versions are ordered by
+    name, so they should be named to sort chronologically (e.g. 20250101-120000).
+    load_version(version, path) loads and validates one version, returning a
+    ModelVersion or raising. The newest valid version is loaded on first use;
+    after that a background thread polls for new versions, loads them off the
+    request path and swaps them in with a single reference assignment.
+    """
+
+    def __init__(self, models_dir, load_version, poll_interval=30, on_swap=None):
+        self.models_dir = models_dir
+        self.load_version = load_version
+        self.poll_interval = poll_interval
+        self.on_swap = on_swap
+        self.current = None
+        self.failed = {}  # version -> (stamp, error); retried only once the files change
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.watcher = None
+
+    def versions(self):
+        """Names of the version directories, oldest first"""
+        try:
+            entries = os.scandir(self.models_dir)
+        except OSError:
+            return []
+        return sorted(entry.name for entry in entries
+                      if entry.is_dir() and not entry.name.startswith('.') and not entry.name.endswith('.tmp'))
+
+    def get(self):
+        """The active model version, loading one on first use"""
+        current = self.current
+        if current is None:
+            self.refresh()
+            current = self.current
+            if current is None:
+                raise ModelUnavailable("No valid model version is available")
+            self.start_watching()
+        return current
+
+    def refresh(self):
+        """Swap in the newest valid version if it differs from the active one; returns True on a swap"""
+        with self.lock:
+            versions = self.versions()
+            current = self.current
+            # Only move to older versions when the active one has been removed (a rollback)
+            allow_older = current is None or current.version not in versions
+            for version in reversed(versions):
+                if current is not None and version == current.version:
+                    return False
+                if current is not None and version < current.version and not allow_older:
+                    return False
+                path = os.path.join(self.models_dir, version)
+                try:
+                    stamp = version_stamp(path)
+                except OSError:
+                    continue
+                if self.failed.get(version, (None,))[0] == stamp:
+                    continue
+                try:
+                    loaded = self.load_version(version, path)
+                except Exception as e:
+                    logger.warning("Model version %s rejected: %s", version, e)
+                    self.failed[version] = (stamp, str(e))
+                    continue
+                self.failed.pop(version, None)
+                self.current = loaded
+                logger.info("Model version %s is active", version)
+                if current is not None and self.on_swap is not None:
+                    self.on_swap(current, loaded)
+                return True
+        return False
+
+    def start_watching(self):
+        """Poll for new versions in a daemon thread"""
+        with self.lock:
+            if self.watcher is not None or not self.poll_interval:
+                return
+            self.watcher = threading.Thread(target=self._watch, name='model-registry', daemon=True)
+            self.watcher.start()
+
+    def _watch(self):
+        while not self.stopped.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.exception("Error checking for model versions")
+
+    def stop(self):
+        self.stopped.set()
+
+    def after_fork(self):
+        """Reset thread state in a forked worker process; the loaded version is kept.
+
+        Threads do not survive fork(), so a server that loads the model before
+        forking its workers calls this in each worker and then start_watching().
+        """
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.watcher = None
+
+    def status(self):
+        current = self.current
+        return {
+            'version': current.version if current is not None else None,
+            'versions': self.versions(),
+            'rejected': {version: error for version, (_, error) in self.failed.items()}
+        }
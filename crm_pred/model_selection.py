@@ -0,0 +1,259 @@
+"""Compare candidate models and hyperparameters with time-based cross-validation.
+
+    python model_selection.py Crime_Data_from_2020_to_Present.csv --results selection.json
+    python model_selection.py --store crime_counts.sqlite --export --models-dir models
+
+Every (candidate, parameters, fold) is fitted in a process pool. The training
+matrices are written once as .npy files and memory-mapped by every worker.
+Folds are split by month: each fold trains on all months before its test
+months. The best servable candidate can be refitted on all data and written
+as a new model version.
+"""
+import argparse
+import itertools
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.ensemble import ExtraTreesClassifier, HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.tree import DecisionTreeClassifier
+
+from aggregate_store import CHUNK_SIZE, AggregateStore, aggregate_counts
+from forest_engine import CompiledForest
+from train import FEATURE_ORDER, training_frame, write_version
+
+try:
+    from xgboost import XGBClassifier
+except ImportError:
+    XGBClassifier = None
+
+# Candidate models: name -> (estimator class, hyperparameter grid, servable by the API)
+CANDIDATES = {
+    'random_forest': (RandomForestClassifier,
+                      {'n_estimators': [50, 100, 200], 'max_depth': [None, 20], 'random_state': [42]}, True),
+    'extra_trees': (ExtraTreesClassifier,
+                    {'n_estimators': [100, 200], 'max_depth': [None, 20], 'random_state': [42]}, True),
+    'decision_tree': (DecisionTreeClassifier, {'max_depth': [None, 10, 20], 'random_state': [42]}, False),
+    'hist_gradient_boosting': (HistGradientBoostingClassifier,
+                               {'max_iter': [100, 200], 'learning_rate': [0.1], 'random_state': [42]}, False),
+    'logistic_regression': (LogisticRegression, {'max_iter': [10000]}, False)
+}
+if XGBClassifier is not None:
+    CANDIDATES['xgboost'] = (XGBClassifier, {'n_estimators': [100, 200], 'max_depth': [6, 10],
+                                             'random_state': [42]}, False)
+
+# Single-row predictions timed per candidate for the latency figure
+LATENCY_REPEATS = 50
+
+# Set in each worker by _init_worker
+_matrices = {}
+
+
+def param_grid(grid):
+    """All parameter combinations of a grid, as dicts"""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def time_folds(x, n_splits):
+    """Expanding-window folds over months: (train rows, test rows) pairs in time order"""
+    periods = x['Year'].to_numpy() * 12 + x['Month'].to_numpy() - 1
+    blocks = np.array_split(np.unique(periods), n_splits + 1)
+    if any(len(block) == 0 for block in blocks):
+        raise ValueError(f"Not enough months of data for {n_splits} folds")
+    return [(np.flatnonzero(periods < block[0]), np.flatnonzero(np.isin(periods, block)))
+            for block in blocks[1:]]
+
+
+def _init_worker(matrix_dir):
+    # Memory-mapped, so every worker shares the same pages
+    for name in ('X', 'y'):
+        _matrices[name] = np.load(os.path.join(matrix_dir, f"{name}.npy"), mmap_mode='r')
+    _matrices['folds'] = np.load(os.path.join(matrix_dir, 'folds.npz'))
+
+
+def single_row_latency(predict, row):
+    """Median milliseconds for one single-row prediction"""
+    timings = []
+    for _ in range(LATENCY_REPEATS):
+        started = time.perf_counter()
+        predict(row)
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings) * 1000)
+
+
+def evaluate(name, params, fold):
+    """Fit one candidate on one fold and measure it"""
+    estimator, _, servable = CANDIDATES[name]
+    X, y, folds = _matrices['X'], _matrices['y'], _matrices['folds']
+    train_rows, test_rows = folds[f"train_{fold}"], folds[f"test_{fold}"]
+
+    model = estimator(**params)
+    started = time.perf_counter()
+    model.fit(X[train_rows], y[train_rows])
+    fit_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    predictions = model.predict(X[test_rows])
+    batch_ms = (time.perf_counter() - started) * 1000
+
+    # Latency and memory are measured on the form the API would serve
+    predictor = model
+    model_bytes = len(pickle.dumps(model))
+    if servable:
+        predictor = CompiledForest.from_sklearn(model)
+        model_bytes = sum(getattr(predictor, array).nbytes for array in
+                          ('feature', 'threshold', 'children', 'leaf_proba', 'roots'))
+    row = np.asarray(X[test_rows[:1]])
+
+    return {
+        'candidate': name,
+        'params': params,
+        'fold': fold,
+        'train_rows': int(len(train_rows)),
+        'test_rows': int(len(test_rows)),
+        'accuracy': float(np.mean(predictions == y[test_rows])),
+        'fit_seconds': round(fit_seconds, 4),
+        'batch_predict_ms': round(batch_ms, 3),
+        'predict_ms': round(single_row_latency(predictor.predict, row), 4),
+        'model_bytes': int(model_bytes)
+    }
+
+
+def summarize(results):
+    """Average fold results per (candidate, params), best accuracy first"""
+    grouped = {}
+    for result in results:
+        key = (result['candidate'], json.dumps(result['params'], sort_keys=True))
+        grouped.setdefault(key, []).append(result)
+    summary = []
+    for (name, _), folds in grouped.items():
+        accuracy = float(np.mean([fold['accuracy'] for fold in folds]))
+        predict_ms = float(np.mean([fold['predict_ms'] for fold in folds]))
+        summary.append({
+            'candidate': name,
+            'params': folds[0]['params'],
+            'servable': CANDIDATES[name][2],
+            'accuracy': round(accuracy, 4),
+            'accuracy_std': round(float(np.std([fold['accuracy'] for fold in folds])), 4),
+            'fit_seconds': round(float(np.mean([fold['fit_seconds'] for fold in folds])), 4),
+            'predict_ms': round(predict_ms, 4),
+            'accuracy_per_ms': round(accuracy / predict_ms, 4) if predict_ms else None,
+            'model_bytes': int(np.max([fold['model_bytes'] for fold in folds]))
+        })
+    return sorted(summary, key=lambda entry: (-entry['accuracy'], entry['predict_ms']))
+
+
+def choose(summary, metric='accuracy', max_predict_ms=None):
+    """Best servable candidate by metric, optionally within a latency budget"""
+    eligible = [entry for entry in summary if entry['servable'] and
+                (max_predict_ms is None or entry['predict_ms'] <= max_predict_ms)]
+    if not eligible:
+        return None
+    return max(eligible, key=lambda entry: (entry[metric], -entry['predict_ms']))
+
+
+def run(x, y, candidates, n_splits=4, max_workers=None):
+    """Evaluate every candidate, parameter set and fold in a process pool"""
+    folds = time_folds(x, n_splits)
+    matrix_dir = tempfile.mkdtemp(prefix='model_selection-')
+    try:
+        np.save(os.path.join(matrix_dir, 'X.npy'), x.to_numpy(dtype=np.float32))
+        np.save(os.path.join(matrix_dir, 'y.npy'), np.asarray(y))
+        arrays = {}
+        for fold, (train_rows, test_rows) in enumerate(folds):
+            arrays[f"train_{fold}"] = train_rows
+            arrays[f"test_{fold}"] = test_rows
+        np.savez(os.path.join(matrix_dir, 'folds.npz'), **arrays)
+
+        tasks = [(name, params, fold) for name in candidates
+                 for params in param_grid(CANDIDATES[name][1]) for fold in range(len(folds))]
+        print(f"Evaluating {len(tasks)} fits over {len(folds)} time-based folds")
+        results = []
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(matrix_dir,)) as pool:
+            futures = [pool.submit(evaluate, *task) for task in tasks]
+            for future in futures:
+                result = future.result()
+                print(f"{result['candidate']} {result['params']} fold {result['fold']}: "
+                      f"accuracy {result['accuracy']:.4f}, fit {result['fit_seconds']:.2f}s, "
+                      f"predict {result['predict_ms']:.3f}ms")
+                results.append(result)
+        return results
+    finally:
+        shutil.rmtree(matrix_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare candidate models with time-based cross-validation")
+    parser.add_argument('csv', nargs='?', help="Crime data CSV")
+    parser.add_argument('--store', help="SQLite aggregate cube to read the counts from instead of a CSV")
+    parser.add_argument('--candidates', default=','.join(CANDIDATES),
+                        help=f"Comma-separated subset of: {', '.join(CANDIDATES)}")
+    parser.add_argument('--folds', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--metric', choices=['accuracy', 'accuracy_per_ms'], default='accuracy')
+    parser.add_argument('--max-predict-ms', type=float, help="Only choose models at or below this latency")
+    parser.add_argument('--results', help="Write fold results and the summary to this JSON file")
+    parser.add_argument('--export', action='store_true', help="Refit the chosen model and write a model version")
+    parser.add_argument('--models-dir', default=os.environ.get('MODELS_DIR', 'models'))
+    parser.add_argument('--version', help="Version name for --export (default: current time)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+    if bool(args.csv) == bool(args.store):
+        parser.error("give either a CSV file or --store")
+    candidates = [name.strip() for name in args.candidates.split(',') if name.strip()]
+    unknown = [name for name in candidates if name not in CANDIDATES]
+    if unknown:
+        parser.error(f"unknown candidates: {', '.join(unknown)}")
+
+    if args.store:
+        store = AggregateStore(args.store)
+        try:
+            counts = store.counts()
+        finally:
+            store.close()
+    else:
+        counts, rows, dropped = aggregate_counts(args.csv, args.chunk_size)
+        print(f"Read {rows} rows ({dropped} without a usable date or area)")
+    x, y = training_frame(counts)
+
+    started = time.time()
+    results = run(x, y, candidates, args.folds, args.workers)
+    summary = summarize(results)
+    chosen = choose(summary, args.metric, args.max_predict_ms)
+    print(f"Evaluated {len(summary)} configurations in {time.time() - started:.1f}s")
+    for entry in summary:
+        print(f"{entry['candidate']:<24} {json.dumps(entry['params']):<60} accuracy {entry['accuracy']:.4f} "
+              f"predict {entry['predict_ms']:.3f}ms fit {entry['fit_seconds']:.2f}s")
+
+    if args.results:
+        with open(args.results, 'w') as f:
+            json.dump({'folds': results, 'summary': summary, 'chosen': chosen}, f, indent=2)
+
+    if chosen is None:
+        print("No servable candidate meets the constraints")
+        return
+    print(f"Chosen: {chosen['candidate']} {chosen['params']}")
+    if args.export:
+        estimator = CANDIDATES[chosen['candidate']][0]
+        model = estimator(**chosen['params']).fit(x, y)
+        version = args.version or time.strftime('%Y%m%d-%H%M%S')
+        path = write_version(args.models_dir, version, model, {
+            'version': version,
+            'training_rows': len(x),
+            'features': FEATURE_ORDER,
+            'selection': chosen,
+            'params': chosen['params']
+        })
+        print(f"Model version {version} written to {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Feature order used when the model does not expose feature_names_in_
+DEFAULT_FEATURE_ORDER = ['AREA NAME', 'Crime_Category', 'Month', 'Vict Sex', 'Year']
+# Grids of other years kept per table, least recently used dropped first
+MAX_OTHER_YEARS = 20
+
+
+def build_feature_frame(model, months, area_codes, sex_codes, category_codes, years):
+    """Build an encoded feature DataFrame in the column order the model was trained with"""
+    columns = {
+        'AREA NAME': np.asarray(area_codes),
+        'Crime_Category': np.asarray(category_codes),
+        'Month': np.asarray(months),
+        'Vict Sex': np.asarray(sex_codes),
+        'Year': np.asarray(years)
+    }
+    try:
+        feature_order = list(model.feature_names_in_)
+    except AttributeError:
+        feature_order = DEFAULT_FEATURE_ORDER
+    return pd.DataFrame({name: columns[name] for name in feature_order})
+
+
+def risk_columns(proba, classes, n_classes):
+    """Reorder predict_proba output so column i holds the probability of risk code i"""
+    columns = np.zeros(proba.shape[:-1] + (n_classes,), dtype=proba.dtype)
+    columns[..., np.asarray(classes, dtype=np.int64)] = proba
+    return columns
+
+
+class PredictionTable:
+    """Model predictions for every (month, area, sex, category) cell of one year.
+
+    The model input space is small and closed (12 x 21 x 3 x 9 rows per year),
+    so the whole grid is scored once and requests are answered by slicing a
+    dense int8 array indexed by the codebook codes. Grids for other years
+    are scored on first use and the most recently used MAX_OTHER_YEARS of
+    them kept alongside the main one. A grid that was
+    already scored (e.g. stored with a model artifact) can be passed as values,
+    and class probabilities for the grid as proba, indexed
+    [month, area, sex, category, risk code].
+    """
+
+    def __init__(self, model, codebook, year, values=None, proba=None):
+        self.year = year
+        self.model = model
+        self.codebook = codebook
+        self.values = self._score_grid([year])[0] if values is None else values
+        self.proba = proba
+        self.other_years = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _score_grid(self, years):
+        """Run the model once over the full grid of every year, shaped [year, month, area, sex, category]"""
+        shape = (len(years), 12, self.codebook.size('area'), self.codebook.size('sex'),
+                 self.codebook.size('category'))
+        year_codes, months, areas, sexes, categories = np.indices(shape).reshape(len(shape), -1)
+        features = build_feature_frame(self.model, months + 1, areas, sexes, categories,
+                                       np.asarray(years)[year_codes])
+        predictions = np.asarray(self.model.predict(features))
+        return predictions.astype(np.int8).reshape(shape)
+
+    def year_values(self, years):
+        """Full grids for several years, shaped [year, month, area, sex, category]"""
+        with self.lock:
+            missing = [year for year in dict.fromkeys(years)
+                       if year != self.year and year not in self.other_years]
+            scored = {}
+            if missing:
+                # Score all missing years in a single model call
+                scored = dict(zip(missing, self._score_grid(missing)))
+                self.other_years.update(scored)
+            grids = []
+            for year in years:
+                if year == self.year:
+                    grids.append(self.values)
+                elif year in scored:
+                    grids.append(scored[year])
+                else:
+                    self.other_years.move_to_end(year)
+                    grids.append(self.other_years[year])
+            while len(self.other_years) > MAX_OTHER_YEARS:
+                self.other_years.popitem(last=False)
+            return np.stack(grids)
+
+    def filter_codes(self, areas, sexes, categories):
+        """Codebook codes for the area, sex and category selections, rejecting unknown values"""
+        return (self.codebook.encode_names('area', areas),
+                self.codebook.encode_names('sex', sexes),
+                self.codebook.encode_names('category', categories))
+
+    def lookup(self, month, areas, sexes, categories):
+        """Predictions for the requested filters, shaped [category, area, sex]"""
+        if month not in range(1, 13):
+            raise ValueError(f"Invalid month: {month}")
+        area_codes, sex_codes, category_codes = self.filter_codes(areas, sexes, categories)
+        block = self.values[month - 1][np.ix_(area_codes, sex_codes, category_codes)]
+        return block.transpose(2, 0, 1)
+
+    def lookup_proba(self, month, areas, sexes, categories):
+        """Class probabilities for the requested filters, shaped [category, area, sex, risk code]"""
+        if self.proba is None:
+            raise ValueError("Probabilities are not available for this model")
+        if month not in range(1, 13):
+            raise ValueError(f"Invalid month: {month}")
+        area_codes, sex_codes, category_codes = self.filter_codes(areas, sexes, categories)
+        block = self.proba[month - 1][np.ix_(area_codes, sex_codes, category_codes)]
+        return block.transpose(2, 0, 1, 3)
+
+    def lookup_range(self, years, months, areas, sexes, categories):
+        """Predictions for several years and months, shaped [year, month, category, area, sex]"""
+        for month in months:
+            if month not in range(1, 13):
+                raise ValueError(f"Invalid month: {month}")
+        area_codes, sex_codes, category_codes = self.filter_codes(areas, sexes, categories)
+        values = self.year_values(years)
+        month_codes = [month - 1 for month in months]
+        block = values[np.ix_(range(len(years)), month_codes, area_codes, sex_codes, category_codes)]
+        return block.transpose(0, 1, 4, 2, 3)
@@ -0,0 +1,89 @@
+import numpy as np
+
+# Upper bound on the number of years one range query may score
+MAX_YEARS_PER_QUERY = 10
+# Years more than this far from the current one are rejected
+MAX_YEAR_OFFSET = 10
+
+
+def parse_int_selection(value, all_values, label, valid, max_items):
+    """Parse a selection like 5, [1, 2, 3], "1-6", "1,3,5" or "All" into a list of ints.
+
+    Every value must lie in the range valid, and at most max_items values may
+    be selected; both are checked before a range is expanded.
+    """
+    if value is None or value == 'All':
+        return list(all_values)
+    if isinstance(value, int):
+        parts = [value]
+    elif isinstance(value, (list, tuple)):
+        if len(value) > max_items:
+            raise ValueError(f"At most {max_items} {label}s can be selected")
+        parts = [int(item) for item in value]
+    else:
+        parts = [part.strip() for part in str(value).split(',')]
+
+    selected = []
+    for part in parts:
+        if isinstance(part, str) and '-' in part:
+            start, end = (int(bound) for bound in part.split('-', 1))
+            if end < start:
+                raise ValueError(f"Invalid {label} range: {part}")
+        elif part != '':
+            start = end = int(part)
+        else:
+            continue
+        for bound in (start, end):
+            if bound not in valid:
+                raise ValueError(f"Invalid {label}: {bound}")
+        if len(selected) + end - start + 1 > max_items:
+            raise ValueError(f"At most {max_items} {label}s can be selected")
+        selected.extend(range(start, end + 1))
+    if not selected:
+        raise ValueError(f"No {label} selected")
+    return selected
+
+
+def parse_months(value):
+    months = parse_int_selection(value, range(1, 13), 'month', range(1, 13), 12)
+    return list(dict.fromkeys(months))
+
+
+def parse_years(value, default_year):
+    if value is None:
+        return [default_year]
+    valid = range(default_year - MAX_YEAR_OFFSET, default_year + MAX_YEAR_OFFSET + 1)
+    return list(dict.fromkeys(parse_int_selection(value, [default_year], 'year', valid, MAX_YEARS_PER_QUERY)))
+
+
+def range_summary(block, years, months, month_names, risk_labels):
+    """Aggregate statistics over a [year, month, category, area, sex] prediction block"""
+    n_classes = len(risk_labels)
+    flat = block.reshape(len(years), len(months), -1)
+    # Risk class counts per (year, month), shape [year, month, class]
+    counts = (flat[..., np.newaxis] == np.arange(n_classes)).sum(axis=2)
+    cells = flat.shape[2]
+    unsafe_percent = counts[..., 0] / cells * 100 if cells else np.zeros(counts.shape[:2])
+
+    total_counts = counts.sum(axis=(0, 1))
+    by_month = [
+        {
+            'year': year,
+            'month': month,
+            'month_name': month_names[month],
+            'unsafe_percent': round(float(unsafe_percent[y, m]), 1)
+        }
+        for y, year in enumerate(years)
+        for m, month in enumerate(months)
+    ]
+    peak = max(by_month, key=lambda entry: entry['unsafe_percent'])
+    return {
+        'years': years,
+        'months': months,
+        'total_predictions': int(block.size),
+        'risk_distribution': {risk_labels[code]: int(count)
+                              for code, count in enumerate(total_counts) if count},
+        'unsafe_percent_by_month': by_month,
+        'highest_risk_month': {'year': peak['year'], 'month': peak['month'],
+                               'month_name': peak['month_name']}
+    }
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger('crm_pred.response_cache')
+
+
+def response_key(endpoint, params, model_fingerprint):
+    """Cache key for an endpoint response given normalized parameters and the model"""
+    raw = json.dumps([endpoint, params], sort_keys=True)
+    digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    # Prefix with the model fingerprint so stale disk entries are easy to find
+    return f"{model_fingerprint[:12]}-{digest}"
+
+
+class ResponseCache:
+    """LRU cache of serialized JSON response bodies with an optional disk tier.
+
+    Entries are stored as (body bytes, dependencies, variants), where
+    dependencies is a tuple of identifiers (e.g. image digests) the caller
+    checks on a hit and variants maps a content encoding to the compressed
+    body, filled in by the caller the first time a client asks for it.
+    Variants are kept in memory only.
+    """
+
+    def __init__(self, max_entries=2048, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, key):
+        """Return (body, dependencies, variants) for key, or None on a miss"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        entry = self._read_disk(key)
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._store_memory(key, entry)
+        return entry
+
+    def record_miss(self):
+        """Count a hit whose dependencies turned out to be gone as a miss"""
+        with self.lock:
+            self.hits -= 1
+            self.misses += 1
+
+    def put(self, key, body, dependencies=()):
+        """Store a body and return its entry"""
+        entry = (body, tuple(dependencies), {})
+        self._store_memory(key, entry)
+        self._write_disk(key, entry)
+        return entry
+
+    def invalidate(self, model_fingerprint=None):
+        """Drop all entries, keeping disk entries that belong to model_fingerprint.
+
+        Only the entry files directly in the cache directory are removed, not
+        subdirectories such as the single-flight lock directory.
+        """
+        with self.lock:
+            self.entries.clear()
+        if not self.cache_dir:
+            return
+        keep_prefix = f"{model_fingerprint[:12]}-" if model_fingerprint else None
+        for entry in os.scandir(self.cache_dir):
+            if (keep_prefix and entry.name.startswith(keep_prefix)) or not entry.is_file(follow_symlinks=False):
+                continue
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0
+            }
+
+    def _store_memory(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(os.path.join(self.cache_dir, f"{key}.json"), 'rb') as f:
+                body = f.read()
+            with open(os.path.join(self.cache_dir, f"{key}.deps"), 'r') as f:
+                dependencies = tuple(f.read().split())
+        except OSError:
+            return None
+        return body, dependencies, {}
+
+    def _write_disk(self, key, entry):
+        if not self.cache_dir:
+            return
+        body, dependencies, _ = entry
+        try:
+            # Write the dependency list first so a readable body always has one
+            for suffix, content, mode in (('deps', '\n'.join(dependencies), 'w'), ('json', body, 'wb')):
+                path = os.path.join(self.cache_dir, f"{key}.{suffix}")
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, mode) as f:
+                    f.write(content)
+                os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Error writing response cache: %s", e)
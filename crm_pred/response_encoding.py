@@ -0,0 +1,213 @@
+import gzip
+import io
+import itertools
+import json
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Response body formats for prediction_data and their content types
+FORMAT_MIMETYPES = {
+    'records': 'application/json',
+    'columnar': 'application/json',
+    'msgpack': 'application/msgpack',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+
+
+# Custom JSON encoder for NumPy types
+class NumpyEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, np.integer):
+            return int(obj)
+        elif isinstance(obj, np.floating):
+            return float(obj)
+        elif isinstance(obj, np.ndarray):
+            return obj.tolist()
+        return super(NumpyEncoder, self).default(obj)
+
+
+def dumps(obj):
+    """Serialize a response to JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY
+                            | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, cls=NumpyEncoder, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def label_lookup(mapping):
+    """Array that maps integer codes to their labels, e.g. label_lookup(crime_risk_mapping)[codes]"""
+    labels = np.empty(max(mapping) + 1, dtype=object)
+    for code, label in mapping.items():
+        labels[code] = label
+    return labels
+
+
+def prediction_records(block, month_name, year, categories, areas, sexes, risk_labels, proba=None):
+    """Prediction rows for a [category, area, sex] block, in category, area, sex order.
+
+    With proba ([category, area, sex, class]) every row also gets its class probabilities.
+    """
+    labels = risk_labels[block.ravel()].tolist()
+    records = [
+        {
+            'month': month_name,
+            'area name': area,
+            'vict sex': sex,
+            'crime category': category,
+            'year': year,
+            'prediction': label
+        }
+        for (category, area, sex), label in zip(itertools.product(categories, areas, sexes), labels)
+    ]
+    if proba is not None:
+        names = risk_labels.tolist()
+        for record, row in zip(records, probability_rows(proba)):
+            record['probabilities'] = dict(zip(names, row))
+    return records
+
+
+def probability_rows(proba):
+    """Class probabilities as one rounded list per cell"""
+    return np.round(proba.reshape(-1, proba.shape[-1]).astype(np.float64), 4).tolist()
+
+
+def probability_summary(proba, risk_labels):
+    """Expected number of cells per risk label and the mean probability of the first (unsafe) class"""
+    flat = proba.reshape(-1, proba.shape[-1]).astype(np.float64)
+    expected = flat.sum(axis=0)
+    return {
+        'expected_cells': {label: round(float(expected[code]), 2) for code, label in enumerate(risk_labels)},
+        'mean_unsafe_probability': round(float(flat[:, 0].mean()), 4) if len(flat) else 0.0
+    }
+
+
+def risk_distribution(block, risk_labels):
+    """Number of predictions per risk label, for labels that occur in the block"""
+    counts = np.bincount(block.ravel(), minlength=len(risk_labels))
+    return {risk_labels[code]: int(count) for code, count in enumerate(counts) if count}
+
+
+def prediction_columns(block, month_name, year, categories, areas, sexes, risk_labels, proba=None):
+    """Dictionary-encoded columnar layout of prediction_records.
+
+    Every varying column is sent as its distinct values plus one integer code
+    per row, and columns that are the same for all rows are sent once.
+    Probabilities, if given, are sent as one value column per risk label.
+    """
+    category_codes, area_codes, sex_codes = np.indices(block.shape).reshape(3, -1)
+    columnar = {
+        'format': 'columnar',
+        'length': int(block.size),
+        'constants': {'month': month_name, 'year': year},
+        'columns': {
+            'area name': {'dictionary': list(areas), 'codes': area_codes.tolist()},
+            'vict sex': {'dictionary': list(sexes), 'codes': sex_codes.tolist()},
+            'crime category': {'dictionary': list(categories), 'codes': category_codes.tolist()},
+            'prediction': {'dictionary': risk_labels.tolist(), 'codes': block.ravel().tolist()}
+        }
+    }
+    if proba is not None:
+        rounded = np.round(proba.reshape(-1, proba.shape[-1]).astype(np.float64), 4)
+        columnar['probabilities'] = {label: rounded[:, code].tolist() for code, label in enumerate(risk_labels)}
+    return columnar
+
+
+def format_available(fmt):
+    """Whether the optional dependency for a body format is installed"""
+    if fmt == 'msgpack':
+        return msgpack is not None
+    if fmt == 'arrow':
+        return pa is not None
+    return fmt in FORMAT_MIMETYPES
+
+
+def arrow_stream(columnar, summary):
+    """Arrow IPC stream of a columnar prediction_data, with the summary in the schema metadata"""
+    length = columnar['length']
+    arrays = {}
+    for name, value in columnar['constants'].items():
+        arrays[name] = pa.array([value] * length)
+    for name, column in columnar['columns'].items():
+        arrays[name] = pa.DictionaryArray.from_arrays(
+            pa.array(column['codes'], type=pa.int16()), pa.array(column['dictionary']))
+    for label, values in columnar.get('probabilities', {}).items():
+        arrays[f"probability {label}"] = pa.array(values, type=pa.float32())
+    table = pa.table(arrays).replace_schema_metadata({'summary': dumps(summary)})
+
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def encode_body(response_data, fmt):
+    """Serialize a response in the requested body format"""
+    if fmt == 'msgpack':
+        return msgpack.packb(response_data, use_bin_type=True)
+    if fmt == 'arrow':
+        return arrow_stream(response_data['prediction_data'], response_data['summary'])
+    return dumps(response_data)
+
+
+def preferred_encoding(size, accept_encoding):
+    """Best content encoding the client accepts for a body of size bytes, or None"""
+    if size < MIN_COMPRESS_SIZE or not accept_encoding:
+        return None
+    accepted = set()
+    for part in accept_encoding.lower().split(','):
+        coding, _, params = part.partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0'):
+            accepted.add(coding.strip())
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def encode_content(body, encoding):
+    """Compress a body with a content encoding chosen by preferred_encoding"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=5)
+
+
+def compress(body, accept_encoding):
+    """Compress a body with the best encoding the client accepts.
+
+    Returns (body, content encoding or None).
+    """
+    encoding = preferred_encoding(len(body), accept_encoding)
+    if encoding is None:
+        return body, None
+    return encode_content(body, encoding), encoding
+
+
+def stream_event(event, payload, mode):
+    """Encode one streamed message as an NDJSON line or a server-sent event"""
+    if mode == 'sse':
+        return b'event: ' + event.encode('utf-8') + b'\ndata: ' + dumps(payload) + b'\n\n'
+    return dumps({'type': event, event: payload}) + b'\n'
@@ -0,0 +1,112 @@
+"""Run the crime prediction API with a production server.
+
+    python serve.py --workers 4                  # gunicorn, model loaded once before forking
+    python serve.py --asgi --workers 4           # uvicorn with the app behind an ASGI adapter
+
+gunicorn mode preloads the app in the master process, so every worker starts
+with the model, its prediction table and the area boundaries already in
+memory and shares those pages with the other workers. Each worker serves
+requests on a pool of threads. ASGI mode runs uvicorn workers in front of the
+app (see asgi.py); requests are handled on a thread pool so prediction and
+chart work never blocks the event loop.
+
+On SIGTERM both servers stop accepting connections, let in-flight requests
+finish for up to --graceful-timeout seconds and then shut down the model
+watcher and the chart rendering pool.
+"""
+import argparse
+import os
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+try:
+    import uvicorn
+except ImportError:
+    uvicorn = None
+
+
+def default_workers():
+    return int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))
+
+
+def post_fork(server, worker):
+    import app
+    app.worker_started()
+
+
+def worker_exit(server, worker):
+    import app
+    app.shutdown()
+
+
+if BaseApplication is not None:
+    class GunicornServer(BaseApplication):
+        """gunicorn configured from code, loading the app once in the master"""
+
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for name, value in self.options.items():
+                self.cfg.set(name, value)
+
+        def load(self):
+            import app
+            # Workers start the model watcher themselves after the fork (post_fork)
+            return app.create_app(preload=True, watch=False)
+
+
+def run_gunicorn(args):
+    if BaseApplication is None:
+        raise SystemExit("gunicorn is not installed (pip install gunicorn), or use --asgi")
+    GunicornServer({
+        'bind': args.bind,
+        'workers': args.workers,
+        'worker_class': 'gthread',
+        'threads': args.threads,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'keepalive': 5,
+        'preload_app': True,
+        'post_fork': post_fork,
+        'worker_exit': worker_exit,
+        'accesslog': '-' if args.access_log else None
+    }).run()
+
+
+def run_uvicorn(args):
+    if uvicorn is None:
+        raise SystemExit("uvicorn is not installed (pip install uvicorn a2wsgi)")
+    host, _, port = args.bind.rpartition(':')
+    os.environ['ASGI_THREADS'] = str(args.threads)
+    # Workers are separate processes that each import asgi.py and load the model
+    uvicorn.run('asgi:application', host=host or '0.0.0.0', port=int(port), workers=args.workers,
+                lifespan='off', timeout_graceful_shutdown=args.graceful_timeout,
+                access_log=args.access_log)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the crime prediction API")
+    parser.add_argument('--bind', default=os.environ.get('BIND', '0.0.0.0:5000'), help="host:port")
+    parser.add_argument('--workers', type=int, default=default_workers(), help="Worker processes")
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('THREADS', 4)),
+                        help="Request threads per worker")
+    parser.add_argument('--timeout', type=int, default=120, help="Seconds before a stuck worker is restarted")
+    parser.add_argument('--graceful-timeout', type=int, default=30,
+                        help="Seconds in-flight requests get to finish on shutdown")
+    parser.add_argument('--asgi', action='store_true', help="Serve through uvicorn instead of gunicorn")
+    parser.add_argument('--access-log', action='store_true')
+    args = parser.parse_args(argv)
+
+    if args.asgi:
+        run_uvicorn(args)
+    else:
+        run_gunicorn(args)
+
+
+if __name__ == '__main__':
+    main()
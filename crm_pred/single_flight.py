@@ -0,0 +1,131 @@
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # No cross-process locking (Windows)
+
+logger = logging.getLogger('crm_pred.single_flight')
+
+LOCK_POLL_SECONDS = 0.01
+
+
+class Flight:
+    """One in-flight computation of a key"""
+
+    def __init__(self, key):
+        self.key = key
+        self.done = threading.Event()
+        self.result = None
+        self.lock_file = None
+        self.contended = False  # Whether another process held the key when this one started
+
+
+class SingleFlight:
+    """Let concurrent requests for the same key share one computation.
+
+    The first caller of a key becomes its leader and computes the result;
+    callers arriving while it runs wait for it and receive the leader's
+    result instead of computing it again. With a lock_dir, the leader also
+    takes an flock on a per-key lock file, so leaders in other worker
+    processes wait too and can then read the result from a shared cache.
+    The leader removes the lock file when it is done.
+    Waiting is bounded by timeout; a caller that times out, or whose leader
+    finished without a result, computes the result itself.
+    """
+
+    def __init__(self, lock_dir=None, timeout=30):
+        self.lock_dir = lock_dir if fcntl is not None else None
+        self.timeout = timeout
+        self.flights = {}
+        self.led = 0
+        self.coalesced = 0
+        self.lock = threading.Lock()
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def acquire(self, key):
+        """Return (flight, result) for a key.
+
+        A result means another caller already computed it. Otherwise the
+        caller leads the flight (if flight is not None) and must pass it to
+        release, with or without a result.
+        """
+        if not self.timeout:
+            return None, None
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self.lock:
+                flight = self.flights.get(key)
+                if flight is None:
+                    flight = self.flights[key] = Flight(key)
+                    self.led += 1
+                    break
+            if not flight.done.wait(max(deadline - time.monotonic(), 0)):
+                logger.warning("Timed out waiting for the in-flight computation of %s", key)
+                return None, None
+            if flight.result is not None:
+                with self.lock:
+                    self.coalesced += 1
+                return None, flight.result
+            # The leader gave up without a result; the next caller leads
+        if self.lock_dir:
+            self._lock_file(flight, deadline)
+        return flight, None
+
+    def release(self, flight, result=None):
+        """End a flight, handing the result (if any) to the callers waiting on it"""
+        flight.result = result
+        with self.lock:
+            if self.flights.get(flight.key) is flight:
+                del self.flights[flight.key]
+        if flight.lock_file is not None:
+            # Unlinked while still locked, so a process that locks the old file afterwards sees it is stale;
+            # closing the file releases the flock
+            try:
+                os.unlink(flight.lock_file.name)
+            except OSError:
+                pass
+            flight.lock_file.close()
+            flight.lock_file = None
+        flight.done.set()
+
+    def stats(self):
+        with self.lock:
+            return {'led': self.led, 'coalesced': self.coalesced, 'in_flight': len(self.flights)}
+
+    def _lock_file(self, flight, deadline):
+        path = os.path.join(self.lock_dir, f"{flight.key}.lock")
+        while True:
+            try:
+                lock_file = open(path, 'a')
+            except OSError as e:
+                logger.warning("Cannot open lock file for %s: %s", flight.key, e)
+                return
+            try:
+                while True:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        # Another worker process is computing the same key
+                        flight.contended = True
+                        if time.monotonic() >= deadline:
+                            logger.warning("Timed out waiting for another process computing %s", flight.key)
+                            lock_file.close()
+                            return
+                        time.sleep(LOCK_POLL_SECONDS)
+                if os.fstat(lock_file.fileno()).st_ino == os.stat(path).st_ino:
+                    flight.lock_file = lock_file
+                    return
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("Cannot lock %s: %s", flight.key, e)
+                lock_file.close()
+                return
+            # The previous holder removed this file after releasing it; lock the current one
+            lock_file.close()
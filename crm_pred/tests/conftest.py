@@ -0,0 +1,56 @@
+import json
+import os
+import sys
+
+import pytest
+
+# The crm_pred modules import each other as top-level modules, as when app.py is run from its directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def model_dir(tmp_path_factory):
+    """Models directory holding one small synthetic model version"""
+    pytest.importorskip('sklearn')
+    from benchmark import synthetic_model
+
+    path = str(tmp_path_factory.mktemp('models'))
+    synthetic_model(path, n_estimators=5, rows=2000)
+    return path
+
+
+@pytest.fixture
+def served_app(model_dir, tmp_path, monkeypatch):
+    """The app module serving the synthetic model, with fresh caches"""
+    pytest.importorskip('flask')
+    import app as crime_app
+    from model_registry import ModelRegistry
+    from response_cache import ResponseCache
+    from single_flight import SingleFlight
+
+    monkeypatch.setattr(crime_app, 'model_registry', ModelRegistry(
+        model_dir, crime_app.load_model_version, poll_interval=0, on_swap=crime_app.model_swapped))
+    monkeypatch.setattr(crime_app.forecast_scheduler, 'directory', str(tmp_path / 'forecasts'))
+    monkeypatch.setattr(crime_app, 'response_cache', ResponseCache())
+    monkeypatch.setattr(crime_app, 'single_flight', SingleFlight())
+    crime_app.chart_cache.clear()
+    return crime_app
+
+
+@pytest.fixture
+def boundaries(tmp_path, monkeypatch):
+    """The app module with a boundary file holding one square per area"""
+    pytest.importorskip('geopandas')
+    pytest.importorskip('flask')
+    import app as crime_app
+    from crime_types import AREA_NAMES
+
+    features = [{'type': 'Feature', 'properties': {'name': area},
+                 'geometry': {'type': 'Polygon', 'coordinates': [[[i, 0], [i + 1, 0], [i + 1, 1], [i, 1], [i, 0]]]}}
+                for i, area in enumerate(AREA_NAMES)]
+    path = tmp_path / 'areas.geojson'
+    path.write_text(json.dumps({'type': 'FeatureCollection', 'features': features}))
+    monkeypatch.setattr(crime_app, 'LA_GEOJSON_PATH', str(path))
+    monkeypatch.setattr(crime_app, 'geo_layer', None)
+    monkeypatch.setattr(crime_app, 'has_geo_file', None)
+    return crime_app
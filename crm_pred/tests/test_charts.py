@@ -0,0 +1,79 @@
+from concurrent.futures import Future
+
+from charts import ChartCache, ChartRenderer, ImageStore, chart_key, image_digest
+
+
+class ImmediatePool:
+    """Stands in for the process pool, rendering a fixed chart on submit"""
+
+    def submit(self, fn, df):
+        future = Future()
+        future.set_result({'risk_distribution': b'png'})
+        return future
+
+
+def test_chart_cache_evicts_least_recently_used():
+    cache = ChartCache(max_bytes=250)
+    cache.put('a', {'chart': b'a' * 100})
+    cache.put('b', {'chart': b'b' * 100})
+    assert cache.get('a') is not None
+    cache.put('c', {'chart': b'c' * 100})
+    assert cache.get('b') is None
+    assert cache.get('a') == {'chart': b'a' * 100}
+    assert cache.total_bytes == 200
+
+
+def test_chart_cache_skips_oversized_entries():
+    cache = ChartCache(max_bytes=50)
+    cache.put('a', {'chart': b'a' * 100})
+    assert cache.get('a') is None
+    assert cache.total_bytes == 0
+
+
+def test_chart_cache_disk_tier(tmp_path):
+    ChartCache(cache_dir=str(tmp_path)).put('a', {'chart': b'png'})
+    assert ChartCache(cache_dir=str(tmp_path)).get('a') == {'chart': b'png'}
+
+
+def test_image_store_evicts_least_recently_used():
+    store = ImageStore(max_bytes=250)
+    first, second = store.put(b'1' * 100), store.put(b'2' * 100)
+    assert first == image_digest(b'1' * 100)
+    assert store.get(first) == b'1' * 100
+    third = store.put(b'3' * 100)
+    assert not store.contains(second)
+    assert store.get(second) is None
+    assert store.contains(first) and store.contains(third)
+    assert store.total_bytes == 200
+
+
+def test_image_store_rejects_malformed_digests():
+    store = ImageStore()
+    store.put(b'png')
+    assert store.get('../../etc/passwd') is None
+
+
+def test_renderer_builds_the_frame_outside_its_lock():
+    renderer = ChartRenderer(ChartCache())
+    renderer.pool = ImmediatePool()
+
+    def build_df():
+        assert not renderer.lock.locked()
+        return None
+
+    assert renderer.get('a', build_df) == {'risk_distribution': b'png'}
+    assert renderer.submit('a', build_df) is None
+    assert renderer.stats() == {'rendered': 1, 'failed': 0, 'in_flight': 0}
+
+
+def test_failed_render_serves_the_error_image(served_app):
+    with served_app.app.app_context():
+        model = served_app.get_model()
+        table = served_app.serving_table(model)
+    served_app.chart_cache.put(chart_key(1, 'All', 'All', 'All', f"{model.fingerprint}:{table.year}"),
+                               {'error': b'error png'})
+    client = served_app.app.test_client()
+    response = client.get('/charts/area_risk.png?month=1')
+    assert response.status_code == 200
+    assert response.data == b'error png'
+    assert client.get('/charts/unknown.png?month=1').status_code == 404
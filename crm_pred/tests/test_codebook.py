@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from codebook import CODEBOOK, Codebook
+
+
+def test_codes_follow_sorted_values():
+    codebook = Codebook({'area': ['b', 'a', 'c']})
+    assert codebook.classes['area'] == ['a', 'b', 'c']
+    np.testing.assert_array_equal(codebook.encode('area', ['c', 'a']), [2, 0])
+    np.testing.assert_array_equal(codebook.decode('area', [1, 2]), ['b', 'c'])
+
+
+def test_unknown_values():
+    np.testing.assert_array_equal(CODEBOOK.encode('sex', ['M', 'X']), [CODEBOOK.codes['sex']['M'], -1])
+    with pytest.raises(ValueError, match='Unknown victim sex: X'):
+        CODEBOOK.encode_strict('sex', ['M', 'X'])
+    with pytest.raises(ValueError, match='Unknown area name: Nowhere'):
+        CODEBOOK.encode_names('area', ['Central', 'Nowhere'])
+
+
+def test_matches():
+    assert CODEBOOK.matches({'codebook': CODEBOOK.to_dict()})
+    assert CODEBOOK.matches({'encoders': CODEBOOK.classes})
+    assert not CODEBOOK.matches({'codebook': dict(CODEBOOK.to_dict(), version=CODEBOOK.version + 1)})
+    assert not CODEBOOK.matches({'encoders': dict(CODEBOOK.classes, sex=['F', 'M'])})
+    assert not CODEBOOK.matches({})
+
+
+BAD_VALUES = [{'month': 13}, {'month': 0}, {'area_name': 'Nowhere'}, {'crime_category': 'Jaywalking'},
+              {'vict_sex': 'Q'}]
+
+
+@pytest.mark.parametrize('params', BAD_VALUES)
+@pytest.mark.parametrize('endpoint', ['/predict', '/geo_predict', '/geo_predict.geojson', '/predict_range'])
+def test_unknown_request_values_are_rejected(served_app, boundaries, endpoint, params):
+    response = served_app.app.test_client().post(endpoint, json=dict({'month': 1}, **params))
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('params', [params for params in BAD_VALUES if 'area_name' not in params])
+def test_unknown_point_request_values_are_rejected(served_app, boundaries, params):
+    response = served_app.app.test_client().post('/predict_point', json=dict({'lat': 34.05, 'lon': -118.25}, **params))
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('query', ['month=13', 'area_name=Nowhere', 'crime_category=Jaywalking', 'vict_sex=Q'])
+def test_unknown_chart_values_are_rejected(served_app, query):
+    assert served_app.app.test_client().get(f'/charts/risk_distribution.png?{query}').status_code == 400
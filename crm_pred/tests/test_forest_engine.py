@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('sklearn')
+from sklearn.ensemble import RandomForestClassifier
+
+from forest_engine import CompiledForest
+
+
+@pytest.fixture(scope='module')
+def forest():
+    rng = np.random.default_rng(0)
+    x = pd.DataFrame({
+        'AREA NAME': rng.integers(0, 21, 2000),
+        'Crime_Category': rng.integers(0, 9, 2000),
+        'Month': rng.integers(1, 13, 2000),
+        'Vict Sex': rng.integers(0, 3, 2000),
+        'Year': rng.integers(2020, 2025, 2000)
+    })
+    y = (x['AREA NAME'] + x['Crime_Category'] * 2 + rng.integers(0, 3, 2000)) % 3
+    model = RandomForestClassifier(n_estimators=10, max_depth=8, random_state=0).fit(x, y)
+    return model, x
+
+
+def test_predict_proba_matches_sklearn(forest):
+    model, x = forest
+    engine = CompiledForest.from_sklearn(model)
+    np.testing.assert_allclose(engine.predict_proba(x), model.predict_proba(x), rtol=1e-6, atol=1e-9)
+    np.testing.assert_array_equal(engine.predict(x), model.predict(x))
+    np.testing.assert_array_equal(engine.classes_, model.classes_)
@@ -0,0 +1,77 @@
+import itertools
+import os
+import pickle
+
+import pytest
+
+from codebook import CODEBOOK
+from crime_types import AREA_NAMES, CRIME_CATEGORIES, VICT_SEXES
+from prediction_table import build_feature_frame
+from response_encoding import dumps
+
+CRIME_RISK_MAPPING = {0: "Unsafe / High Crime", 1: "Safe / Low Crime", 2: "Neutral / Medium Crime"}
+
+
+def reference_geo_data(model, month, month_name, year, categories, areas, sexes, selected_category, selected_sex):
+    """geo_data built the way the original per-area loops did, from per-row sklearn predictions"""
+    cells = list(itertools.product(categories, areas, sexes))
+    features = build_feature_frame(
+        model, [month] * len(cells), CODEBOOK.encode('area', [area for _, area, _ in cells]),
+        CODEBOOK.encode('sex', [sex for _, _, sex in cells]),
+        CODEBOOK.encode('category', [category for category, _, _ in cells]), [year] * len(cells))
+    predictions = dict(zip(cells, model.predict(features)))
+
+    def area_entries(area_categories):
+        entries = []
+        for area in areas:
+            area_risk_counts = {0: 0, 1: 0, 2: 0}
+            total_count = 0
+            for category in area_categories:
+                for sex in sexes:
+                    area_risk_counts[predictions[category, area, sex]] += 1
+                    total_count += 1
+            max_risk = max(area_risk_counts.items(), key=lambda x: x[1])
+            unsafe_percent = (area_risk_counts[0] / total_count) * 100 if total_count > 0 else 0
+            entries.append({
+                'area_name': area,
+                'prediction': CRIME_RISK_MAPPING[max_risk[0]],
+                'crime_count': total_count,
+                'unsafe_percent': round(unsafe_percent, 1)
+            })
+        return entries
+
+    geo_data = [{
+        'title': f'Overall Crime Risk - {month_name} {year}',
+        'areas': area_entries(categories),
+        'filters': {'month': month, 'crime_category': selected_category, 'vict_sex': selected_sex}
+    }]
+    if len(categories) > 1:
+        for category in categories:
+            geo_data.append({
+                'title': f'{category} - {month_name} {year}',
+                'areas': area_entries([category]),
+                'filters': {'month': month, 'crime_category': category, 'vict_sex': selected_sex}
+            })
+    return geo_data
+
+
+@pytest.mark.parametrize('filters', [
+    {'month': 1},
+    {'month': 7, 'vict_sex': 'F'},
+    {'month': 12, 'crime_category': 'Violent Crime', 'area_name': 'Harbor'}
+])
+def test_geo_predict_matches_the_per_area_loops(served_app, boundaries, model_dir, filters):
+    with open(os.path.join(model_dir, 'benchmark', 'model.pkl'), 'rb') as f:
+        model = pickle.load(f)
+    year = served_app.serving_table(served_app.model_registry.get()).year
+    response = served_app.app.test_client().post('/geo_predict', json=filters)
+    assert response.status_code == 200
+
+    category = filters.get('crime_category', 'All')
+    area = filters.get('area_name', 'All')
+    sex = filters.get('vict_sex', 'All')
+    expected = reference_geo_data(
+        model, filters['month'], served_app.month_names[filters['month']], year,
+        CRIME_CATEGORIES if category == 'All' else [category], AREA_NAMES if area == 'All' else [area],
+        VICT_SEXES if sex == 'All' else [sex], category, sex)
+    assert dumps(response.get_json()['geo_data']) == dumps(expected)
@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+from crime_types import AREA_NAMES
+
+
+@pytest.fixture
+def client(boundaries):
+    return boundaries.app.test_client()
+
+
+@pytest.mark.parametrize('zoom', [None, 'low', 'full'])
+def test_boundary_features_carry_the_area_name(client, zoom):
+    response = client.get('/geo/boundaries.geojson' + (f'?zoom={zoom}' if zoom else ''))
+    assert response.status_code == 200
+    collection = json.loads(response.data)
+    assert collection['type'] == 'FeatureCollection'
+    for feature in collection['features']:
+        # The map component matches features on properties.name
+        assert feature['properties']['name'] == feature['properties']['area_name'] == feature['id']
+        assert feature['geometry']['type'] == 'Polygon'
+    assert sorted(feature['properties']['name'] for feature in collection['features']) == sorted(AREA_NAMES)
+
+
+def test_boundaries_revalidate(client):
+    etag = client.get('/geo/boundaries.geojson').headers['ETag']
+    assert client.get('/geo/boundaries.geojson', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_unknown_zoom(client):
+    assert client.get('/geo/boundaries.geojson?zoom=huge').status_code == 400
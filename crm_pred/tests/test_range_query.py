@@ -0,0 +1,30 @@
+import pytest
+
+from range_query import MAX_YEAR_OFFSET, MAX_YEARS_PER_QUERY, parse_months, parse_years
+
+
+def test_parse_months():
+    assert parse_months(None) == list(range(1, 13))
+    assert parse_months(7) == [7]
+    assert parse_months('1-3,5,3') == [1, 2, 3, 5]
+    assert parse_months([12, 1]) == [12, 1]
+
+
+@pytest.mark.parametrize('value', ['0', '13', '1-999999999', '6-2', [1] * 13, 'x', ''])
+def test_parse_months_rejects(value):
+    with pytest.raises(ValueError):
+        parse_months(value)
+
+
+def test_parse_years():
+    assert parse_years(None, 2026) == [2026]
+    assert parse_years('All', 2026) == [2026]
+    assert parse_years('2025-2027', 2026) == [2025, 2026, 2027]
+    assert parse_years(2026 + MAX_YEAR_OFFSET, 2026) == [2026 + MAX_YEAR_OFFSET]
+
+
+@pytest.mark.parametrize('value', ['1-2000000000', f"2020-{2020 + MAX_YEARS_PER_QUERY}",
+                                   2027 + MAX_YEAR_OFFSET, [2026] * (MAX_YEARS_PER_QUERY + 1)])
+def test_parse_years_rejects(value):
+    with pytest.raises(ValueError):
+        parse_years(value, 2026)
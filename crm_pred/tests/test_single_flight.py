@@ -0,0 +1,72 @@
+import threading
+import time
+
+from single_flight import SingleFlight
+
+
+def test_followers_receive_the_leaders_result():
+    flights = SingleFlight(timeout=5)
+    flight, result = flights.acquire('key')
+    assert flight is not None and result is None
+    results = []
+    follower = threading.Thread(target=lambda: results.append(flights.acquire('key')))
+    follower.start()
+    time.sleep(0.05)
+    flights.release(flight, 'body')
+    follower.join()
+    assert results == [(None, 'body')]
+    assert flights.stats() == {'led': 1, 'coalesced': 1, 'in_flight': 0}
+
+
+def test_lock_files_are_removed(tmp_path):
+    flights = SingleFlight(lock_dir=str(tmp_path), timeout=5)
+    flight, _ = flights.acquire('key')
+    assert (tmp_path / 'key.lock').exists()
+    flights.release(flight, 'body')
+    assert not (tmp_path / 'key.lock').exists()
+
+
+def test_concurrent_predict_requests_are_computed_once(served_app, monkeypatch):
+    served_app.model_registry.get()
+    # Charts stay unrendered, so every response is a plots_pending one that is not cached
+    monkeypatch.setattr(served_app.chart_renderer, 'submit', lambda key, build_df: None)
+    computed = []
+    records = served_app.prediction_records
+
+    def slow_records(*args, **kwargs):
+        computed.append(1)
+        time.sleep(0.3)
+        return records(*args, **kwargs)
+
+    monkeypatch.setattr(served_app, 'prediction_records', slow_records)
+    start = threading.Barrier(8)
+    responses = []
+
+    def post():
+        client = served_app.app.test_client()
+        start.wait()
+        responses.append(client.post('/predict', json={'month': 3}))
+
+    threads = [threading.Thread(target=post) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [response.status_code for response in responses] == [200] * 8
+    assert all(response.get_json()['plots_pending'] for response in responses)
+    assert len({response.data for response in responses}) == 1
+    assert served_app.single_flight.stats()['coalesced'] > 0
+    assert len(computed) < 8
+
+
+def test_invalidating_the_response_cache_keeps_flight_locks(tmp_path):
+    from response_cache import ResponseCache
+
+    cache = ResponseCache(cache_dir=str(tmp_path))
+    flights = SingleFlight(lock_dir=str(tmp_path / 'flights'), timeout=5)
+    cache.put('aaaaaaaaaaaa-old', b'body')
+    flight, _ = flights.acquire('bbbbbbbbbbbb-new')
+    cache.invalidate('bbbbbbbbbbbb')
+    assert not (tmp_path / 'aaaaaaaaaaaa-old.json').exists()
+    assert (tmp_path / 'flights' / 'bbbbbbbbbbbb-new.lock').exists()
+    flights.release(flight)
@@ -0,0 +1,132 @@
+"""Train the crime risk model from the LA crime data CSV.
+
+    python train.py Crime_Data_from_2020_to_Present.csv --models-dir models
+
+The CSV is streamed in chunks and only the columns the model needs are read,
+so memory stays bounded as the dataset grows. The trained model is written as
+a new version directory that the app's model registry picks up.
+
+With --store, the CSV (e.g. just the latest day of incidents) is added to a
+persistent aggregate cube and the model is trained from the whole cube:
+
+    python train.py new_incidents.csv --store crime_counts.sqlite
+    python train.py --store crime_counts.sqlite            # retrain from the cube alone
+    python train.py new_incidents.csv --store crime_counts.sqlite --no-train
+"""
+import argparse
+import json
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+
+from aggregate_store import CHUNK_SIZE, AggregateStore, aggregate_counts, file_digest
+from codebook import CODEBOOK
+from crime_types import CRIME_LEVELS, crime_level_codes
+
+FEATURE_ORDER = ['AREA NAME', 'Month', 'Year', 'Vict Sex', 'Crime_Category']
+
+
+def training_frame(counts):
+    """Features and crime level labels from aggregated counts"""
+    frame = counts.reset_index(name='Crime_Count')
+    x = frame[FEATURE_ORDER]
+    y = crime_level_codes(frame['Crime_Count'].to_numpy())
+    return x, y
+
+
+def train_model(x, y, n_estimators=100, random_state=42, n_jobs=None):
+    """Fit the random forest classifier and return (model, test accuracy)"""
+    X_train, X_test, y_train, y_test = train_test_split(x, y, test_size=0.2, random_state=random_state)
+    model = RandomForestClassifier(n_estimators=n_estimators, random_state=random_state, n_jobs=n_jobs)
+    model.fit(X_train, y_train)
+    accuracy = float(np.mean(model.predict(X_test) == y_test))
+    return model, accuracy
+
+
+def write_version(models_dir, version, model, metadata):
+    """Write model.pkl and training.json as a new version, renamed into place in one step.
+
+    The codebook the features were encoded with is added to the metadata.
+    """
+    path = os.path.join(models_dir, version)
+    if os.path.exists(path):
+        raise ValueError(f"Model version {version} already exists")
+    tmp_dir = os.path.join(models_dir, f".{version}.{os.getpid()}.tmp")
+    os.makedirs(tmp_dir)
+    try:
+        with open(os.path.join(tmp_dir, 'model.pkl'), 'wb') as f:
+            pickle.dump(model, f)
+        with open(os.path.join(tmp_dir, 'training.json'), 'w') as f:
+            json.dump({**metadata, 'codebook': CODEBOOK.to_dict()}, f, indent=2, sort_keys=True)
+        os.rename(tmp_dir, path)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the crime risk model from the crime data CSV")
+    parser.add_argument('csv', nargs='?', help="Crime data CSV (optional with --store)")
+    parser.add_argument('--store', help="SQLite aggregate cube to add the CSV to and train from")
+    parser.add_argument('--no-train', action='store_true', help="Only add the CSV to the store")
+    parser.add_argument('--models-dir', default=os.environ.get('MODELS_DIR', 'models'))
+    parser.add_argument('--version', help="Version name (default: current time, e.g. 20250101-120000)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--n-estimators', type=int, default=100)
+    parser.add_argument('--random-state', type=int, default=42)
+    parser.add_argument('--n-jobs', type=int, default=None)
+    args = parser.parse_args(argv)
+    if not args.csv and not args.store:
+        parser.error("a CSV file or --store is required")
+    if args.no_train and not (args.csv and args.store):
+        parser.error("--no-train needs both a CSV file and --store")
+
+    started = time.time()
+    if args.store:
+        store = AggregateStore(args.store)
+        try:
+            if args.csv:
+                try:
+                    rows, dropped, cells = store.append_csv(args.csv, args.chunk_size)
+                except ValueError as e:
+                    parser.exit(1, f"{str(e)}\n")
+                print(f"Read {rows} rows ({dropped} without a usable date or area)")
+                print(f"Added {rows - dropped} incidents to {cells} cells of {args.store}")
+            if args.no_train:
+                return
+            counts = store.counts()
+            data = dict(store.stats(), path=os.path.basename(args.store))
+        finally:
+            store.close()
+    else:
+        counts, rows, dropped = aggregate_counts(args.csv, args.chunk_size)
+        print(f"Read {rows} rows ({dropped} without a usable date or area)")
+        data = {'path': os.path.basename(args.csv), 'sha1': file_digest(args.csv),
+                'rows': rows, 'dropped_rows': dropped}
+    x, y = training_frame(counts)
+    print(f"Aggregated into {len(x)} training rows in {time.time() - started:.1f}s")
+
+    model, accuracy = train_model(x, y, args.n_estimators, args.random_state, args.n_jobs)
+    print(f"RandomForest Classifier Accuracy: {accuracy:.4f}")
+
+    version = args.version or time.strftime('%Y%m%d-%H%M%S')
+    path = write_version(args.models_dir, version, model, {
+        'version': version,
+        'data': data,
+        'training_rows': len(x),
+        'features': FEATURE_ORDER,
+        'crime_levels': CRIME_LEVELS,
+        'params': {'n_estimators': args.n_estimators, 'random_state': args.random_state},
+        'test_accuracy': accuracy
+    })
+    print(f"Model version {version} written to {path} in {time.time() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -14,12 +14,12 @@ import { scaleQuantize } from "d3-scale";
 import { Tooltip } from "react-tooltip";
 
 
-// URL to LA GeoJSON with area boundaries
-const geoUrl = "/la_areas.geojson";
-
 // API URL configuration
 const API_URL = import.meta.env.VITE_API_URL || "http://localhost:5000";
 
+// LA area boundaries, simplified by the backend and cached by the browser
+const geoUrl = `${API_URL}/geo/boundaries.geojson?zoom=medium`;
+
 const CrimeMap = ({ searchParams, crimeData }) => {
   const [geoData, setGeoData] = useState(null);
   const [tooltipContent, setTooltipContent] = useState('');
@@ -90,12 +90,12 @@ const CitizenDashboard = () => {
       
       // Extract data from the response
       if (response.data) {
-        if (response.data.plot_images && response.data.plot_images.length > 0) {
-          setGraphImages(response.data.plot_images);
+        if (response.data.plot_urls && response.data.plot_urls.length > 0) {
+          setGraphImages(response.data.plot_urls);
           setSearchPerformed(true);
         } else {
           setGraphImages([]);
-          console.warn("No plot images in response");
+          console.warn("No plot URLs in response");
         }
         
         if (response.data.prediction_data) {
@@ -111,7 +111,7 @@ const CitizenDashboard = () => {
           setSummary(null);
         }
         
-        if (!response.data.plot_images && !response.data.prediction_data) {
+        if (!response.data.plot_urls && !response.data.prediction_data) {
           setError("No data available for the selected criteria");
         }
       } else {
@@ -292,7 +292,7 @@ const CitizenDashboard = () => {
                     graphImages.map((image, index) => (
                       <div key={index} className="bg-white rounded-lg shadow-md p-4 hover:shadow-lg transition-shadow">
                         <img 
-                          src={`data:image/png;base64,${image}`} 
+                          src={`${API_URL}${image}`} 
                           alt={`Crime analytics chart ${index + 1}`} 
                           className="w-full h-auto" 
                         />